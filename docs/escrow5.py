@@ -1,7 +1,18 @@
 # --- Start of Copied Code (Classes are identical to previous version) ---
-import uuid
+import itertools
+import os
+import queue
+import string
+import sys
+import threading
+import time
 from decimal import Decimal, getcontext
 
+try:
+    import numpy
+except ImportError: # optional: create_orders_bulk then checks amounts in pure Python
+    numpy = None
+
 # Set precision for Decimal calculations
 getcontext().prec = 10
 
@@ -9,6 +20,8 @@ getcontext().prec = 10
 PLATFORM_SIGNATURE_ID = "PLATFORM"
 MIN_SIGNATURES_REQUIRED = 2
 REP_VOTE_THRESHOLD_PERCENT = Decimal("75.0")
+ZERO_AMOUNT = Decimal("0.00") # Decimals are immutable, so every zero amount can share this one
+HOLD_TTL_SECONDS = 900.0 # default lifetime of a balance hold placed through EscrowApplication.place_hold
 
 # --- Enums (using strings for simplicity) ---
 class UserType:
@@ -27,123 +40,932 @@ class MilestoneStatus:
     COMPLETED_BY_CONTRACTOR = "COMPLETED_BY_CONTRACTOR" # Contractor marked done, waiting for signatures
     PAID = "PAID" # Signatures received, funds released
 
+class FundingPolicy:
+    """
+    What Order.add_contribution does with the part of a contribution beyond the order's remaining cost.
+
+    QUEUE only records the surplus: order.waitlist is the demand an order turned
+    away, per customer, for the operator to see (it is persisted and shown in
+    the order status). Waitlisted amounts are neither debited nor held,
+    so there is nothing to refund, and nothing in this module ever draws on them:
+    an order stops taking contributions once funded and never reopens.
+    """
+    ACCEPT = "accept"   # take it anyway; the surplus stays in escrow (the original behaviour)
+    REJECT = "reject"   # refuse the whole contribution
+    PARTIAL = "partial" # take only what the order still needs; the customer keeps the rest
+    QUEUE = "queue"     # as PARTIAL, and record the rest on the order's waitlist (not debited or held)
+
+class SignerRole:
+    """Roles in which an act can be signed, see Order.signer_role."""
+    PLATFORM = "platform"
+    CONTRACTOR = "contractor"
+    REPRESENTATIVE = "representative"
+    CONTRIBUTOR = "contributor" # only under a SignaturePolicy that weighs contributors
+
+class BatchOperation:
+    DEPOSIT = "deposit" # ("deposit", customer_id, amount)
+    JOIN = "join"       # ("join", customer_id, order_id, amount)
+    SIGN = "sign"       # ("sign", signer_id, order_id, milestone_id)
+
+class EventLevel:
+    DEBUG = 10
+    INFO = 20
+    WARNING = 30
+    ERROR = 40
+    CRITICAL = 50
+    SILENT = 100 # Above every real level; used to switch a sink off
+
+class EventKind:
+    # State changes
+    APP_INITIALIZED = "APP_INITIALIZED"
+    USER_CREATED = "USER_CREATED"
+    DEPOSIT_REQUESTED = "DEPOSIT_REQUESTED"
+    BALANCE_CHANGED = "BALANCE_CHANGED"
+    ORDER_INITIALIZING = "ORDER_INITIALIZING"
+    MILESTONE_ADDED = "MILESTONE_ADDED"
+    ORDER_CREATED = "ORDER_CREATED"
+    ORDER_REGISTERED = "ORDER_REGISTERED"
+    CONTRIBUTION_ADDED = "CONTRIBUTION_ADDED"
+    CONTRIBUTION_CAPPED = "CONTRIBUTION_CAPPED"
+    CONTRIBUTION_QUEUED = "CONTRIBUTION_QUEUED"
+    ORDER_JOINED = "ORDER_JOINED"
+    ORDER_FUNDED = "ORDER_FUNDED"
+    MILESTONE_COMPLETED = "MILESTONE_COMPLETED"
+    ACT_CREATED = "ACT_CREATED"
+    SIGNATURE_REQUESTED = "SIGNATURE_REQUESTED"
+    SIGNATURE_ADDED = "SIGNATURE_ADDED"
+    ACT_COMPLETED = "ACT_COMPLETED"
+    FUNDS_RELEASING = "FUNDS_RELEASING"
+    FUNDS_RELEASED = "FUNDS_RELEASED"
+    CONTRACTOR_PAID = "CONTRACTOR_PAID"
+    SETTLEMENT_QUEUED = "SETTLEMENT_QUEUED"
+    ORDER_COMPLETED = "ORDER_COMPLETED"
+    VOTE_RECORDED = "VOTE_RECORDED"
+    VOTE_TALLY = "VOTE_TALLY"
+    VOTE_THRESHOLD_REACHED = "VOTE_THRESHOLD_REACHED"
+    VOTE_THRESHOLD_NOT_REACHED = "VOTE_THRESHOLD_NOT_REACHED"
+    REPRESENTATIVE_CHANGED = "REPRESENTATIVE_CHANGED"
+    REPRESENTATIVE_CONFIRMED = "REPRESENTATIVE_CONFIRMED"
+    VOTES_RESET = "VOTES_RESET"
+    # Rejections and failures
+    NOT_FOUND = "NOT_FOUND"
+    INVALID_USER = "INVALID_USER"
+    INVALID_AMOUNT = "INVALID_AMOUNT"
+    INVALID_ORDER = "INVALID_ORDER"
+    INVALID_STATUS = "INVALID_STATUS"
+    INSUFFICIENT_BALANCE = "INSUFFICIENT_BALANCE"
+    NOT_A_CONTRIBUTOR = "NOT_A_CONTRIBUTOR"
+    NOT_ASSIGNED = "NOT_ASSIGNED"
+    UNAUTHORIZED_SIGNER = "UNAUTHORIZED_SIGNER"
+    DUPLICATE_SIGNATURE = "DUPLICATE_SIGNATURE"
+    ACT_ALREADY_COMPLETE = "ACT_ALREADY_COMPLETE"
+    ALREADY_PAID = "ALREADY_PAID"
+    ROLLBACK = "ROLLBACK"
+    RELEASE_FAILED = "RELEASE_FAILED"
+    INVALID_OPERATION = "INVALID_OPERATION"
+    BATCH_ABORTED = "BATCH_ABORTED"
+    BATCH_APPLIED = "BATCH_APPLIED"
+    BULK_ORDERS_CREATED = "BULK_ORDERS_CREATED"
+    IDEMPOTENCY_CONFLICT = "IDEMPOTENCY_CONFLICT"
+    # Balance holds (not recorded by the ledger: a hold never changes a balance)
+    HOLD_PLACED = "HOLD_PLACED"
+    HOLD_COMMITTED = "HOLD_COMMITTED"
+    HOLD_RELEASED = "HOLD_RELEASED"
+    HOLD_EXPIRED = "HOLD_EXPIRED"
+    # Retried requests answered from escrow5_idempotency's cache
+    IDEMPOTENT_REPLAY = "IDEMPOTENT_REPLAY"
+    # Reports produced by the view_* methods
+    VIEW = "VIEW"
+
+# --- Money ---
+# Amounts are stored in the representation of the selected money engine:
+# Decimals under the module's Decimal context (the default, the original behaviour)
+# or ints counting minor units (e.g. cents). Amounts passed to EscrowApplication
+# methods are always in major units (100 means 100.00); model methods such as
+# Order.add_contribution and User._change_balance take engine amounts.
+
+class DecimalMoney:
+    """Amounts are Decimals, rounded by the global Decimal context (precision 10)."""
+    name = "decimal"
+    zero = ZERO_AMOUNT
+
+    def parse(self, amount):
+        return Decimal(str(amount))
+
+    def coerce(self, amount):
+        return Decimal(str(amount))
+
+    def to_decimal(self, value):
+        return value
+
+    def format(self, value):
+        return f"{value:.2f}"
+
+    def to_string(self, value):
+        return value.to_eng_string()
+
+    def serialize(self, value):
+        return str(value)
+
+    def deserialize(self, text):
+        return Decimal(text)
+
+    def percent_threshold(self, base, percent):
+        return (base * percent) / Decimal("100.0")
+
+    def percent_of(self, part, whole):
+        return part / whole * 100
+
+class MinorUnitMoney:
+    """
+    Amounts are ints counting 10**-exponent units of the currency. Arithmetic
+    is exact, parsing rejects amounts finer than one minor unit, and the vote
+    threshold is an exact integer comparison.
+    """
+    name = "minor"
+    zero = 0
+
+    def __init__(self, exponent=2):
+        self.exponent = exponent
+        self.scale = 10 ** exponent
+
+    def parse(self, amount):
+        if type(amount) is int:
+            return amount * self.scale
+        sign, digits, exponent = Decimal(str(amount)).as_tuple()
+        if not isinstance(exponent, int):
+            raise ValueError(f"Invalid amount: {amount}")
+        value = int("".join(map(str, digits)))
+        shift = exponent + self.exponent
+        if shift >= 0:
+            value *= 10 ** shift
+        else:
+            value, remainder = divmod(value, 10 ** -shift)
+            if remainder:
+                raise ValueError(f"Amount {amount} is finer than the minor unit.")
+        return -value if sign else value
+
+    def coerce(self, amount):
+        return amount if type(amount) is int else self.parse(amount)
+
+    def to_decimal(self, value):
+        return Decimal(value).scaleb(-self.exponent)
+
+    def format(self, value):
+        if not self.exponent:
+            return str(value)
+        units, minor = divmod(abs(value), self.scale)
+        return f"{'-' if value < 0 else ''}{units}.{minor:0{self.exponent}d}"
+
+    def to_string(self, value):
+        return self.format(value)
+
+    def serialize(self, value):
+        return str(value)
+
+    def deserialize(self, text):
+        return int(text)
+
+    def percent_threshold(self, base, percent):
+        # Smallest whole amount of minor units with amount * 100 >= base * percent
+        numerator, denominator = Decimal(percent).as_integer_ratio()
+        return -(-base * numerator // (100 * denominator))
+
+    def percent_of(self, part, whole):
+        return Decimal(part) * 100 / Decimal(whole)
+
+_money = DecimalMoney()
+
+def get_money_engine():
+    return _money
+
+def set_money_engine(engine):
+    """
+    Selects how amounts are represented. Call before creating any application
+    objects; amounts already stored are not converted. Returns the previous engine.
+    """
+    global _money
+    previous, _money = _money, engine
+    return previous
+
+def format_amount(value):
+    """Formats an engine amount with two decimals (or the engine's minor-unit precision)."""
+    return _money.format(value)
+
+def amount_to_decimal(value):
+    return _money.to_decimal(value)
+
+# --- IDs ---
+# Every user, order, milestone and act id is the object's prefix plus an id
+# from the selected generator. The default ids are unique within a process,
+# fixed width and increasing, so they sort in creation order.
+
+class MonotonicIdGenerator:
+    """
+    Ids are 19 hex digits: milliseconds since the epoch (11), node (4) and a
+    per-millisecond counter (4). When the counter runs out, or the clock goes
+    backwards, the id borrows the next millisecond, so ids never repeat and
+    always increase. Processes that share an id space need distinct nodes.
+    """
+    def __init__(self, node=None):
+        self.node = int.from_bytes(os.urandom(2), "big") if node is None else node & 0xFFFF
+        self._last_ms = -1
+        self._counter = 0
+        self._head = "" # hex of the current millisecond and node, reused within the millisecond
+        self._lock = threading.Lock()
+
+    def _now_ms(self):
+        return time.time_ns() // 1_000_000
+
+    def new_id(self, prefix=""):
+        now = self._now_ms()
+        with self._lock:
+            if now > self._last_ms:
+                self._set_ms(now)
+            elif self._counter < 0xFFFF:
+                self._counter += 1
+            else:
+                self._set_ms(self._last_ms + 1)
+            return f"{prefix}{self._head}{self._counter:04x}"
+
+    def new_ids(self, prefix, count):
+        """`count` new ids, allocated as one block under a single acquisition of the lock."""
+        now = self._now_ms()
+        ids = []
+        with self._lock:
+            if count and now > self._last_ms:
+                self._set_ms(now)
+                self._counter = -1 # the block starts at counter 0
+            while len(ids) < count:
+                if self._counter >= 0xFFFF:
+                    self._set_ms(self._last_ms + 1)
+                    self._counter = -1
+                first = self._counter + 1
+                self._counter = min(0xFFFF, self._counter + count - len(ids))
+                head = prefix + self._head
+                ids.extend([f"{head}{counter:04x}" for counter in range(first, self._counter + 1)])
+        return ids
+
+    def _set_ms(self, ms):
+        self._last_ms, self._counter = ms, 0
+        self._head = f"{ms:011x}{self.node:04x}"
+
+    @staticmethod
+    def timestamp(object_id):
+        """Creation time (seconds since the epoch) encoded in an id from this generator."""
+        return int(object_id[-19:-8], 16) / 1000
+
+class SeededIdGenerator(MonotonicIdGenerator):
+    """
+    Deterministic ids for tests and replays: the same format with the seed as
+    the node and a clock that stands still, so the nth id is always the same.
+    """
+    def __init__(self, seed=0):
+        super().__init__(node=seed)
+        self._set_ms(0)
+        self._counter = -1
+
+    def _now_ms(self):
+        return 0
+
+_ids = MonotonicIdGenerator()
+
+def get_id_generator():
+    return _ids
+
+def set_id_generator(generator):
+    """Selects the generator used for new ids. Returns the previous generator."""
+    global _ids
+    previous, _ids = _ids, generator
+    return previous
+
 # --- Helper Functions ---
 def generate_id(prefix=""):
-    return f"{prefix}{uuid.uuid4().hex[:8]}"
+    return _ids.new_id(prefix)
+
+def generate_ids(prefix, count):
+    return _ids.new_ids(prefix, count)
+
+# --- Events ---
+
+class _MessageFormatter(string.Formatter):
+    """str.format, plus a `money` format spec that renders engine amounts."""
+    def format_field(self, value, format_spec):
+        if format_spec == "money":
+            return _money.format(value)
+        return format(value, format_spec)
+
+_formatter = _MessageFormatter()
+
+class Event:
+    """A typed record of something that happened. The message is only formatted when read."""
+    __slots__ = ("kind", "level", "template", "fields", "timestamp")
+
+    def __init__(self, kind, level, template, fields):
+        self.kind = kind
+        self.level = level
+        self.template = template
+        self.fields = fields
+        self.timestamp = time.time()
+
+    @property
+    def message(self):
+        return _formatter.vformat(self.template, (), self.fields) if self.fields else self.template
+
+    def __repr__(self):
+        return f"Event({self.kind}, level={self.level}, fields={self.fields})"
+
+class EventSink:
+    """Base class for event sinks. Events below `level` are dropped before a record is built."""
+    level = EventLevel.DEBUG
+
+    def __init__(self, level=None):
+        if level is not None:
+            self.level = level
+
+    def enabled(self, level):
+        return level >= self.level
+
+    def emit(self, kind, level, template, **fields):
+        if level < self.level:
+            return
+        self.handle(Event(kind, level, template, fields))
+
+    def handle(self, event):
+        raise NotImplementedError
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.flush()
+
+class NullSink(EventSink):
+    """Discards everything; a silenced deployment pays for the call and nothing else."""
+    level = EventLevel.SILENT
+
+    def emit(self, kind, level, template, **fields):
+        pass
+
+    def handle(self, event):
+        pass
+
+class ConsoleSink(EventSink):
+    """Prints each message, matching the original print() output."""
+    def __init__(self, level=None, stream=None):
+        super().__init__(level)
+        self.stream = stream
+
+    def handle(self, event):
+        print(event.message, file=self.stream if self.stream is not None else sys.stdout)
+
+class TeeSink(EventSink):
+    """Fans events out to several sinks, each with its own level."""
+    def __init__(self, *sinks):
+        super().__init__()
+        self.sinks = list(sinks)
+        self._update_level()
+
+    def _update_level(self):
+        self.level = min((s.level for s in self.sinks), default=EventLevel.SILENT)
+
+    def add(self, sink):
+        self.sinks.append(sink)
+        self._update_level()
+
+    def remove(self, sink):
+        self.sinks.remove(sink)
+        self._update_level()
+
+    def emit(self, kind, level, template, **fields):
+        if level < self.level:
+            return
+        self.handle(Event(kind, level, template, fields))
+
+    def handle(self, event):
+        for sink in self.sinks:
+            if event.level >= sink.level:
+                sink.handle(event)
+
+    def flush(self):
+        for sink in self.sinks:
+            sink.flush()
+
+    def close(self):
+        for sink in self.sinks:
+            sink.close()
+
+class BufferedSink(EventSink):
+    """
+    Queues events and hands them to `target` from a background thread, so
+    formatting and I/O happen off the caller's path. When the buffer is full
+    the caller blocks, unless `drop_when_full` is set (drops are counted).
+    """
+    _STOP = object()
+
+    def __init__(self, target, level=None, capacity=10000, batch_size=256, drop_when_full=False):
+        super().__init__(target.level if level is None else level)
+        self.target = target
+        self.batch_size = batch_size
+        self.drop_when_full = drop_when_full
+        self.dropped = 0
+        self._queue = queue.Queue(maxsize=capacity)
+        self._worker = threading.Thread(target=self._drain, name="escrow-event-sink", daemon=True)
+        self._worker.start()
+
+    def handle(self, event):
+        if self.drop_when_full:
+            try:
+                self._queue.put_nowait(event)
+            except queue.Full:
+                self.dropped += 1
+        else:
+            self._queue.put(event)
+
+    def _drain(self):
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            for event in batch:
+                if event is self._STOP:
+                    self._queue.task_done()
+                    self.target.flush()
+                    return
+                try:
+                    self.target.handle(event)
+                finally:
+                    self._queue.task_done()
+            self.target.flush()
+
+    def flush(self):
+        """Blocks until everything queued so far has reached the target."""
+        self._queue.join()
+
+    def close(self):
+        if self._worker.is_alive():
+            self._queue.put(self._STOP)
+            self._worker.join()
+        self.target.close()
+
+_default_sink = ConsoleSink()
+
+def get_default_sink():
+    return _default_sink
+
+def set_default_sink(sink):
+    """Sets the sink used by objects created without an explicit one. Returns the previous sink."""
+    global _default_sink
+    previous, _default_sink = _default_sink, sink
+    return previous
 
 # --- Core Classes ---
 
 class User:
     """Base class for users."""
-    def __init__(self, name, user_type):
+    __slots__ = ("user_id", "name", "user_type", "balance", "held", "_sink")
+
+    def __init__(self, name, user_type, sink=None):
         self.user_id = generate_id(f"{user_type.lower()}_")
         self.name = name
         self.user_type = user_type
-        self.balance = Decimal("0.00")
-        print(f"{user_type.capitalize()} '{name}' created with ID: {self.user_id}")
+        self.balance = _money.zero
+        self.held = _money.zero # part of the balance reserved by holds, see Customer.place_hold
+        self._sink = sink if sink is not None else _default_sink
+        self._sink.emit(EventKind.USER_CREATED, EventLevel.INFO,
+                        "{label} '{name}' created with ID: {user_id}",
+                        label=user_type.capitalize(), name=name, user_id=self.user_id, user_type=user_type)
+
+    @property
+    def available_balance(self):
+        """The balance not reserved by holds."""
+        return self.balance - self.held
 
     def _change_balance(self, amount):
-        """Protected method to change balance."""
-        if self.balance + amount < 0:
-            print(f"Error: Insufficient balance for {self.name} ({self.user_id}).")
+        """Protected method to change balance. A debit may not reach into held funds."""
+        if self.balance - self.held + amount < 0:
+            self._sink.emit(EventKind.INSUFFICIENT_BALANCE, EventLevel.ERROR,
+                            "Error: Insufficient balance for {name} ({user_id}).",
+                            name=self.name, user_id=self.user_id, balance=self.balance, amount=amount)
             return False
         self.balance += amount
-        print(f"Balance updated for {self.name} ({self.user_id}): {self.balance:.2f}")
+        self._sink.emit(EventKind.BALANCE_CHANGED, EventLevel.INFO,
+                        "Balance updated for {name} ({user_id}): {balance:money}",
+                        name=self.name, user_id=self.user_id, balance=self.balance, amount=amount)
         return True
 
     def view_balance(self):
-        print(f"--- Balance for {self.name} ({self.user_id}) ---")
-        print(f"Current Balance: {self.balance:.2f}")
-        print("-" * 30)
+        if not self._sink.enabled(EventLevel.INFO):
+            return
+        if self.held:
+            self._sink.emit(EventKind.VIEW, EventLevel.INFO,
+                            "--- Balance for {name} ({user_id}) ---\nCurrent Balance: {balance:money}\n"
+                            "Held: {held:money}\nAvailable: {available:money}\n{rule}",
+                            name=self.name, user_id=self.user_id, balance=self.balance, held=self.held,
+                            available=self.balance - self.held, rule="-" * 30)
+            return
+        self._sink.emit(EventKind.VIEW, EventLevel.INFO,
+                        "--- Balance for {name} ({user_id}) ---\nCurrent Balance: {balance:money}\n{rule}",
+                        name=self.name, user_id=self.user_id, balance=self.balance, rule="-" * 30)
 
     def __repr__(self):
-        return f"{self.user_type.capitalize()}({self.user_id}, {self.name}, Balance: {self.balance:.2f})"
+        return f"{self.user_type.capitalize()}({self.user_id}, {self.name}, Balance: {format_amount(self.balance)})"
+
+# Hold ids only need to be unique within the process: holds are never persisted
+_hold_ids = itertools.count(1)
 
 class Customer(User):
     """Represents a customer user."""
-    def __init__(self, name):
-        super().__init__(name, UserType.CUSTOMER)
+    __slots__ = ("orders_created", "orders_joined", "holds")
+
+    def __init__(self, name, sink=None):
+        super().__init__(name, UserType.CUSTOMER, sink)
         self.orders_created = {} # order_id: Order
         self.orders_joined = {}  # order_id: contributed_amount
+        self.holds = {} # hold_id: (amount, expires_at as time.monotonic(), or None)
 
     def deposit(self, amount):
-        amount_decimal = Decimal(str(amount))
-        if amount_decimal <= 0:
-            print("Error: Deposit amount must be positive.")
+        amount_value = _money.parse(amount)
+        if amount_value <= 0:
+            self._sink.emit(EventKind.INVALID_AMOUNT, EventLevel.ERROR,
+                            "Error: Deposit amount must be positive.", user_id=self.user_id, amount=amount_value)
+            return False
+        self._sink.emit(EventKind.DEPOSIT_REQUESTED, EventLevel.INFO,
+                        "Attempting deposit of {amount:money} for {name}...",
+                        amount=amount_value, name=self.name, user_id=self.user_id)
+        return self._change_balance(amount_value)
+
+    # Holds: a hold reserves part of the balance without changing it. Committing
+    # the hold debits the balance; releasing it (or letting it expire) makes the
+    # amount available again without any balance change.
+
+    @property
+    def available_balance(self):
+        if self.holds:
+            self.expire_holds()
+        return self.balance - self.held
+
+    def place_hold(self, amount, ttl=None):
+        """Reserves `amount` (an engine amount) for `ttl` seconds, or until released. Returns the hold id or None."""
+        if amount <= 0:
+            self._sink.emit(EventKind.INVALID_AMOUNT, EventLevel.ERROR,
+                            "Error: Hold amount must be positive.", user_id=self.user_id, amount=amount)
+            return None
+        if self.available_balance < amount:
+            self._sink.emit(EventKind.INSUFFICIENT_BALANCE, EventLevel.ERROR,
+                            "Error: Insufficient available balance for {name} ({user_id}) to hold {amount:money}.",
+                            name=self.name, user_id=self.user_id, balance=self.balance, held=self.held, amount=amount)
+            return None
+        hold_id = self._reserve(amount, ttl)
+        self._sink.emit(EventKind.HOLD_PLACED, EventLevel.DEBUG,
+                        "Hold {hold_id} of {amount:money} placed on {name}'s balance ({user_id}).",
+                        hold_id=hold_id, amount=amount, name=self.name, user_id=self.user_id, ttl=ttl)
+        return hold_id
+
+    def commit_hold(self, hold_id, amount=None):
+        """
+        Debits the held amount from the balance, or only `amount` of it and
+        releases the rest. Fails if the hold is unknown or has expired, or if
+        `amount` is not positive (the hold is then kept).
+        """
+        if amount is not None and amount <= 0:
+            self._sink.emit(EventKind.INVALID_AMOUNT, EventLevel.ERROR,
+                            "Error: Hold commit amount must be positive.",
+                            hold_id=hold_id, user_id=self.user_id, amount=amount)
+            return False
+        held = self._take_live_hold(hold_id)
+        if held is None:
+            return False
+        amount = held if amount is None else min(amount, held)
+        self._sink.emit(EventKind.HOLD_COMMITTED, EventLevel.DEBUG,
+                        "Hold {hold_id} of {held:money} committed for {amount:money} by {name} ({user_id}).",
+                        hold_id=hold_id, held=held, amount=amount, name=self.name, user_id=self.user_id)
+        return self._change_balance(-amount) # cannot fail: the balance always covers what is held
+
+    def release_hold(self, hold_id):
+        """Drops a hold without changing the balance."""
+        amount = self._take_live_hold(hold_id)
+        if amount is None:
             return False
-        print(f"Attempting deposit of {amount_decimal:.2f} for {self.name}...")
-        return self._change_balance(amount_decimal)
+        self._sink.emit(EventKind.HOLD_RELEASED, EventLevel.DEBUG,
+                        "Hold {hold_id} of {amount:money} released for {name} ({user_id}).",
+                        hold_id=hold_id, amount=amount, name=self.name, user_id=self.user_id)
+        return True
+
+    # Unchecked primitives, also used by EscrowApplication.join_order, which
+    # validates first and resolves its hold within the same call
+
+    def _reserve(self, amount, ttl=None):
+        hold_id = next(_hold_ids)
+        self.holds[hold_id] = (amount, None if ttl is None else time.monotonic() + ttl)
+        self.held += amount
+        return hold_id
+
+    def _take_hold(self, hold_id):
+        amount, _ = self.holds.pop(hold_id)
+        self.held -= amount
+        return amount
+
+    def _take_live_hold(self, hold_id):
+        hold = self.holds.get(hold_id)
+        if hold is None:
+            self._sink.emit(EventKind.NOT_FOUND, EventLevel.ERROR,
+                            "Error: Hold {hold_id} not found for {name} ({user_id}).",
+                            hold_id=hold_id, name=self.name, user_id=self.user_id)
+            return None
+        amount = self._take_hold(hold_id)
+        if hold[1] is not None and hold[1] <= time.monotonic():
+            self._expired(hold_id, amount)
+            return None
+        return amount
+
+    def expire_holds(self, now=None):
+        """Drops the holds whose time is up. Returns how many expired."""
+        now = time.monotonic() if now is None else now
+        expired = [(hold_id, amount) for hold_id, (amount, expires_at) in self.holds.items()
+                   if expires_at is not None and expires_at <= now]
+        for hold_id, amount in expired:
+            del self.holds[hold_id]
+            self.held -= amount
+            self._expired(hold_id, amount)
+        return len(expired)
+
+    def _expired(self, hold_id, amount):
+        self._sink.emit(EventKind.HOLD_EXPIRED, EventLevel.WARNING,
+                        "Hold {hold_id} of {amount:money} on {name}'s balance ({user_id}) expired.",
+                        hold_id=hold_id, amount=amount, name=self.name, user_id=self.user_id)
 
 class Contractor(User):
     """Represents a contractor user."""
-    def __init__(self, name):
-        super().__init__(name, UserType.CONTRACTOR)
+    __slots__ = ("assigned_orders",)
+
+    def __init__(self, name, sink=None):
+        super().__init__(name, UserType.CONTRACTOR, sink)
         self.assigned_orders = set() # set of order_ids
 
 class Milestone:
     """Represents a single milestone within an order."""
+    __slots__ = ("milestone_id", "description", "amount", "status", "act")
+
     def __init__(self, description, amount):
-        if Decimal(str(amount)) <= 0:
+        amount_value = _money.parse(amount)
+        if amount_value <= 0:
              raise ValueError("Milestone amount must be positive.")
         self.milestone_id = generate_id("ms_")
         self.description = description
-        self.amount = Decimal(str(amount))
+        self.amount = amount_value
         self.status = MilestoneStatus.PENDING
         self.act = None
 
+    @classmethod
+    def _prevalidated(cls, milestone_id, description, amount_value):
+        """A milestone whose id was allocated and whose engine amount was checked by the caller."""
+        milestone = cls.__new__(cls)
+        milestone.milestone_id = milestone_id
+        milestone.description = description
+        milestone.amount = amount_value
+        milestone.status = MilestoneStatus.PENDING
+        milestone.act = None
+        return milestone
+
     def __repr__(self):
         return (f"Milestone({self.milestone_id}, '{self.description}', "
-                f"Amount: {self.amount:.2f}, Status: {self.status})")
+                f"Amount: {format_amount(self.amount)}, Status: {self.status})")
+
+class SignaturePolicy:
+    """
+    Which signatures complete an act, per order (Order.signature_policy).
+    None, the default, is any MIN_SIGNATURES_REQUIRED of the platform, the
+    contractor and the representative. A policy is a small tree of nested
+    tuples (lists once read back from JSON), built with these functions:
+
+        signatures(n)         any n authorized signers
+        role(role)            a signer in that SignerRole
+        contributors(percent) signers whose contributions add up to `percent`
+                              of the order's contributions (contributors may
+                              then sign)
+        at_least(n, *parts), all_of(*parts), any_of(*parts)
+
+    e.g. all_of(role(SignerRole.REPRESENTATIVE), any_of(role(SignerRole.PLATFORM),
+    role(SignerRole.CONTRACTOR))). Roles are those of the signers when they sign.
+    """
+    SIGNATURES = "signatures"
+    ROLE = "role"
+    CONTRIBUTORS = "contributors"
+    AT_LEAST = "at_least"
+
+    @staticmethod
+    def signatures(count):
+        return (SignaturePolicy.SIGNATURES, count)
+
+    @staticmethod
+    def role(role):
+        return (SignaturePolicy.ROLE, role)
+
+    @staticmethod
+    def contributors(percent):
+        return (SignaturePolicy.CONTRIBUTORS, str(percent))
+
+    @staticmethod
+    def at_least(count, *parts):
+        policy = (SignaturePolicy.AT_LEAST, count, parts)
+        SignaturePolicy.validate(policy)
+        return policy
+
+    @staticmethod
+    def all_of(*parts):
+        return SignaturePolicy.at_least(len(parts), *parts)
+
+    @staticmethod
+    def any_of(*parts):
+        return SignaturePolicy.at_least(1, *parts)
+
+    @staticmethod
+    def validate(policy):
+        """Raises ValueError unless `policy` is a well-formed policy tree that can be satisfied."""
+        kind = policy[0] if isinstance(policy, (tuple, list)) and policy else None
+        if kind == SignaturePolicy.SIGNATURES and len(policy) == 2 and isinstance(policy[1], int) and policy[1] > 0:
+            return
+        if kind == SignaturePolicy.ROLE and len(policy) == 2 and policy[1] in (
+                SignerRole.PLATFORM, SignerRole.CONTRACTOR, SignerRole.REPRESENTATIVE, SignerRole.CONTRIBUTOR):
+            return
+        if kind == SignaturePolicy.CONTRIBUTORS and len(policy) == 2:
+            try:
+                percent = Decimal(str(policy[1]))
+            except ArithmeticError:
+                percent = None
+            if percent is not None and 0 < percent <= 100:
+                return
+        if (kind == SignaturePolicy.AT_LEAST and len(policy) == 3 and isinstance(policy[1], int)
+                and 0 < policy[1] <= len(policy[2])):
+            for part in policy[2]:
+                SignaturePolicy.validate(part)
+            return
+        raise ValueError(f"Invalid signature policy: {policy!r}")
+
+
+class _CompiledSignaturePolicy:
+    """
+    One order's SignaturePolicy as flat arrays of nodes (node 0 is the root).
+    An act keeps one progress number per node; a signature credits the leaves
+    it matches and only walks up from a leaf that has just been satisfied, so
+    its cost depends on the policy, never on the signatures already made.
+    """
+    __slots__ = ("order", "parents", "needs", "role_leaves", "weight_leaves", "count_leaves")
+
+    def __init__(self, order, policy):
+        self.order = order
+        self.parents = []
+        self.needs = []
+        self.role_leaves = {} # SignerRole -> node indices
+        self.weight_leaves = [] # contributors(percent) nodes
+        self.count_leaves = [] # signatures(n) nodes
+        contributed = sum(order.contributions.values(), _money.zero)
+        self._add(policy, -1, contributed)
+
+    def _add(self, policy, parent, contributed):
+        index = len(self.needs)
+        self.parents.append(parent)
+        self.needs.append(None)
+        kind = policy[0]
+        if kind == SignaturePolicy.SIGNATURES:
+            self.needs[index] = policy[1]
+            self.count_leaves.append(index)
+        elif kind == SignaturePolicy.ROLE:
+            self.needs[index] = 1
+            self.role_leaves.setdefault(policy[1], []).append(index)
+        elif kind == SignaturePolicy.CONTRIBUTORS:
+            self.needs[index] = _money.percent_threshold(contributed, Decimal(policy[1]))
+            self.weight_leaves.append(index)
+        else:
+            self.needs[index] = policy[1]
+            for part in policy[2]:
+                self._add(part, index, contributed)
+
+    def start(self):
+        return [0] * len(self.needs)
+
+    def advance(self, progress, signer_id):
+        """Counts a new signature in `progress`. Returns True if the policy is satisfied."""
+        for leaf in self.count_leaves:
+            self._credit(progress, leaf, 1)
+        role = self.order.signer_role(signer_id)
+        for leaf in self.role_leaves.get(role, ()):
+            self._credit(progress, leaf, 1)
+        if self.weight_leaves:
+            weight = self.order.contributions.get(signer_id)
+            if weight:
+                for leaf in self.weight_leaves:
+                    self._credit(progress, leaf, weight)
+        return progress[0] >= self.needs[0]
+
+    def _credit(self, progress, node, amount):
+        needs, parents = self.needs, self.parents
+        before = progress[node]
+        progress[node] = before + amount
+        # Propagate only when this node has just become satisfied
+        while before < needs[node] <= progress[node]:
+            node = parents[node]
+            if node < 0:
+                return
+            before = progress[node]
+            progress[node] = before + 1
+
 
 class Act:
     """Represents the completion act for a milestone, requiring signatures."""
-    def __init__(self, milestone_id, order_id):
+    __slots__ = ("act_id", "milestone_id", "order_id", "_signatures", "is_complete", "_policy", "_progress", "_sink")
+
+    def __init__(self, milestone_id, order_id, sink=None, policy=None):
         self.act_id = generate_id("act_")
         self.milestone_id = milestone_id
         self.order_id = order_id
-        self.signatures = set()
+        self._signatures = () # signer ids in signing order; a tuple is far smaller than a set
         self.is_complete = False
-        print(f"Act {self.act_id} created for Milestone {milestone_id} in Order {order_id}.")
+        self._attach_policy(policy)
+        self._sink = sink if sink is not None else _default_sink
+        self._sink.emit(EventKind.ACT_CREATED, EventLevel.INFO,
+                        "Act {act_id} created for Milestone {milestone_id} in Order {order_id}.",
+                        act_id=self.act_id, milestone_id=milestone_id, order_id=order_id)
 
     def add_signature(self, signer_id):
         if self.is_complete:
-            print(f"Act {self.act_id} is already complete. No more signatures needed.")
+            self._sink.emit(EventKind.ACT_ALREADY_COMPLETE, EventLevel.WARNING,
+                            "Act {act_id} is already complete. No more signatures needed.",
+                            act_id=self.act_id, order_id=self.order_id, signer_id=signer_id)
             return False
 
-        if signer_id in self.signatures:
-            print(f"Warning: {signer_id} has already signed Act {self.act_id}.")
+        if signer_id in self._signatures:
+            self._sink.emit(EventKind.DUPLICATE_SIGNATURE, EventLevel.WARNING,
+                            "Warning: {signer_id} has already signed Act {act_id}.",
+                            signer_id=signer_id, act_id=self.act_id, order_id=self.order_id)
             return False
 
-        self.signatures.add(signer_id)
-        print(f"Signature from '{signer_id}' added to Act {self.act_id}.")
+        self._signatures += (signer_id,)
+        self._sink.emit(EventKind.SIGNATURE_ADDED, EventLevel.INFO,
+                        "Signature from '{signer_id}' added to Act {act_id}.",
+                        signer_id=signer_id, act_id=self.act_id,
+                        order_id=self.order_id, milestone_id=self.milestone_id)
+        if self._policy is not None:
+            self._policy.advance(self._progress, signer_id)
         self.check_completion()
         return True
 
+    def _attach_policy(self, policy):
+        """Completes by `policy` (a _CompiledSignaturePolicy, None for the default) from now on."""
+        self._policy = policy
+        self._progress = None
+        if policy is not None:
+            # Signatures made so far count with their signers' current roles
+            self._progress = policy.start()
+            for signer_id in self._signatures:
+                policy.advance(self._progress, signer_id)
+
+    def _policy_satisfied(self):
+        if self._policy is None:
+            return len(self._signatures) >= MIN_SIGNATURES_REQUIRED
+        return self._progress[0] >= self._policy.needs[0]
+
+    @property
+    def signatures(self):
+        """
+        The signer ids as a frozenset: sign through add_signature. Mutating it
+        (signatures.add, or assigning the attribute) raises AttributeError
+        rather than changing a copy that the act never sees.
+        """
+        return frozenset(self._signatures)
+
     def check_completion(self):
-        if len(self.signatures) >= MIN_SIGNATURES_REQUIRED:
+        if self._policy_satisfied():
             self.is_complete = True
-            print(f"Act {self.act_id} is now complete with {len(self.signatures)} signatures.")
+            self._sink.emit(EventKind.ACT_COMPLETED, EventLevel.INFO,
+                            "Act {act_id} is now complete with {count} signatures.",
+                            act_id=self.act_id, count=len(self._signatures),
+                            order_id=self.order_id, milestone_id=self.milestone_id)
         return self.is_complete
 
     def __repr__(self):
         return (f"Act({self.act_id}, Milestone: {self.milestone_id}, "
-                f"Signatures: {self.signatures}, Complete: {self.is_complete})")
+                f"Signatures: {set(self._signatures)}, Complete: {self.is_complete})")
+
+_NO_CANDIDATES = frozenset()
 
 class Order:
     """Represents a group order with an escrow account."""
-    def __init__(self, creator_id, contractor_id, milestones_data):
-        self.order_id = generate_id("ord_")
-        self.creator_id = creator_id
-        self.contractor_id = contractor_id
-        self.representative_id = creator_id
-        self.milestones = {}
-        self.total_cost = Decimal("0.00")
-        self.escrow_balance = Decimal("0.00")
-        self.status = OrderStatus.PENDING
-        self.contributions = {}
-        self.votes_for_rep = {}
+    __slots__ = ("order_id", "creator_id", "contractor_id", "representative_id", "milestones", "total_cost",
+                 "escrow_balance", "status", "contributions", "votes_for_rep", "_rep_support", "_rep_qualified",
+                 "_rep_threshold", "milestone_counts", "paid_amount", "outstanding_amount", "funding_policy",
+                 "waitlist", "_signer_roles", "signature_policy", "_compiled_signature_policy", "_sink")
+
+    def __init__(self, creator_id, contractor_id, milestones_data, sink=None, funding_policy=FundingPolicy.ACCEPT):
+        self._init_state(generate_id("ord_"), creator_id, contractor_id, sink, funding_policy)
 
-        print(f"Creating Order {self.order_id} by Customer {creator_id} for Contractor {contractor_id}.")
+        self._sink.emit(EventKind.ORDER_INITIALIZING, EventLevel.INFO,
+                        "Creating Order {order_id} by Customer {creator_id} for Contractor {contractor_id}.",
+                        order_id=self.order_id, creator_id=creator_id, contractor_id=contractor_id)
 
         if not milestones_data:
              raise ValueError("Order must have at least one milestone.")
@@ -151,35 +973,158 @@ class Order:
         for desc, amount in milestones_data:
             try:
                 milestone = Milestone(desc, amount)
+                if milestone.milestone_id in self.milestones:
+                    raise RuntimeError(f"ID generator produced duplicate ID {milestone.milestone_id}.")
                 self.milestones[milestone.milestone_id] = milestone
                 self.total_cost += milestone.amount
-                print(f"  Added Milestone: {milestone.description} ({milestone.amount:.2f}) ID: {milestone.milestone_id}")
+                self._sink.emit(EventKind.MILESTONE_ADDED, EventLevel.INFO,
+                                "  Added Milestone: {description} ({amount:money}) ID: {milestone_id}",
+                                description=milestone.description, amount=milestone.amount,
+                                milestone_id=milestone.milestone_id, order_id=self.order_id)
             except ValueError as e:
-                print(f"  Error adding milestone '{desc}': {e}")
+                self._sink.emit(EventKind.INVALID_ORDER, EventLevel.ERROR,
+                                "  Error adding milestone '{description}': {error}",
+                                description=desc, error=e, order_id=self.order_id)
                 raise # Re-raise to stop order creation
 
-        print(f"Order {self.order_id} created. Total Cost: {self.total_cost:.2f}, Representative: {self.representative_id}")
+        self.milestone_counts[MilestoneStatus.PENDING] = len(self.milestones)
+        self.outstanding_amount = self.total_cost
+
+        self._sink.emit(EventKind.ORDER_CREATED, EventLevel.INFO,
+                        "Order {order_id} created. Total Cost: {total_cost:money}, Representative: {representative_id}",
+                        order_id=self.order_id, total_cost=self.total_cost, representative_id=self.representative_id)
+
+    @classmethod
+    def _prevalidated(cls, order_id, creator_id, contractor_id, milestones, total_cost, sink, funding_policy):
+        """An order built from milestones that were already validated, quietly (see create_orders_bulk)."""
+        order = cls.__new__(cls)
+        order._init_state(order_id, creator_id, contractor_id, sink, funding_policy)
+        order.milestones = milestones
+        order.total_cost = order.outstanding_amount = total_cost
+        order.milestone_counts[MilestoneStatus.PENDING] = len(milestones)
+        return order
+
+    def _init_state(self, order_id, creator_id, contractor_id, sink, funding_policy):
+        self.order_id = order_id
+        self.creator_id = creator_id
+        self.contractor_id = contractor_id
+        self.representative_id = creator_id
+        self.milestones = {}
+        self.total_cost = _money.zero
+        self.escrow_balance = _money.zero
+        self.status = OrderStatus.PENDING
+        self.contributions = {}
+        self.votes_for_rep = {}
+        # Running vote tally, kept in step with votes_for_rep and contributions
+        self._rep_support = {} # candidate_id -> total contribution amount of supporters
+        self._rep_qualified = _NO_CANDIDATES # candidates whose support is at or above the threshold
+        # Milestone aggregates, updated on every milestone status transition
+        self.milestone_counts = {MilestoneStatus.PENDING: 0, MilestoneStatus.COMPLETED_BY_CONTRACTOR: 0, MilestoneStatus.PAID: 0}
+        self.paid_amount = _money.zero
+        self.outstanding_amount = _money.zero
+        self.funding_policy = funding_policy
+        self.waitlist = {} # customer_id -> surplus offered beyond the total cost, under FundingPolicy.QUEUE
+        self._rep_threshold = None # computed on the first vote, most orders never see one
+        self._signer_roles = None # signer_id -> SignerRole, built on the first signature
+        self.signature_policy = None # see SignaturePolicy; None is the default 2-of-3
+        self._compiled_signature_policy = None # built for the first act, once the order is funded
+        self._sink = sink if sink is not None else _default_sink
 
     def add_contribution(self, customer_id, amount):
+        """
+        Adds what the funding policy accepts of `amount`. Returns the accepted
+        amount (which the caller debits), or False if nothing was accepted.
+        """
         if self.status != OrderStatus.PENDING:
-            print(f"Error: Order {self.order_id} is not pending contributions (Status: {self.status}).")
+            self._sink.emit(EventKind.INVALID_STATUS, EventLevel.ERROR,
+                            "Error: Order {order_id} is not pending contributions (Status: {status}).",
+                            order_id=self.order_id, status=self.status)
             return False
         if amount <= 0:
-            print("Error: Contribution amount must be positive.")
+            self._sink.emit(EventKind.INVALID_AMOUNT, EventLevel.ERROR,
+                            "Error: Contribution amount must be positive.", order_id=self.order_id, amount=amount)
             return False
 
-        amount_decimal = Decimal(str(amount))
-        self.escrow_balance += amount_decimal
-        self.contributions[customer_id] = self.contributions.get(customer_id, Decimal("0.00")) + amount_decimal
-        print(f"Contribution of {amount_decimal:.2f} from Customer {customer_id} added to Order {self.order_id}.")
-        print(f"  Order {self.order_id} Escrow: {self.escrow_balance:.2f} / {self.total_cost:.2f}")
+        amount_value = _money.coerce(amount)
+        split = self._split_contribution(self.escrow_balance, amount_value)
+        if split is None:
+            self._sink.emit(EventKind.INVALID_AMOUNT, EventLevel.ERROR,
+                            "Error: Contribution of {amount:money} would overfund Order {order_id} "
+                            "(remaining: {remaining:money}).",
+                            amount=amount_value, order_id=self.order_id, customer_id=customer_id,
+                            remaining=self.total_cost - self.escrow_balance)
+            return False
+        accepted, surplus = split
+        self.escrow_balance += accepted
+        self.contributions[customer_id] = self.contributions.get(customer_id, _money.zero) + accepted
+        if customer_id in self.votes_for_rep:
+            self._adjust_rep_support(self.votes_for_rep[customer_id], accepted)
+        self._sink.emit(EventKind.CONTRIBUTION_ADDED, EventLevel.INFO,
+                        "Contribution of {amount:money} from Customer {customer_id} added to Order {order_id}.\n"
+                        "  Order {order_id} Escrow: {escrow_balance:money} / {total_cost:money}",
+                        amount=accepted, customer_id=customer_id, order_id=self.order_id,
+                        escrow_balance=self.escrow_balance, total_cost=self.total_cost)
+        if surplus:
+            self._decline_surplus(customer_id, surplus)
+        self.check_funding_status()
+        return accepted
+
+    def _split_contribution(self, escrow, amount):
+        """
+        (accepted, surplus) for a contribution of `amount` to this order's escrow
+        holding `escrow`, or None if the funding policy refuses it.
+        """
+        remaining = self.total_cost - escrow
+        if amount <= remaining or self.funding_policy == FundingPolicy.ACCEPT:
+            return amount, _money.zero
+        if self.funding_policy == FundingPolicy.REJECT:
+            return None
+        return remaining, amount - remaining
+
+    def _decline_surplus(self, customer_id, surplus):
+        """Reports the part of a contribution that was not taken, and waitlists it under FundingPolicy.QUEUE."""
+        if self.funding_policy == FundingPolicy.QUEUE:
+            self.waitlist[customer_id] = self.waitlist.get(customer_id, _money.zero) + surplus
+            self._sink.emit(EventKind.CONTRIBUTION_QUEUED, EventLevel.INFO,
+                            "  {amount:money} from Customer {customer_id} exceeds what Order {order_id} needs; waitlisted.",
+                            amount=surplus, customer_id=customer_id, order_id=self.order_id,
+                            waitlisted=self.waitlist[customer_id])
+        else:
+            self._sink.emit(EventKind.CONTRIBUTION_CAPPED, EventLevel.INFO,
+                            "  {amount:money} from Customer {customer_id} exceeds what Order {order_id} needs; not taken.",
+                            amount=surplus, customer_id=customer_id, order_id=self.order_id)
+
+    def add_contributions(self, contributions):
+        """
+        Bulk variant of add_contribution for pre-validated (customer_id, accepted, surplus)
+        triples, already split by _split_contribution: `accepted` is taken as it is.
+        Funding status is recomputed once, after the whole group has been added.
+        """
+        if self.status != OrderStatus.PENDING:
+            self._sink.emit(EventKind.INVALID_STATUS, EventLevel.ERROR,
+                            "Error: Order {order_id} is not pending contributions (Status: {status}).",
+                            order_id=self.order_id, status=self.status)
+            return False
+        for customer_id, amount, surplus in contributions:
+            self.escrow_balance += amount
+            self.contributions[customer_id] = self.contributions.get(customer_id, _money.zero) + amount
+            if customer_id in self.votes_for_rep:
+                self._adjust_rep_support(self.votes_for_rep[customer_id], amount)
+            self._sink.emit(EventKind.CONTRIBUTION_ADDED, EventLevel.INFO,
+                            "Contribution of {amount:money} from Customer {customer_id} added to Order {order_id}.\n"
+                            "  Order {order_id} Escrow: {escrow_balance:money} / {total_cost:money}",
+                            amount=amount, customer_id=customer_id, order_id=self.order_id,
+                            escrow_balance=self.escrow_balance, total_cost=self.total_cost)
+            if surplus:
+                self._decline_surplus(customer_id, surplus)
         self.check_funding_status()
         return True
 
     def check_funding_status(self):
         if self.status == OrderStatus.PENDING and self.escrow_balance >= self.total_cost:
             self.status = OrderStatus.FUNDED
-            print(f"Order {self.order_id} is now fully FUNDED!")
+            self._sink.emit(EventKind.ORDER_FUNDED, EventLevel.INFO,
+                            "Order {order_id} is now fully FUNDED!", order_id=self.order_id)
         return self.status
 
     def get_milestone(self, milestone_id):
@@ -187,203 +1132,473 @@ class Order:
 
     def mark_milestone_complete_by_contractor(self, milestone_id):
         if self.status not in [OrderStatus.FUNDED, OrderStatus.IN_PROGRESS]:
-             print(f"Error: Order {self.order_id} must be FUNDED or IN_PROGRESS to mark milestones (Current: {self.status}).")
+             self._sink.emit(EventKind.INVALID_STATUS, EventLevel.ERROR,
+                             "Error: Order {order_id} must be FUNDED or IN_PROGRESS to mark milestones (Current: {status}).",
+                             order_id=self.order_id, status=self.status)
              return None
 
         milestone = self.get_milestone(milestone_id)
         if not milestone:
-            print(f"Error: Milestone {milestone_id} not found in Order {self.order_id}.")
+            self._sink.emit(EventKind.NOT_FOUND, EventLevel.ERROR,
+                            "Error: Milestone {milestone_id} not found in Order {order_id}.",
+                            milestone_id=milestone_id, order_id=self.order_id)
             return None
         if milestone.status != MilestoneStatus.PENDING:
-            print(f"Error: Milestone {milestone_id} is not in PENDING status (Current: {milestone.status}).")
+            self._sink.emit(EventKind.INVALID_STATUS, EventLevel.ERROR,
+                            "Error: Milestone {milestone_id} is not in PENDING status (Current: {status}).",
+                            milestone_id=milestone_id, status=milestone.status, order_id=self.order_id)
             return None
 
-        milestone.status = MilestoneStatus.COMPLETED_BY_CONTRACTOR
-        milestone.act = Act(milestone_id, self.order_id)
+        self._set_milestone_status(milestone, MilestoneStatus.COMPLETED_BY_CONTRACTOR)
+        milestone.act = Act(milestone_id, self.order_id, self._sink, self._signature_evaluator())
         self.status = OrderStatus.IN_PROGRESS
-        print(f"Milestone {milestone_id} ('{milestone.description}') in Order {self.order_id} marked as COMPLETED_BY_CONTRACTOR.")
+        self._sink.emit(EventKind.MILESTONE_COMPLETED, EventLevel.INFO,
+                        "Milestone {milestone_id} ('{description}') in Order {order_id} marked as COMPLETED_BY_CONTRACTOR.",
+                        milestone_id=milestone_id, description=milestone.description, order_id=self.order_id,
+                        act_id=milestone.act.act_id)
         return milestone.act
 
     def release_funds_for_milestone(self, milestone):
         if not milestone or not milestone.act or not milestone.act.is_complete:
-             print(f"Error: Cannot release funds. Act for milestone {milestone.milestone_id} not complete or doesn't exist.")
-             return False, Decimal("0.00")
+             self._sink.emit(EventKind.RELEASE_FAILED, EventLevel.ERROR,
+                             "Error: Cannot release funds. Act for milestone {milestone_id} not complete or doesn't exist.",
+                             milestone_id=milestone.milestone_id, order_id=self.order_id)
+             return False, _money.zero
 
         if milestone.status == MilestoneStatus.PAID:
-            print(f"Warning: Funds for milestone {milestone.milestone_id} already released.")
-            return False, Decimal("0.00")
+            self._sink.emit(EventKind.ALREADY_PAID, EventLevel.WARNING,
+                            "Warning: Funds for milestone {milestone_id} already released.",
+                            milestone_id=milestone.milestone_id, order_id=self.order_id)
+            return False, _money.zero
 
         # Double check status allows payment release
         if milestone.status != MilestoneStatus.COMPLETED_BY_CONTRACTOR:
-             print(f"Error: Milestone {milestone.milestone_id} is not in '{MilestoneStatus.COMPLETED_BY_CONTRACTOR}' status (Current: {milestone.status}). Cannot release funds.")
-             return False, Decimal("0.00")
+             self._sink.emit(EventKind.INVALID_STATUS, EventLevel.ERROR,
+                             "Error: Milestone {milestone_id} is not in '{required}' status (Current: {status}). Cannot release funds.",
+                             milestone_id=milestone.milestone_id, required=MilestoneStatus.COMPLETED_BY_CONTRACTOR,
+                             status=milestone.status, order_id=self.order_id)
+             return False, _money.zero
 
 
         amount_to_release = milestone.amount
         if self.escrow_balance < amount_to_release:
-             print(f"CRITICAL ERROR: Insufficient escrow balance ({self.escrow_balance:.2f}) "
-                   f"for milestone {milestone.milestone_id} amount ({amount_to_release:.2f}). Order {self.order_id}")
-             return False, Decimal("0.00")
+             self._sink.emit(EventKind.RELEASE_FAILED, EventLevel.CRITICAL,
+                             "CRITICAL ERROR: Insufficient escrow balance ({escrow_balance:money}) "
+                             "for milestone {milestone_id} amount ({amount:money}). Order {order_id}",
+                             escrow_balance=self.escrow_balance, milestone_id=milestone.milestone_id,
+                             amount=amount_to_release, order_id=self.order_id)
+             return False, _money.zero
 
         self.escrow_balance -= amount_to_release
-        milestone.status = MilestoneStatus.PAID
-        print(f"Funds ({amount_to_release:.2f}) released for Milestone {milestone.milestone_id} ('{milestone.description}') in Order {self.order_id}.")
-        print(f"  Order {self.order_id} New Escrow Balance: {self.escrow_balance:.2f}")
+        self._set_milestone_status(milestone, MilestoneStatus.PAID)
+        self.paid_amount += amount_to_release
+        self.outstanding_amount -= amount_to_release
+        self._sink.emit(EventKind.FUNDS_RELEASED, EventLevel.INFO,
+                        "Funds ({amount:money}) released for Milestone {milestone_id} ('{description}') in Order {order_id}.\n"
+                        "  Order {order_id} New Escrow Balance: {escrow_balance:money}",
+                        amount=amount_to_release, milestone_id=milestone.milestone_id,
+                        description=milestone.description, order_id=self.order_id,
+                        escrow_balance=self.escrow_balance)
 
         self._check_order_completion()
         return True, amount_to_release
 
+    def _set_milestone_status(self, milestone, status):
+        self.milestone_counts[milestone.status] -= 1
+        self.milestone_counts[status] += 1
+        milestone.status = status
+
+    def progress(self):
+        """Milestone and payout progress, read from the maintained counters."""
+        return {
+            "milestones_total": len(self.milestones),
+            "milestones_pending": self.milestone_counts[MilestoneStatus.PENDING],
+            "milestones_awaiting_signatures": self.milestone_counts[MilestoneStatus.COMPLETED_BY_CONTRACTOR],
+            "milestones_paid": self.milestone_counts[MilestoneStatus.PAID],
+            "paid_amount": self.paid_amount,
+            "outstanding_amount": self.outstanding_amount,
+        }
+
     def _check_order_completion(self):
-        all_paid = all(ms.status == MilestoneStatus.PAID for ms in self.milestones.values())
+        all_paid = self.milestone_counts[MilestoneStatus.PAID] == len(self.milestones)
         if all_paid and self.status != OrderStatus.COMPLETED:
             self.status = OrderStatus.COMPLETED
-            print(f"Order {self.order_id} is now fully COMPLETED.")
+            self._sink.emit(EventKind.ORDER_COMPLETED, EventLevel.INFO,
+                            "Order {order_id} is now fully COMPLETED.", order_id=self.order_id)
 
     def add_vote(self, voter_id, candidate_id):
         if voter_id not in self.contributions:
-            print(f"Error: Voter {voter_id} has not contributed to Order {self.order_id}.")
+            self._sink.emit(EventKind.NOT_A_CONTRIBUTOR, EventLevel.ERROR,
+                            "Error: Voter {voter_id} has not contributed to Order {order_id}.",
+                            voter_id=voter_id, order_id=self.order_id)
             return False
         if candidate_id not in self.contributions:
             # Check if candidate exists as a user, even if they haven't contributed (original requirement is they must have contributed)
             # Sticking to original requirement: candidate must be a contributor
-            print(f"Error: Candidate {candidate_id} has not contributed to Order {self.order_id}.")
+            self._sink.emit(EventKind.NOT_A_CONTRIBUTOR, EventLevel.ERROR,
+                            "Error: Candidate {candidate_id} has not contributed to Order {order_id}.",
+                            candidate_id=candidate_id, order_id=self.order_id)
             return False
         # Allow self-votes
         # if voter_id == candidate_id:
         #      print(f"Info: Voter {voter_id} voted for themselves.")
 
+        weight = self.contributions[voter_id]
+        previous_candidate = self.votes_for_rep.get(voter_id)
+        if previous_candidate is not None:
+            self._adjust_rep_support(previous_candidate, -weight)
         self.votes_for_rep[voter_id] = candidate_id
-        print(f"Vote recorded: {voter_id} votes for {candidate_id} in Order {self.order_id}.")
+        self._adjust_rep_support(candidate_id, weight)
+        self._sink.emit(EventKind.VOTE_RECORDED, EventLevel.INFO,
+                        "Vote recorded: {voter_id} votes for {candidate_id} in Order {order_id}.",
+                        voter_id=voter_id, candidate_id=candidate_id, order_id=self.order_id)
         # Check votes immediately after each vote
         self.check_votes()
         return True
 
-    def check_votes(self):
-        print(f"Checking votes for representative change in Order {self.order_id}...")
-        candidate_support = {} # candidate_id -> total contribution amount of supporters
-        total_contributed_by_voters = Decimal("0.00")
-
-        for voter_id, candidate_id in self.votes_for_rep.items():
-            voter_contribution = self.contributions.get(voter_id, Decimal("0.00"))
-            candidate_support[candidate_id] = candidate_support.get(candidate_id, Decimal("0.00")) + voter_contribution
-            total_contributed_by_voters += voter_contribution # Keep track of total voting power
+    def signer_role(self, signer_id):
+        """The SignerRole in which `signer_id` may sign this order's acts, or None if they may not."""
+        roles = self._signer_roles
+        if roles is None:
+            # Later entries win: platform over contractor over representative
+            roles = self._signer_roles = {
+                self.representative_id: SignerRole.REPRESENTATIVE,
+                self.contractor_id: SignerRole.CONTRACTOR,
+                PLATFORM_SIGNATURE_ID: SignerRole.PLATFORM,
+            }
+        role = roles.get(signer_id)
+        if role is None and self.signature_policy is not None and signer_id in self.contributions:
+            policy = self._signature_evaluator()
+            if policy.weight_leaves or SignerRole.CONTRIBUTOR in policy.role_leaves:
+                return SignerRole.CONTRIBUTOR
+        return role
+
+    def _signature_evaluator(self):
+        """The signature policy compiled for this order's acts, or None for the default policy."""
+        if self.signature_policy is None:
+            return None
+        if self._compiled_signature_policy is None:
+            self._compiled_signature_policy = _CompiledSignaturePolicy(self, self.signature_policy)
+        return self._compiled_signature_policy
+
+    def _vote_threshold(self):
+        if self._rep_threshold is None:
+            # Requirement: "75% of the total amount in the order" - interpreting this as 75% of the order's *total cost*
+            self._rep_threshold = _money.percent_threshold(self.total_cost, REP_VOTE_THRESHOLD_PERCENT)
+        return self._rep_threshold
+
+    def _adjust_rep_support(self, candidate_id, delta):
+        support = self._rep_support.get(candidate_id, _money.zero) + delta
+        if support:
+            self._rep_support[candidate_id] = support
+        else:
+            # Contributions are positive, so zero support means no votes left for this candidate
+            self._rep_support.pop(candidate_id, None)
+        # Crossing the threshold is rare, so the qualified set is an immutable frozenset
+        # that all orders without a qualified candidate share
+        qualified = bool(support) and support >= self._vote_threshold()
+        if qualified != (candidate_id in self._rep_qualified):
+            if qualified:
+                self._rep_qualified = self._rep_qualified | {candidate_id}
+            else:
+                self._rep_qualified = self._rep_qualified - {candidate_id}
 
-        # Requirement: "75% of the total amount in the order" - interpreting this as 75% of the order's *total cost*
-        threshold_amount = (self.total_cost * REP_VOTE_THRESHOLD_PERCENT) / Decimal("100.0")
+    def _reset_votes(self):
+        self.votes_for_rep.clear()
+        self._rep_support.clear()
+        self._rep_qualified = _NO_CANDIDATES
 
-        print(f"  Vote support totals: { {c: s.to_eng_string() for c, s in candidate_support.items()} }")
-        print(f"  Total Order Cost (Base for %): {self.total_cost:.2f}")
-        print(f"  Required support amount (>= {REP_VOTE_THRESHOLD_PERCENT}%): {threshold_amount:.2f}")
+    def check_votes(self):
+        threshold_amount = self._vote_threshold()
+
+        if self._sink.enabled(EventLevel.DEBUG):
+            # Report support in first-vote order, as a full recount would list it
+            self._sink.emit(EventKind.VOTE_TALLY, EventLevel.DEBUG,
+                            "Checking votes for representative change in Order {order_id}...\n"
+                            "  Vote support totals: {support}\n"
+                            "  Total Order Cost (Base for %): {total_cost:money}\n"
+                            "  Required support amount (>= {percent}%): {threshold:money}",
+                            order_id=self.order_id,
+                            support={c: _money.to_string(self._rep_support[c])
+                                     for c in dict.fromkeys(self.votes_for_rep.values())},
+                            total_cost=self.total_cost, percent=REP_VOTE_THRESHOLD_PERCENT,
+                            threshold=threshold_amount)
 
         successful_candidate = None
-        max_support = Decimal("-1.0") # Track max support in case of ties (though first past post wins here)
-
-        for candidate_id, support_amount in candidate_support.items():
-            if support_amount >= threshold_amount:
-                 # Check if this candidate has more support than previous winners in this check cycle (unlikely needed but safe)
-                if support_amount > max_support:
+        if len(self._rep_qualified) == 1:
+            successful_candidate = next(iter(self._rep_qualified))
+        elif self._rep_qualified:
+            # Several candidates over the threshold (only possible when the order is overfunded):
+            # the first one in first-vote order wins, as in a full recount
+            for candidate_id in self.votes_for_rep.values():
+                if candidate_id in self._rep_qualified:
                     successful_candidate = candidate_id
-                    max_support = support_amount
-                    print(f"  Candidate {candidate_id} reached threshold with {support_amount:.2f} support!")
-                    # Break or continue? Let's take the first one to reach threshold.
                     break
-
         if successful_candidate:
+            self._sink.emit(EventKind.VOTE_THRESHOLD_REACHED, EventLevel.INFO,
+                            "  Candidate {candidate_id} reached threshold with {support:money} support!",
+                            candidate_id=successful_candidate, support=self._rep_support[successful_candidate],
+                            order_id=self.order_id)
             if successful_candidate != self.representative_id:
                 old_rep = self.representative_id
                 self.representative_id = successful_candidate
-                self.votes_for_rep.clear() # Reset votes after successful change
-                print(f"Representative CHANGE successful for Order {self.order_id}!")
-                print(f"  Old Representative: {old_rep}")
-                print(f"  New Representative: {self.representative_id}")
-                print("  Votes have been reset.")
+                self._signer_roles = None
+                self._reset_votes() # Reset votes after successful change
+                self._sink.emit(EventKind.REPRESENTATIVE_CHANGED, EventLevel.INFO,
+                                "Representative CHANGE successful for Order {order_id}!\n"
+                                "  Old Representative: {old_representative_id}\n"
+                                "  New Representative: {representative_id}",
+                                order_id=self.order_id, old_representative_id=old_rep,
+                                representative_id=self.representative_id)
             else:
-                 print(f"  Vote confirms current representative {self.representative_id}. No change needed.")
+                 self._sink.emit(EventKind.REPRESENTATIVE_CONFIRMED, EventLevel.INFO,
+                                 "  Vote confirms current representative {representative_id}. No change needed.",
+                                 representative_id=self.representative_id, order_id=self.order_id)
                  # Decide whether to clear votes even if the rep is confirmed
-                 self.votes_for_rep.clear()
-                 print("  Votes have been reset.")
+                 self._reset_votes()
+            self._sink.emit(EventKind.VOTES_RESET, EventLevel.INFO,
+                            "  Votes have been reset.", order_id=self.order_id)
         else:
-            print("  No candidate reached the 75% threshold yet.")
-
+            self._sink.emit(EventKind.VOTE_THRESHOLD_NOT_REACHED, EventLevel.INFO,
+                            "  No candidate reached the 75% threshold yet.", order_id=self.order_id)
+
+
+    def to_view(self):
+        """
+        The order as plain data (JSON-serialisable): what view_status and
+        view_milestones print, with amounts formatted as they are printed.
+        """
+        funding_pct = _money.percent_of(self.escrow_balance, self.total_cost) if self.total_cost > 0 else Decimal("0.0")
+        return {
+            "order_id": self.order_id,
+            "status": self.status,
+            "creator_id": self.creator_id,
+            "contractor_id": self.contractor_id,
+            "representative_id": self.representative_id,
+            "total_cost": format_amount(self.total_cost),
+            "escrow_balance": format_amount(self.escrow_balance),
+            "funding_percent": f"{funding_pct:.1f}",
+            "contributions": {cid: format_amount(amount) for cid, amount in self.contributions.items()},
+            "waitlist": {cid: format_amount(amount) for cid, amount in self.waitlist.items()},
+            "votes_for_rep": dict(self.votes_for_rep),
+            "milestones": [{
+                "milestone_id": ms.milestone_id,
+                "description": ms.description,
+                "amount": format_amount(ms.amount),
+                "status": ms.status,
+                "act": None if ms.act is None else {
+                    "act_id": ms.act.act_id,
+                    "signatures": list(ms.act._signatures),
+                    "is_complete": ms.act.is_complete,
+                },
+            } for ms in self.milestones.values()],
+        }
 
     def view_status(self):
-        print(f"\n--- Status for Order {self.order_id} ---")
-        print(f"Status: {self.status}")
-        print(f"Creator: {self.creator_id}")
-        print(f"Contractor: {self.contractor_id}")
-        print(f"Representative: {self.representative_id}")
-        print(f"Total Cost: {self.total_cost:.2f}")
-        print(f"Escrow Balance: {self.escrow_balance:.2f}")
-        funding_pct = (self.escrow_balance / self.total_cost * 100) if self.total_cost > 0 else Decimal("0.0")
-        print(f"Funding Progress: {funding_pct:.1f}% funded")
-        print("Contributions:")
-        if self.contributions:
-            for cid, amount in self.contributions.items():
-                print(f"  - {cid}: {amount:.2f}")
-        else:
-            print("  (No contributions yet)")
-        print("Current Votes for Representative:")
-        if self.votes_for_rep:
-            for voter, candidate in self.votes_for_rep.items():
-                print(f"  - {voter} voted for {candidate}")
-        else:
-             print("  (No active votes)")
-        print("-" * (len(f"--- Status for Order {self.order_id} ---")))
-
+        if not self._sink.enabled(EventLevel.INFO):
+            return
+        self._sink.emit(EventKind.VIEW, EventLevel.INFO, "{report}", report=render_order_status(self.to_view()),
+                        order_id=self.order_id)
 
     def view_milestones(self):
-        print(f"--- Milestones for Order {self.order_id} ---")
-        if not self.milestones:
-            print(" (No milestones defined)")
-        for ms_id, ms in self.milestones.items():
-            print(f"  - ID: {ms_id}")
-            print(f"    Desc: {ms.description}")
-            print(f"    Amount: {ms.amount:.2f}")
-            print(f"    Status: {ms.status}")
-            if ms.act:
-                print(f"    Act ID: {ms.act.act_id}")
-                print(f"    Act Signatures: {ms.act.signatures or '(None)'}")
-                print(f"    Act Complete: {ms.act.is_complete}")
-        print("-" * (len(f"--- Milestones for Order {self.order_id} ---")))
+        if not self._sink.enabled(EventLevel.INFO):
+            return
+        self._sink.emit(EventKind.VIEW, EventLevel.INFO, "{report}", report=render_order_milestones(self.to_view()),
+                        order_id=self.order_id)
 
     def __repr__(self):
-        return f"Order({self.order_id}, Status: {self.status}, Cost: {self.total_cost:.2f}, Escrow: {self.escrow_balance:.2f})"
+        return f"Order({self.order_id}, Status: {self.status}, Cost: {format_amount(self.total_cost)}, Escrow: {format_amount(self.escrow_balance)})"
+
+
+# --- Reports ---
+# The printed reports, rendered from the plain data of Order.to_view and EscrowApplication.user_orders_view.
+
+def render_order_status(view):
+    header = f"--- Status for Order {view['order_id']} ---"
+    lines = [
+        f"\n{header}",
+        f"Status: {view['status']}",
+        f"Creator: {view['creator_id']}",
+        f"Contractor: {view['contractor_id']}",
+        f"Representative: {view['representative_id']}",
+        f"Total Cost: {view['total_cost']}",
+        f"Escrow Balance: {view['escrow_balance']}",
+        f"Funding Progress: {view['funding_percent']}% funded",
+        "Contributions:",
+    ]
+    if view["contributions"]:
+        for cid, amount in view["contributions"].items():
+            lines.append(f"  - {cid}: {amount}")
+    else:
+        lines.append("  (No contributions yet)")
+    if view["waitlist"]:
+        lines.append("Waitlisted Surplus:")
+        for cid, amount in view["waitlist"].items():
+            lines.append(f"  - {cid}: {amount}")
+    lines.append("Current Votes for Representative:")
+    if view["votes_for_rep"]:
+        for voter, candidate in view["votes_for_rep"].items():
+            lines.append(f"  - {voter} voted for {candidate}")
+    else:
+         lines.append("  (No active votes)")
+    lines.append("-" * len(header))
+    return "\n".join(lines)
+
+def render_order_milestones(view):
+    header = f"--- Milestones for Order {view['order_id']} ---"
+    lines = [header]
+    if not view["milestones"]:
+        lines.append(" (No milestones defined)")
+    for ms in view["milestones"]:
+        lines.append(f"  - ID: {ms['milestone_id']}")
+        lines.append(f"    Desc: {ms['description']}")
+        lines.append(f"    Amount: {ms['amount']}")
+        lines.append(f"    Status: {ms['status']}")
+        act = ms["act"]
+        if act:
+            lines.append(f"    Act ID: {act['act_id']}")
+            lines.append(f"    Act Signatures: {set(act['signatures']) or '(None)'}")
+            lines.append(f"    Act Complete: {act['is_complete']}")
+    lines.append("-" * len(header))
+    return "\n".join(lines)
+
+def render_user_orders(view):
+    lines = [f"\n--- Orders associated with {view['name']} ({view['user_id']}) ---"]
+    if view["user_type"] == UserType.CUSTOMER:
+        lines.append("Orders Created:")
+        if view["orders_created"]:
+            for oid in view["orders_created"]: lines.append(f"  - {oid}")
+        else: lines.append("  (None)")
+        lines.append("Orders Joined (Contributions):")
+        if view["orders_joined"]:
+            for oid, amount in view["orders_joined"].items(): lines.append(f"  - {oid} (Contributed: {amount})")
+        else: lines.append("  (None)")
+    else:
+         lines.append("Orders Assigned:")
+         if view["orders_assigned"]:
+             for oid in view["orders_assigned"]: lines.append(f"  - {oid}")
+         else: lines.append("  (None)")
+    lines.append("-" * 30)
+    return "\n".join(lines)
+
+
+class BatchResult:
+    """Outcome of one operation passed to EscrowApplication.apply_batch."""
+    __slots__ = ("index", "operation", "success", "error")
+
+    def __init__(self, index, operation, success, error=None):
+        self.index = index
+        self.operation = operation
+        self.success = success
+        self.error = error # EventKind describing why the operation was not applied
+
+    def __repr__(self):
+        outcome = "OK" if self.success else self.error
+        return f"BatchResult(#{self.index}, {self.operation[0] if self.operation else None}, {outcome})"
+
+
+class BulkOrderResult:
+    """Outcome of one row passed to EscrowApplication.create_orders_bulk."""
+    __slots__ = ("index", "order", "error", "reason")
+
+    def __init__(self, index, order=None, error=None, reason=None):
+        self.index = index
+        self.order = order # the registered Order, or None if the row was rejected
+        self.error = error # EventKind describing why the row was rejected
+        self.reason = reason
+
+    @property
+    def success(self):
+        return self.order is not None
+
+    def __repr__(self):
+        outcome = self.order.order_id if self.order is not None else f"{self.error}: {self.reason}"
+        return f"BulkOrderResult(#{self.index}, {outcome})"
+
+
+def _parse_milestone_amounts(amounts):
+    """
+    Engine values of many milestone amounts at once, with None for each one
+    that is not a positive amount. Whole-unit int amounts, the usual case for
+    templated imports, are checked as one NumPy array when NumPy is available.
+    """
+    if all(type(amount) is int for amount in amounts):
+        positive = None
+        if numpy is not None:
+            try:
+                positive = (numpy.array(amounts, dtype=numpy.int64) > 0).tolist()
+            except OverflowError: # beyond int64; Python ints have no such limit
+                pass
+        if positive is None:
+            positive = [amount > 0 for amount in amounts]
+        # Decimal(int) is exactly DecimalMoney.parse(int), without the detour through str
+        parse = Decimal if type(_money) is DecimalMoney else _money.parse
+        return [parse(amount) if ok else None for amount, ok in zip(amounts, positive)]
+    values = []
+    for amount in amounts:
+        try:
+            value = _money.parse(amount)
+        except (ArithmeticError, ValueError, TypeError):
+            value = None
+        values.append(value if value is not None and value > 0 else None)
+    return values
 
 
 # --- Application Class (Orchestrator) ---
 
 class EscrowApplication:
-    def __init__(self):
+    def __init__(self, sink=None, funding_policy=FundingPolicy.ACCEPT, signature_policy=None):
         self.users = {} # user_id: User object
         self.orders = {} # order_id: Order object
-        print("Escrow Application Initialized.")
+        self.funding_policy = funding_policy # for orders created from now on, see FundingPolicy
+        # For orders created from now on: a SignaturePolicy, or a function of the new order returning one
+        self.signature_policy = signature_policy
+        # Every object created by this application reports through the same sink
+        self.sink = sink if sink is not None else _default_sink
+        self.sink.emit(EventKind.APP_INITIALIZED, EventLevel.INFO, "Escrow Application Initialized.")
 
     def _get_user(self, user_id):
         user = self.users.get(user_id)
         if not user:
-            print(f"Error: User with ID {user_id} not found.")
+            self.sink.emit(EventKind.NOT_FOUND, EventLevel.ERROR,
+                           "Error: User with ID {user_id} not found.", user_id=user_id)
         return user
 
     def _get_order(self, order_id):
         order = self.orders.get(order_id)
         if not order:
-            print(f"Error: Order with ID {order_id} not found.")
+            self.sink.emit(EventKind.NOT_FOUND, EventLevel.ERROR,
+                           "Error: Order with ID {order_id} not found.", order_id=order_id)
         return order
 
+    def _signature_policy_for(self, order):
+        policy = self.signature_policy(order) if callable(self.signature_policy) else self.signature_policy
+        if policy is not None:
+            SignaturePolicy.validate(policy)
+        return policy
+
+    @staticmethod
+    def _register(table, object_id, obj):
+        # A repeated id means the ID generator is broken; fail instead of overwriting the existing entry
+        if object_id in table:
+            raise RuntimeError(f"ID generator produced duplicate ID {object_id}.")
+        table[object_id] = obj
+
     def create_customer(self, name):
-        customer = Customer(name)
-        self.users[customer.user_id] = customer
+        customer = Customer(name, self.sink)
+        self._register(self.users, customer.user_id, customer)
         return customer
 
     def create_contractor(self, name):
-        contractor = Contractor(name)
-        self.users[contractor.user_id] = contractor
+        contractor = Contractor(name, self.sink)
+        self._register(self.users, contractor.user_id, contractor)
         return contractor
 
     def customer_deposit(self, customer_id, amount):
         customer = self._get_user(customer_id)
         if not customer or not isinstance(customer, Customer):
-            print(f"Error: Customer {customer_id} not found or invalid type.")
+            self.sink.emit(EventKind.INVALID_USER, EventLevel.ERROR,
+                           "Error: Customer {user_id} not found or invalid type.", user_id=customer_id)
             return False
         return customer.deposit(amount)
 
@@ -393,77 +1608,206 @@ class EscrowApplication:
         contractor = self._get_user(contractor_id)
 
         if not customer or not isinstance(customer, Customer):
-            print(f"Error: Creator Customer {customer_id} not found or invalid type.")
+            self.sink.emit(EventKind.INVALID_USER, EventLevel.ERROR,
+                           "Error: Creator Customer {user_id} not found or invalid type.", user_id=customer_id)
             return None
         if not contractor or not isinstance(contractor, Contractor):
-            print(f"Error: Contractor {contractor_id} not found or invalid type.")
+            self.sink.emit(EventKind.INVALID_USER, EventLevel.ERROR,
+                           "Error: Contractor {user_id} not found or invalid type.", user_id=contractor_id)
             return None
         # Check for milestones_data being None or empty list
         if not milestones_data:
-            print("Error: Cannot create order with no milestones.")
+            self.sink.emit(EventKind.INVALID_ORDER, EventLevel.ERROR,
+                           "Error: Cannot create order with no milestones.", customer_id=customer_id)
             return None
 
         try:
-            order = Order(customer_id, contractor_id, milestones_data)
-            self.orders[order.order_id] = order
+            order = Order(customer_id, contractor_id, milestones_data, self.sink, self.funding_policy)
+            order.signature_policy = self._signature_policy_for(order)
+            self._register(self.orders, order.order_id, order)
             customer.orders_created[order.order_id] = order
             contractor.assigned_orders.add(order.order_id)
-            print(f"Order {order.order_id} successfully registered in the application.")
+            self.sink.emit(EventKind.ORDER_REGISTERED, EventLevel.INFO,
+                           "Order {order_id} successfully registered in the application.",
+                           order_id=order.order_id, order=order)
             return order
         except ValueError as e:
-             print(f"Failed to create order: {e}")
+             self.sink.emit(EventKind.INVALID_ORDER, EventLevel.ERROR,
+                            "Failed to create order: {error}", error=e, customer_id=customer_id)
              return None
         except Exception as e:
-            print(f"An unexpected error occurred during order creation: {e}")
+            self.sink.emit(EventKind.INVALID_ORDER, EventLevel.CRITICAL,
+                           "An unexpected error occurred during order creation: {error}",
+                           error=e, customer_id=customer_id)
             # In a real app, log this exception trace
             return None
 
+    def create_orders_bulk(self, rows):
+        """
+        Creates many orders in one call, e.g. for a marketplace import.
+        rows: iterable of (customer_id, contractor_id, milestones_data), each as for create_order.
+
+        The milestone amounts of all rows are validated together, the order and
+        milestone ids are allocated in two blocks, and the valid orders are
+        registered in one pass. A bad row (unknown users, no milestones, a
+        malformed or non-positive amount) is rejected on its own. Each order
+        reports ORDER_REGISTERED only, not the per-milestone messages of create_order.
+        Returns a list of BulkOrderResult, one per row.
+        """
+        results = []
+        candidates = [] # (result, customer, contractor, descriptions, position of the first amount)
+        amounts = [] # milestone amounts of every candidate row, in row order
+        for index, row in enumerate(rows):
+            result = BulkOrderResult(index)
+            results.append(result)
+            try:
+                customer_id, contractor_id, milestones_data = row
+                milestones_data = list(milestones_data or ())
+                descriptions = [description for description, _ in milestones_data]
+            except (TypeError, ValueError):
+                result.error = EventKind.INVALID_OPERATION
+                result.reason = "expected (customer_id, contractor_id, [(description, amount), ...])"
+                continue
+            customer = self.users.get(customer_id)
+            contractor = self.users.get(contractor_id)
+            if not isinstance(customer, Customer):
+                result.error, result.reason = EventKind.INVALID_USER, f"customer {customer_id} not found or invalid type"
+            elif not isinstance(contractor, Contractor):
+                result.error, result.reason = EventKind.INVALID_USER, f"contractor {contractor_id} not found or invalid type"
+            elif not descriptions:
+                result.error, result.reason = EventKind.INVALID_ORDER, "an order needs at least one milestone"
+            else:
+                candidates.append((result, customer, contractor, descriptions, len(amounts)))
+                amounts.extend(amount for _, amount in milestones_data)
+
+        values = _parse_milestone_amounts(amounts)
+        valid = []
+        for result, customer, contractor, descriptions, start in candidates:
+            row_values = values[start:start + len(descriptions)]
+            if None in row_values:
+                position = row_values.index(None)
+                result.error = EventKind.INVALID_AMOUNT
+                result.reason = f"milestone {position + 1} amount {amounts[start + position]!r} is not a valid positive amount"
+            else:
+                valid.append((result, customer, contractor, descriptions, row_values))
+
+        order_ids = generate_ids("ord_", len(valid))
+        milestone_ids = iter(generate_ids("ms_", sum(len(row[3]) for row in valid)))
+        for (result, customer, contractor, descriptions, row_values), order_id in zip(valid, order_ids):
+            milestones = {}
+            for description, value in zip(descriptions, row_values):
+                milestone_id = next(milestone_ids)
+                milestones[milestone_id] = Milestone._prevalidated(milestone_id, description, value)
+            order = Order._prevalidated(order_id, customer.user_id, contractor.user_id, milestones,
+                                        sum(row_values, _money.zero), self.sink, self.funding_policy)
+            order.signature_policy = self._signature_policy_for(order)
+            self._register(self.orders, order_id, order)
+            customer.orders_created[order_id] = order
+            contractor.assigned_orders.add(order_id)
+            self.sink.emit(EventKind.ORDER_REGISTERED, EventLevel.INFO,
+                           "Order {order_id} successfully registered in the application.",
+                           order_id=order_id, order=order)
+            result.order = order
+
+        for result in results:
+            if result.error is not None:
+                self.sink.emit(result.error, EventLevel.ERROR, "Error: Bulk order row {index} rejected: {reason}.",
+                               index=result.index, reason=result.reason)
+        self.sink.emit(EventKind.BULK_ORDERS_CREATED, EventLevel.INFO,
+                       "Bulk order creation: {created} of {count} orders registered.",
+                       created=len(valid), count=len(results), failed=len(results) - len(valid))
+        return results
+
 
     def join_order(self, customer_id, order_id, amount):
         customer = self._get_user(customer_id)
         order = self._get_order(order_id)
 
         if not customer or not isinstance(customer, Customer):
-            # Error already printed by _get_user
+            # Error already reported by _get_user
             return False
         if not order:
-            # Error already printed by _get_order
+            # Error already reported by _get_order
             return False
 
-        amount_decimal = Decimal(str(amount))
-        if amount_decimal <= 0:
-             print("Error: Contribution amount must be positive.")
+        amount_value = _money.parse(amount)
+        if amount_value <= 0:
+             self.sink.emit(EventKind.INVALID_AMOUNT, EventLevel.ERROR,
+                            "Error: Contribution amount must be positive.",
+                            customer_id=customer_id, order_id=order_id, amount=amount_value)
              return False
 
-        if customer.balance < amount_decimal:
-            print(f"Error: Customer {customer.name} ({customer_id}) has insufficient balance ({customer.balance:.2f}) to contribute {amount_decimal:.2f}.")
+        available = customer.available_balance
+        if available < amount_value:
+            self.sink.emit(EventKind.INSUFFICIENT_BALANCE, EventLevel.ERROR,
+                           "Error: Customer {name} ({customer_id}) has insufficient balance ({balance:money}) to contribute {amount:money}.",
+                           name=customer.name, customer_id=customer_id, balance=available,
+                           amount=amount_value, order_id=order_id)
             return False
 
-        # Check if order is in pending state BEFORE changing balance
+        # Check if order is in pending state BEFORE holding the amount
         if order.status != OrderStatus.PENDING:
-            print(f"Error: Order {order_id} is not in PENDING status (Current: {order.status}). Cannot add contribution.")
+            self.sink.emit(EventKind.INVALID_STATUS, EventLevel.ERROR,
+                           "Error: Order {order_id} is not in PENDING status (Current: {status}). Cannot add contribution.",
+                           order_id=order_id, status=order.status, customer_id=customer_id)
             return False
 
-        # Perform transaction: decrease customer balance, increase escrow
-        # Use a temporary variable for clarity in case of rollback
-        customer_balance_changed = customer._change_balance(-amount_decimal)
-
-        if customer_balance_changed:
-            contribution_added = order.add_contribution(customer_id, amount_decimal)
-            if contribution_added:
-                # Track joined orders for the customer
-                customer.orders_joined[order_id] = customer.orders_joined.get(order_id, Decimal("0.00")) + amount_decimal
-                print(f"Customer {customer.name} ({customer_id}) successfully joined Order {order_id}.")
-                return True
-            else:
-                # Rollback customer balance if contribution failed (e.g., race condition hit status change)
-                print(f"Error: Failed to add contribution to order {order_id} after balance change. Rolling back balance for {customer_id}.")
-                customer._change_balance(amount_decimal) # Add back the amount
-                return False
-        else:
-             # Balance change failed (should have been caught by earlier check, but good failsafe)
-             print(f"Error: Could not decrease balance for Customer {customer_id}.")
-             return False
+        # Hold the amount, and debit the balance only once the order has accepted the
+        # contribution: a rejected contribution then costs no balance change at all
+        hold_id = customer._reserve(amount_value)
+        try:
+            accepted = order.add_contribution(customer_id, amount_value)
+        finally:
+            customer._take_hold(hold_id)
+        if not accepted:
+            # e.g. a race condition hit a status change, or the funding policy refused the amount
+            self.sink.emit(EventKind.ROLLBACK, EventLevel.ERROR,
+                           "Error: Failed to add contribution to order {order_id}. Released the hold on {customer_id}'s balance.",
+                           order_id=order_id, customer_id=customer_id, amount=amount_value)
+            return False
+        # Only what the order took is debited
+        customer._change_balance(-accepted)
+        # Track joined orders for the customer
+        customer.orders_joined[order_id] = customer.orders_joined.get(order_id, _money.zero) + accepted
+        self.sink.emit(EventKind.ORDER_JOINED, EventLevel.INFO,
+                       "Customer {name} ({customer_id}) successfully joined Order {order_id}.",
+                       name=customer.name, customer_id=customer_id, order_id=order_id, amount=accepted)
+        return True
+
+    # Balance holds, for callers that move a customer's funds in two steps
+    # (e.g. escrow5_sharded). join_order holds and commits on its own.
+
+    def _get_customer(self, customer_id):
+        customer = self._get_user(customer_id)
+        if customer and not isinstance(customer, Customer):
+            self.sink.emit(EventKind.INVALID_USER, EventLevel.ERROR,
+                           "Error: Customer {user_id} not found or invalid type.", user_id=customer_id)
+            return None
+        return customer
+
+    def place_hold(self, customer_id, amount, ttl=HOLD_TTL_SECONDS):
+        """
+        Reserves `amount` of the customer's balance for `ttl` seconds (None: until
+        committed or released). Returns the hold id, or None.
+        """
+        customer = self._get_customer(customer_id)
+        if not customer:
+            return None
+        return customer.place_hold(_money.parse(amount), ttl)
+
+    def commit_hold(self, customer_id, hold_id, amount=None):
+        """Debits a held amount (all of it, or `amount`); the caller is responsible for crediting it elsewhere."""
+        customer = self._get_customer(customer_id)
+        return bool(customer) and customer.commit_hold(hold_id, None if amount is None else _money.parse(amount))
+
+    def release_hold(self, customer_id, hold_id):
+        customer = self._get_customer(customer_id)
+        return bool(customer) and customer.release_hold(hold_id)
+
+    def expire_holds(self):
+        """Drops every expired hold (they also expire lazily on the next use of the balance). Returns how many."""
+        now = time.monotonic()
+        return sum(user.expire_holds(now) for user in self.users.values() if isinstance(user, Customer) and user.holds)
 
 
     def mark_milestone_complete(self, contractor_id, order_id, milestone_id):
@@ -471,13 +1815,15 @@ class EscrowApplication:
         order = self._get_order(order_id)
 
         if not contractor or not isinstance(contractor, Contractor):
-             # Error printed by _get_user
+             # Error reported by _get_user
              return None
         if not order:
-             # Error printed by _get_order
+             # Error reported by _get_order
              return None
         if order.contractor_id != contractor_id:
-             print(f"Error: Contractor {contractor.name} ({contractor_id}) is not assigned to Order {order_id}.")
+             self.sink.emit(EventKind.NOT_ASSIGNED, EventLevel.ERROR,
+                            "Error: Contractor {name} ({contractor_id}) is not assigned to Order {order_id}.",
+                            name=contractor.name, contractor_id=contractor_id, order_id=order_id)
              return None
 
         # Delegate to order object, which handles status checks
@@ -488,57 +1834,48 @@ class EscrowApplication:
         """Signer ID can be a user_id or PLATFORM_SIGNATURE_ID."""
         order = self._get_order(order_id)
         if not order:
-            return False # Error printed by _get_order
+            return False # Error reported by _get_order
 
         milestone = order.get_milestone(milestone_id)
         if not milestone:
-            print(f"Error: Milestone {milestone_id} not found in Order {order_id}.")
+            self.sink.emit(EventKind.NOT_FOUND, EventLevel.ERROR,
+                           "Error: Milestone {milestone_id} not found in Order {order_id}.",
+                           milestone_id=milestone_id, order_id=order_id)
             return False
         if not milestone.act:
-             print(f"Error: Act for Milestone {milestone_id} does not exist yet. Contractor must mark complete first.")
+             self.sink.emit(EventKind.INVALID_STATUS, EventLevel.ERROR,
+                            "Error: Act for Milestone {milestone_id} does not exist yet. Contractor must mark complete first.",
+                            milestone_id=milestone_id, order_id=order_id)
              return False
 
-        # Validate signer role more explicitly here
-        is_platform = signer_id == PLATFORM_SIGNATURE_ID
-        is_contractor = signer_id == order.contractor_id
-        is_representative = signer_id == order.representative_id
-
-        signer_desc = "Unknown"
-        if is_platform:
-            signer_desc = "Platform"
-        elif is_contractor:
-            # Ensure we use the contractor's actual user object name if available
-            contr_user = self._get_user(order.contractor_id)
-            signer_desc = f"Contractor ({contr_user.name if contr_user else order.contractor_id})"
-        elif is_representative:
-             # Ensure we use the representative's actual user object name if available
-            rep_user = self._get_user(order.representative_id)
-            signer_desc = f"Representative ({rep_user.name if rep_user else order.representative_id})"
-        else:
-            # Check if it's a customer who contributed but is not the rep
-            user = self._get_user(signer_id)
-            if user and isinstance(user, Customer) and signer_id in order.contributions:
-                 signer_desc = f"Customer ({user.name}, not representative)"
-            elif user:
-                 signer_desc = f"User ({user.name}, wrong type or not involved)"
-            else:
-                 signer_desc = f"Invalid Signer ID ({signer_id})"
-
-
-        if not (is_platform or is_contractor or is_representative):
-             print(f"Error: Signer '{signer_id}' ({signer_desc}) is not authorized to sign Act {milestone.act.act_id} for Order {order_id}. "
-                   f"Requires: Platform, Contractor {order.contractor_id}, or Representative {order.representative_id}.")
-             return False
+        role = order.signer_role(signer_id)
+        if role is None:
+            if self.sink.enabled(EventLevel.ERROR):
+                self.sink.emit(EventKind.UNAUTHORIZED_SIGNER, EventLevel.ERROR,
+                               "Error: Signer '{signer_id}' ({signer_desc}) is not authorized to sign Act {act_id} for Order {order_id}. "
+                               "Requires: Platform, Contractor {contractor_id}, or Representative {representative_id}.",
+                               signer_id=signer_id, signer_desc=self._describe_signer(order, signer_id, role),
+                               act_id=milestone.act.act_id, order_id=order_id, contractor_id=order.contractor_id,
+                               representative_id=order.representative_id)
+            return False
 
-        print(f"Attempting signature by '{signer_desc}' for Act {milestone.act.act_id} (Milestone {milestone_id})...")
+        if self.sink.enabled(EventLevel.INFO):
+            self.sink.emit(EventKind.SIGNATURE_REQUESTED, EventLevel.INFO,
+                           "Attempting signature by '{signer_desc}' for Act {act_id} (Milestone {milestone_id})...",
+                           signer_desc=self._describe_signer(order, signer_id, role), act_id=milestone.act.act_id,
+                           milestone_id=milestone_id, signer_id=signer_id, order_id=order_id)
 
         # Check milestone status *before* signing
         if milestone.status != MilestoneStatus.COMPLETED_BY_CONTRACTOR:
              # Allow signing if already paid (harmless warning), but not if still pending
              if milestone.status == MilestoneStatus.PAID:
-                 print(f"Warning: Attempting to sign act for milestone {milestone_id} which is already PAID.")
+                 self.sink.emit(EventKind.ALREADY_PAID, EventLevel.WARNING,
+                                "Warning: Attempting to sign act for milestone {milestone_id} which is already PAID.",
+                                milestone_id=milestone_id, order_id=order_id, signer_id=signer_id)
              elif milestone.status == MilestoneStatus.PENDING:
-                  print(f"Error: Cannot sign Act for milestone {milestone_id} because it is still in PENDING status.")
+                  self.sink.emit(EventKind.INVALID_STATUS, EventLevel.ERROR,
+                                 "Error: Cannot sign Act for milestone {milestone_id} because it is still in PENDING status.",
+                                 milestone_id=milestone_id, order_id=order_id, signer_id=signer_id)
                   return False
              # else (e.g., CANCELLED in future): might need other checks
 
@@ -546,7 +1883,9 @@ class EscrowApplication:
             # Act signature added. Check if it became complete and release funds.
             # Check milestone status again *inside* this block to prevent race conditions if status changed.
             if milestone.act.is_complete and milestone.status == MilestoneStatus.COMPLETED_BY_CONTRACTOR:
-                print(f"Act {milestone.act.act_id} is now complete. Releasing funds...")
+                self.sink.emit(EventKind.FUNDS_RELEASING, EventLevel.INFO,
+                               "Act {act_id} is now complete. Releasing funds...",
+                               act_id=milestone.act.act_id, order_id=order_id, milestone_id=milestone_id)
                 # Use a separate step for clarity
                 self._process_payment_for_milestone(order, milestone)
 
@@ -555,6 +1894,27 @@ class EscrowApplication:
             # Signature was not added (e.g., already signed, act already complete)
             return False
 
+    def _describe_signer(self, order, signer_id, role):
+        """How sign_act messages name a signer; only called when such a message is emitted."""
+        if role == SignerRole.PLATFORM:
+            return "Platform"
+        if role == SignerRole.CONTRACTOR:
+            contr_user = self._get_user(order.contractor_id)
+            return f"Contractor ({contr_user.name if contr_user else order.contractor_id})"
+        if role == SignerRole.REPRESENTATIVE:
+            rep_user = self._get_user(order.representative_id)
+            return f"Representative ({rep_user.name if rep_user else order.representative_id})"
+        if role == SignerRole.CONTRIBUTOR:
+            user = self._get_user(signer_id)
+            return f"Contributor ({user.name if user else signer_id})"
+        # Check if it's a customer who contributed but is not the rep
+        user = self._get_user(signer_id)
+        if user and isinstance(user, Customer) and signer_id in order.contributions:
+            return f"Customer ({user.name}, not representative)"
+        if user:
+            return f"User ({user.name}, wrong type or not involved)"
+        return f"Invalid Signer ID ({signer_id})"
+
     def _process_payment_for_milestone(self, order, milestone):
         """Internal helper to process payment after act completion."""
         success, amount_released = order.release_funds_for_milestone(milestone)
@@ -563,13 +1923,22 @@ class EscrowApplication:
             if contractor:
                 # This check should ideally never fail if contractor existed to create order
                 contractor._change_balance(amount_released)
-                print(f"Contractor {contractor.user_id}'s balance updated by +{amount_released:.2f}.")
+                self.sink.emit(EventKind.CONTRACTOR_PAID, EventLevel.INFO,
+                               "Contractor {contractor_id}'s balance updated by +{amount:money}.",
+                               contractor_id=contractor.user_id, amount=amount_released,
+                               order_id=order.order_id, milestone_id=milestone.milestone_id)
             else:
                 # Log critical error - funds released from escrow but couldn't find contractor
-                print(f"CRITICAL ERROR: Contractor {order.contractor_id} not found during fund release for Order {order.order_id}, Milestone {milestone.milestone_id}! Escrow reduced but contractor not paid.")
+                self.sink.emit(EventKind.RELEASE_FAILED, EventLevel.CRITICAL,
+                               "CRITICAL ERROR: Contractor {contractor_id} not found during fund release for Order {order_id}, "
+                               "Milestone {milestone_id}! Escrow reduced but contractor not paid.",
+                               contractor_id=order.contractor_id, order_id=order.order_id,
+                               milestone_id=milestone.milestone_id)
         else:
             # Fund release failed (e.g., insufficient escrow - should not happen if logic is sound)
-            print(f"Error during automated fund release for Act {milestone.act.act_id} of Order {order.order_id}.")
+            self.sink.emit(EventKind.RELEASE_FAILED, EventLevel.ERROR,
+                           "Error during automated fund release for Act {act_id} of Order {order_id}.",
+                           act_id=milestone.act.act_id, order_id=order.order_id, milestone_id=milestone.milestone_id)
 
 
     def vote_for_representative(self, voter_customer_id, order_id, candidate_customer_id):
@@ -578,19 +1947,174 @@ class EscrowApplication:
         order = self._get_order(order_id)
 
         if not voter or not isinstance(voter, Customer):
-            # Error printed by _get_user or type check
+            # Error reported by _get_user or type check
             return False
         if not candidate or not isinstance(candidate, Customer):
              # Candidate must be a customer
-             print(f"Error: Candidate {candidate_customer_id} not found or is not a Customer.")
+             self.sink.emit(EventKind.INVALID_USER, EventLevel.ERROR,
+                            "Error: Candidate {user_id} not found or is not a Customer.",
+                            user_id=candidate_customer_id, order_id=order_id)
              return False
         if not order:
-            # Error printed by _get_order
+            # Error reported by _get_order
             return False
 
         # Delegate to order, which checks contributions and performs vote logic
         return order.add_vote(voter_customer_id, candidate_customer_id)
 
+    def apply_batch(self, operations, atomic=True):
+        """
+        Applies many deposit/join/sign operations in one call (see BatchOperation for tuple shapes).
+
+        The whole batch is validated first against a simulated copy of the affected balances,
+        escrows and act signatures, in the order given, so the outcome matches calling the
+        single-operation methods one after another. Valid operations are then applied with
+        deposits and debits aggregated per customer and contributions grouped per order,
+        which recomputes funding status once per order.
+
+        atomic=True: if any operation is invalid nothing is applied and the valid ones are
+        reported as BATCH_ABORTED. atomic=False: invalid operations are skipped.
+        Returns a list of BatchResult, one per operation.
+        """
+        results = []
+        planned = [] # (result, kind, resolved args) for operations that passed validation
+        sim_balances = {}   # user_id -> balance after the operations validated so far
+        sim_escrow = {}     # order_id -> escrow after the operations validated so far
+        sim_signatures = {} # act_id -> [signatures, policy progress, complete] after the operations validated so far
+
+        for index, operation in enumerate(operations):
+            result = BatchResult(index, operation, False)
+            results.append(result)
+            kind = operation[0] if operation else None
+
+            if kind == BatchOperation.DEPOSIT and len(operation) == 3:
+                _, customer_id, amount = operation
+                customer = self.users.get(customer_id)
+                amount_value = self._parse_batch_amount(amount)
+                if not isinstance(customer, Customer):
+                    result.error = EventKind.INVALID_USER
+                elif amount_value is None:
+                    result.error = EventKind.INVALID_AMOUNT
+                else:
+                    sim_balances[customer_id] = sim_balances.get(customer_id, customer.available_balance) + amount_value
+                    planned.append((result, kind, (customer, amount_value)))
+
+            elif kind == BatchOperation.JOIN and len(operation) == 4:
+                _, customer_id, order_id, amount = operation
+                customer = self.users.get(customer_id)
+                order = self.orders.get(order_id)
+                amount_value = self._parse_batch_amount(amount)
+                if not isinstance(customer, Customer):
+                    result.error = EventKind.INVALID_USER
+                elif not order:
+                    result.error = EventKind.NOT_FOUND
+                elif amount_value is None:
+                    result.error = EventKind.INVALID_AMOUNT
+                elif sim_balances.get(customer_id, customer.available_balance) < amount_value:
+                    result.error = EventKind.INSUFFICIENT_BALANCE
+                else:
+                    escrow = sim_escrow.get(order_id, order.escrow_balance)
+                    # An order stops taking contributions once the batch has funded it
+                    if order.status != OrderStatus.PENDING or escrow >= order.total_cost:
+                        result.error = EventKind.INVALID_STATUS
+                    else:
+                        split = order._split_contribution(escrow, amount_value)
+                        if split is None:
+                            result.error = EventKind.INVALID_AMOUNT
+                        else:
+                            accepted, surplus = split
+                            sim_balances[customer_id] = sim_balances.get(customer_id, customer.available_balance) - accepted
+                            sim_escrow[order_id] = escrow + accepted
+                            planned.append((result, kind, (customer, order, accepted, surplus)))
+
+            elif kind == BatchOperation.SIGN and len(operation) == 4:
+                _, signer_id, order_id, milestone_id = operation
+                order = self.orders.get(order_id)
+                milestone = order.get_milestone(milestone_id) if order else None
+                if not milestone:
+                    result.error = EventKind.NOT_FOUND
+                elif not milestone.act or milestone.status == MilestoneStatus.PENDING:
+                    result.error = EventKind.INVALID_STATUS
+                elif order.signer_role(signer_id) is None:
+                    result.error = EventKind.UNAUTHORIZED_SIGNER
+                else:
+                    act = milestone.act
+                    simulated = sim_signatures.get(act.act_id)
+                    if simulated is None:
+                        progress = list(act._progress) if act._progress is not None else None
+                        simulated = sim_signatures[act.act_id] = [set(act._signatures), progress, act.is_complete]
+                    signatures, progress, complete = simulated
+                    if complete:
+                        result.error = EventKind.ACT_ALREADY_COMPLETE
+                    elif signer_id in signatures:
+                        result.error = EventKind.DUPLICATE_SIGNATURE
+                    else:
+                        if progress is None:
+                            completes = len(signatures) + 1 >= MIN_SIGNATURES_REQUIRED
+                        else:
+                            progress = list(progress)
+                            completes = act._policy.advance(progress, signer_id)
+                        if completes:
+                            escrow = sim_escrow.get(order_id, order.escrow_balance)
+                            if escrow < milestone.amount:
+                                result.error = EventKind.RELEASE_FAILED
+                                continue
+                            sim_escrow[order_id] = escrow - milestone.amount
+                        signatures.add(signer_id)
+                        simulated[1:] = progress, completes
+                        planned.append((result, kind, (signer_id, order, milestone)))
+            else:
+                result.error = EventKind.INVALID_OPERATION
+
+        failed = len(results) - len(planned)
+        if atomic and failed:
+            for result, _, _ in planned:
+                result.error = EventKind.BATCH_ABORTED
+            self.sink.emit(EventKind.BATCH_ABORTED, EventLevel.ERROR,
+                           "Batch of {count} operations rejected: {failed} failed validation.",
+                           count=len(results), failed=failed)
+            return results
+
+        # Apply phase: everything below was validated above, in order
+        credits = {} # customer -> net balance change
+        joins_by_order = {} # order -> [(customer_id, amount)]
+        signs = []
+        for result, kind, args in planned:
+            if kind == BatchOperation.DEPOSIT:
+                customer, amount_value = args
+                credits[customer] = credits.get(customer, _money.zero) + amount_value
+            elif kind == BatchOperation.JOIN:
+                customer, order, accepted, surplus = args
+                credits[customer] = credits.get(customer, _money.zero) - accepted
+                joins_by_order.setdefault(order, []).append((customer.user_id, accepted, surplus))
+                customer.orders_joined[order.order_id] = customer.orders_joined.get(order.order_id, _money.zero) + accepted
+            else:
+                signs.append(args)
+            result.success = True
+
+        for customer, net_amount in credits.items():
+            if net_amount:
+                customer._change_balance(net_amount)
+        for order, contributions in joins_by_order.items():
+            order.add_contributions(contributions)
+        for signer_id, order, milestone in signs:
+            milestone.act.add_signature(signer_id)
+            if milestone.act.is_complete and milestone.status == MilestoneStatus.COMPLETED_BY_CONTRACTOR:
+                self._process_payment_for_milestone(order, milestone)
+
+        self.sink.emit(EventKind.BATCH_APPLIED, EventLevel.INFO,
+                       "Batch applied: {applied} of {count} operations succeeded.",
+                       applied=len(planned), count=len(results), failed=failed)
+        return results
+
+    @staticmethod
+    def _parse_batch_amount(amount):
+        try:
+            amount_value = _money.parse(amount)
+        except (ArithmeticError, ValueError):
+            return None
+        return amount_value if amount_value > 0 else None
+
     # --- View methods remain the same ---
     def view_user_balance(self, user_id):
         user = self._get_user(user_id)
@@ -603,27 +2127,27 @@ class EscrowApplication:
              order.view_status()
              order.view_milestones()
 
-    def view_user_orders(self, user_id):
+    def user_orders_view(self, user_id):
+        """The orders of a user as plain data (JSON-serialisable), or None if there is no such user."""
         user = self._get_user(user_id)
-        if not user:
-            return
+        return self._user_orders_view(user) if user else None
 
-        print(f"\n--- Orders associated with {user.name} ({user_id}) ---")
+    @staticmethod
+    def _user_orders_view(user):
+        view = {"user_id": user.user_id, "name": user.name, "user_type": user.user_type}
         if isinstance(user, Customer):
-            print("Orders Created:")
-            if user.orders_created:
-                for oid in user.orders_created: print(f"  - {oid}")
-            else: print("  (None)")
-            print("Orders Joined (Contributions):")
-            if user.orders_joined:
-                for oid, amount in user.orders_joined.items(): print(f"  - {oid} (Contributed: {amount:.2f})")
-            else: print("  (None)")
-        elif isinstance(user, Contractor):
-             print("Orders Assigned:")
-             if user.assigned_orders:
-                 for oid in user.assigned_orders: print(f"  - {oid}")
-             else: print("  (None)")
-        print("-" * 30)
+            view["orders_created"] = list(user.orders_created)
+            view["orders_joined"] = {oid: format_amount(amount) for oid, amount in user.orders_joined.items()}
+        else:
+            view["orders_assigned"] = list(user.assigned_orders)
+        return view
+
+    def view_user_orders(self, user_id):
+        user = self._get_user(user_id)
+        if not user or not self.sink.enabled(EventLevel.INFO):
+            return
+        self.sink.emit(EventKind.VIEW, EventLevel.INFO, "{report}", report=render_user_orders(self._user_orders_view(user)),
+                       user_id=user_id)
 
 # --- End of Copied Code ---
 
@@ -678,7 +2202,7 @@ if __name__ == "__main__":
         charlie.view_balance()
 
         print("\n--- Funding Order 1 - Attempt 1 ---")
-        print(f"Order 1 Total Cost: {order1.total_cost:.2f}")
+        print(f"Order 1 Total Cost: {format_amount(order1.total_cost)}")
         join_success = app.join_order(alice.user_id, order1_id, 500) # Alice contributes
         if join_success: alice.view_balance()
 
@@ -690,12 +2214,12 @@ if __name__ == "__main__":
 
         print("\n--- Funding Order 1 - Attempt 2 (Charlie completes funding) ---")
         needed = order1.total_cost - order1.escrow_balance
-        print(f"Funding needed for Order {order1_id}: {needed:.2f}")
+        print(f"Funding needed for Order {order1_id}: {format_amount(needed)}")
         if charlie.balance >= needed:
-            join_success = app.join_order(charlie.user_id, order1_id, needed) # Charlie contributes the rest
+            join_success = app.join_order(charlie.user_id, order1_id, amount_to_decimal(needed)) # Charlie contributes the rest
             if join_success: charlie.view_balance()
         else:
-            print(f"Charlie cannot contribute the remaining {needed:.2f}, only has {charlie.balance:.2f}")
+            print(f"Charlie cannot contribute the remaining {format_amount(needed)}, only has {format_amount(charlie.balance)}")
 
         # Verify funded status
         app.view_order_details(order1_id) # Show fully funded
@@ -0,0 +1,167 @@
+"""
+asyncio front-end for escrow5.EscrowApplication.
+
+AsyncEscrowApplication runs the synchronous operations directly on the event
+loop, so there are no executor threads. Each order gets a lane: an
+asyncio.Lock that serialises that order's operations in arrival order, and
+optionally an admission limit (`max_pending_per_order`) so one hot order
+cannot build an unbounded queue of waiting callers. When the limit is hit,
+callers either wait for room or, with `reject_when_full`, get OrderBusyError.
+
+The operations themselves complete without yielding. An optional `commit`
+coroutine function is awaited inside the lane after each mutating operation,
+before the caller gets its result: for example, ledger_commit() waits for a
+DurableEscrowApplication's log to reach disk (build that application with
+synchronous=False, so the operation itself does not fsync on the event loop
+thread). While one order waits on its
+commit, operations on other orders proceed and that order's later callers
+queue up behind it in arrival order; this is where the admission limit
+applies.
+"""
+import asyncio
+from contextlib import asynccontextmanager
+
+from escrow5 import BatchOperation, EscrowApplication
+
+
+class OrderBusyError(Exception):
+    """Raised when an order's lane is full and the application rejects instead of waiting."""
+    def __init__(self, order_id, pending):
+        super().__init__(f"Order {order_id} already has {pending} operations queued.")
+        self.order_id = order_id
+        self.pending = pending
+
+
+def ledger_commit(app):
+    """Returns a commit coroutine function that waits until `app.ledger` has synced to disk."""
+    async def commit():
+        await asyncio.to_thread(app.ledger.sync)
+    return commit
+
+
+class _OrderLane:
+    __slots__ = ("lock", "slots", "pending", "callers")
+
+    def __init__(self, max_pending):
+        self.lock = asyncio.Lock()
+        self.slots = asyncio.Semaphore(max_pending) if max_pending else None
+        self.pending = 0 # operations admitted and not yet finished
+        self.callers = 0 # operations using the lane, admitted or still waiting for room
+
+
+class AsyncEscrowApplication:
+    """Awaitable equivalents of the EscrowApplication operations, serialised per order."""
+    def __init__(self, app=None, sink=None, max_pending_per_order=None, reject_when_full=False, commit=None):
+        self.app = app if app is not None else EscrowApplication(sink)
+        self.commit = commit
+        self.max_pending_per_order = max_pending_per_order
+        self.reject_when_full = reject_when_full
+        self._lanes = {}
+
+    @property
+    def users(self):
+        return self.app.users
+
+    @property
+    def orders(self):
+        return self.app.orders
+
+    def pending(self, order_id):
+        """Number of operations admitted to an order's lane and not yet finished."""
+        lane = self._lanes.get(order_id)
+        return lane.pending if lane else 0
+
+    def _lane(self, order_id):
+        lane = self._lanes.get(order_id)
+        if lane is None:
+            lane = self._lanes[order_id] = _OrderLane(self.max_pending_per_order)
+        return lane
+
+    @asynccontextmanager
+    async def _serialized(self, *order_ids):
+        """
+        Admits the caller to each order's lane, then holds the lanes' locks (sorted, to
+        avoid deadlock). A lane is dropped once no operation is using it.
+        """
+        order_ids = sorted(set(order_ids))
+        lanes = [self._lane(order_id) for order_id in order_ids]
+        for lane in lanes:
+            lane.callers += 1
+        admitted = []
+        try:
+            for order_id, lane in zip(order_ids, lanes):
+                if lane.slots is not None:
+                    if self.reject_when_full and lane.slots.locked():
+                        raise OrderBusyError(order_id, lane.pending)
+                    await lane.slots.acquire()
+                lane.pending += 1
+                admitted.append(lane)
+            for lane in lanes:
+                await lane.lock.acquire()
+            try:
+                yield
+            finally:
+                for lane in lanes:
+                    lane.lock.release()
+        finally:
+            for lane in admitted:
+                lane.pending -= 1
+                if lane.slots is not None:
+                    lane.slots.release()
+            for order_id, lane in zip(order_ids, lanes):
+                lane.callers -= 1
+                if not lane.callers:
+                    del self._lanes[order_id]
+
+    async def _committed(self, result):
+        if self.commit is not None:
+            await self.commit()
+        return result
+
+    async def create_customer(self, name):
+        return await self._committed(self.app.create_customer(name))
+
+    async def create_contractor(self, name):
+        return await self._committed(self.app.create_contractor(name))
+
+    async def customer_deposit(self, customer_id, amount):
+        return await self._committed(self.app.customer_deposit(customer_id, amount))
+
+    async def create_order(self, customer_id, contractor_id, milestones_data):
+        return await self._committed(self.app.create_order(customer_id, contractor_id, milestones_data))
+
+    async def create_orders_bulk(self, rows):
+        return await self._committed(self.app.create_orders_bulk(rows))
+
+    async def join_order(self, customer_id, order_id, amount):
+        async with self._serialized(order_id):
+            return await self._committed(self.app.join_order(customer_id, order_id, amount))
+
+    async def mark_milestone_complete(self, contractor_id, order_id, milestone_id):
+        async with self._serialized(order_id):
+            return await self._committed(self.app.mark_milestone_complete(contractor_id, order_id, milestone_id))
+
+    async def sign_act(self, signer_id, order_id, milestone_id):
+        async with self._serialized(order_id):
+            return await self._committed(self.app.sign_act(signer_id, order_id, milestone_id))
+
+    async def vote_for_representative(self, voter_customer_id, order_id, candidate_customer_id):
+        async with self._serialized(order_id):
+            return await self._committed(self.app.vote_for_representative(voter_customer_id, order_id, candidate_customer_id))
+
+    async def apply_batch(self, operations, atomic=True):
+        operations = list(operations) # read twice: for the lanes, then by the batch itself
+        order_ids = [op[2] for op in operations
+                     if op and op[0] in (BatchOperation.JOIN, BatchOperation.SIGN) and len(op) == 4]
+        async with self._serialized(*order_ids):
+            return await self._committed(self.app.apply_batch(operations, atomic))
+
+    async def view_order_details(self, order_id):
+        async with self._serialized(order_id):
+            self.app.view_order_details(order_id)
+
+    async def view_user_balance(self, user_id):
+        self.app.view_user_balance(user_id)
+
+    async def view_user_orders(self, user_id):
+        self.app.view_user_orders(user_id)
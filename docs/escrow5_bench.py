@@ -0,0 +1,399 @@
+"""
+Benchmarks for escrow5.
+
+    python escrow5_bench.py memory [orders ...]   bytes per order for fully settled orders
+    python escrow5_bench.py money [orders]        Decimal vs integer minor-unit amounts
+    python escrow5_bench.py suite [name=value ...] [output=file.json]
+                                                  group-order workload: throughput, latency, memory
+    python escrow5_bench.py compare old.json new.json
+    python escrow5_bench.py votes [sequences]      checks the running vote tally against a full recount
+
+Memory is measured with tracemalloc, which slows allocation down a lot:
+the default 1M-order run takes several minutes and a few GB of RAM.
+The suite therefore times one run and measures memory on a second,
+identical run (skip it with memory=0).
+"""
+import gc
+import json
+import platform
+import random
+import subprocess
+import sys
+import time
+import tracemalloc
+
+from escrow5 import (DecimalMoney, EscrowApplication, MinorUnitMoney, NullSink, OrderStatus,
+                     PLATFORM_SIGNATURE_ID, REP_VOTE_THRESHOLD_PERCENT, get_money_engine, set_money_engine)
+
+
+def build_settled_orders(app, order_count, milestones_per_order=3, contributors_per_order=3, customer_pool=1000):
+    """
+    Creates `order_count` orders, funds each from `contributors_per_order`
+    customers and settles every milestone (act created, signed twice, paid),
+    i.e. the shape of historical orders kept in memory.
+    """
+    customers = [app.create_customer(f"customer-{i}") for i in range(min(customer_pool, order_count * contributors_per_order))]
+    contractor = app.create_contractor("contractor")
+    milestones = [(f"Milestone {j + 1}", 100 + 10 * j) for j in range(milestones_per_order)]
+    total_cost = sum(amount for _, amount in milestones)
+    share, remainder = divmod(total_cost, contributors_per_order)
+    for customer in customers:
+        app.customer_deposit(customer.user_id, 10 ** 9)
+    for i in range(order_count):
+        creator = customers[i % len(customers)]
+        order = app.create_order(creator.user_id, contractor.user_id, milestones)
+        for k in range(contributors_per_order):
+            contributor = customers[(i + k) % len(customers)]
+            app.join_order(contributor.user_id, order.order_id, share + (remainder if k == 0 else 0))
+        for milestone_id in list(order.milestones):
+            app.mark_milestone_complete(contractor.user_id, order.order_id, milestone_id)
+            app.sign_act(PLATFORM_SIGNATURE_ID, order.order_id, milestone_id)
+            app.sign_act(contractor.user_id, order.order_id, milestone_id)
+    return app
+
+
+def memory_benchmark(sizes=(10_000, 100_000, 1_000_000), **workload):
+    """Returns traced bytes per order after building settled orders at each size."""
+    results = []
+    for order_count in sizes:
+        gc.collect()
+        tracemalloc.start()
+        started = time.perf_counter()
+        app = build_settled_orders(EscrowApplication(sink=NullSink()), order_count, **workload)
+        elapsed = time.perf_counter() - started
+        gc.collect()
+        current, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        results.append({
+            "orders": order_count,
+            "bytes_total": current,
+            "bytes_per_order": current / order_count,
+            "build_seconds": elapsed,
+        })
+        del app
+    return results
+
+
+def money_benchmark(order_count=20_000, operations=1_000_000, engines=(DecimalMoney(), MinorUnitMoney())):
+    """
+    Compares the money engines: settled-order throughput through the full
+    application, and raw parse / add / compare loops on the engine's amounts.
+    """
+    results = []
+    for engine in engines:
+        gc.collect()
+        previous = set_money_engine(engine)
+        try:
+            started = time.perf_counter()
+            build_settled_orders(EscrowApplication(sink=NullSink()), order_count)
+            settle_seconds = time.perf_counter() - started
+
+            parse = engine.parse
+            started = time.perf_counter()
+            for i in range(operations):
+                parse(i % 1000)
+            parse_seconds = time.perf_counter() - started
+
+            step, total = parse("0.01"), engine.zero
+            started = time.perf_counter()
+            for _ in range(operations):
+                total += step
+            add_seconds = time.perf_counter() - started
+
+            limit, hits = parse(500), 0
+            started = time.perf_counter()
+            for _ in range(operations):
+                hits += total >= limit
+            compare_seconds = time.perf_counter() - started
+        finally:
+            set_money_engine(previous)
+        results.append({
+            "engine": engine.name,
+            "orders_per_second": order_count / settle_seconds,
+            "parse_per_second": operations / parse_seconds,
+            "add_per_second": operations / add_seconds,
+            "compare_per_second": operations / compare_seconds,
+        })
+    return results
+
+
+# --- Vote tally check ---
+
+def _recount(order, votes):
+    """
+    Support per candidate and the elected candidate (None if nobody reaches the
+    threshold) for `votes`, counted from scratch the way check_votes did before
+    Order kept a running tally: the first candidate in first-vote order wins.
+    """
+    zero = get_money_engine().zero
+    support = {}
+    for voter_id, candidate_id in votes.items():
+        support[candidate_id] = support.get(candidate_id, zero) + order.contributions.get(voter_id, zero)
+    qualified = [candidate_id for candidate_id, amount in support.items()
+                 if amount * 100 >= order.total_cost * REP_VOTE_THRESHOLD_PERCENT]
+    return support, qualified
+
+def check_vote_tally(sequences=5000, engines=(DecimalMoney(), MinorUnitMoney()), seed=0):
+    """
+    Drives random vote sequences (vote changes, ties, threshold crossings,
+    contributions growing under existing votes, overfunded orders with several
+    qualifying candidates) and checks after every step that the running tally
+    and the elected representative match a full recount. Raises AssertionError
+    on the first mismatch; returns per-engine counts of what was covered.
+    """
+    rng = random.Random(seed)
+    results = []
+    for engine in engines:
+        previous = set_money_engine(engine)
+        covered = {"engine": engine.name, "sequences": sequences, "votes": 0, "rejected": 0, "joins": 0,
+                   "changes": 0, "confirmations": 0, "ties": 0, "several_qualified": 0}
+        try:
+            for _ in range(sequences):
+                app = EscrowApplication(sink=NullSink())
+                contractor = app.create_contractor("contractor")
+                customer_ids = [app.create_customer(f"customer {i}").user_id for i in range(rng.randint(2, 6))]
+                for customer_id in customer_ids:
+                    app.customer_deposit(customer_id, 100_000)
+                cost = rng.choice((100, 300, 1000))
+                order = app.create_order(customer_ids[0], contractor.user_id, [("work", cost)])
+                # Few distinct amounts make equal support common. In some orders the join that
+                # funds the order overfunds it instead, so several candidates can be over the threshold
+                amounts = (cost // 10, cost // 10, cost // 5, cost // 4)
+                overfund = rng.random() < 0.3
+                for _ in range(rng.randint(1, 60)):
+                    # Mostly contributors, sometimes anyone (a vote the order must reject)
+                    pool = list(order.contributions) if order.contributions and rng.random() < 0.9 else customer_ids
+                    voter_id, candidate_id = rng.choice(pool), rng.choice(pool)
+                    if order.status == OrderStatus.PENDING and rng.random() < 0.4:
+                        nearly_funded = order.escrow_balance * 4 >= order.total_cost * 3
+                        amount = 2 * cost if overfund and nearly_funded else rng.choice(amounts)
+                        app.join_order(voter_id, order.order_id, amount)
+                        covered["joins"] += 1
+                    else:
+                        representative_id, votes = order.representative_id, dict(order.votes_for_rep)
+                        if voter_id not in order.contributions or candidate_id not in order.contributions:
+                            assert not app.vote_for_representative(voter_id, order.order_id, candidate_id)
+                            assert order.votes_for_rep == votes and order.representative_id == representative_id
+                            covered["rejected"] += 1
+                            continue
+                        votes[voter_id] = candidate_id
+                        support, qualified = _recount(order, votes)
+                        assert app.vote_for_representative(voter_id, order.order_id, candidate_id)
+                        covered["votes"] += 1
+                        top = max(support.values())
+                        covered["ties"] += sum(amount == top for amount in support.values()) > 1
+                        covered["several_qualified"] += len(qualified) > 1
+                        if qualified:
+                            assert order.representative_id == qualified[0], (qualified, order.representative_id)
+                            assert not order.votes_for_rep
+                            covered["changes" if qualified[0] != representative_id else "confirmations"] += 1
+                        else:
+                            assert order.representative_id == representative_id
+                            assert order.votes_for_rep == votes
+                    support, qualified = _recount(order, order.votes_for_rep)
+                    assert order._rep_support == support, (order._rep_support, support)
+                    assert order._rep_qualified == set(qualified), (order._rep_qualified, qualified)
+        finally:
+            set_money_engine(previous)
+        results.append(covered)
+    return results
+
+
+# --- Workload suite ---
+
+SUITE_DEFAULTS = {
+    "customers": 2000,
+    "contractors": 50,
+    "orders": 5000,
+    "milestones_per_order": 3,
+    "contributors_per_order": 4, # fan-in; the creator is always the first contributor
+    "votes_per_order": 3, # vote churn; a representative change resets the votes
+    "seed": 0,
+}
+
+SUITE_OPERATIONS = ("create_order", "join_order", "vote_for_representative", "mark_milestone_complete", "sign_act")
+
+def _run_workload(app, call, checkpoint, customers, contractors, orders, milestones_per_order,
+                  contributors_per_order, votes_per_order, seed):
+    """
+    Drives `app` through the group-order lifecycle: every order is created,
+    funded by its contributors, voted on, and has each milestone completed and
+    signed by the platform and either the contractor or the representative.
+    Operations go through call(name, *args); checkpoint(phase) follows each phase.
+    """
+    rng = random.Random(seed)
+    customer_ids = [app.create_customer(f"customer-{i}").user_id for i in range(customers)]
+    contractor_ids = [app.create_contractor(f"contractor-{i}").user_id for i in range(contractors)]
+    for customer_id in customer_ids:
+        app.customer_deposit(customer_id, 10 ** 9)
+    checkpoint("users")
+
+    plans = []
+    for _ in range(orders):
+        contributors = rng.sample(customer_ids, contributors_per_order)
+        milestones = [(f"Milestone {j + 1}", rng.randint(50, 500)) for j in range(milestones_per_order)]
+        order = call("create_order", contributors[0], rng.choice(contractor_ids), milestones)
+        plans.append((order, contributors, sum(amount for _, amount in milestones)))
+    checkpoint("create_order")
+
+    for order, contributors, total_cost in plans:
+        share, remainder = divmod(total_cost, len(contributors))
+        for k, customer_id in enumerate(contributors):
+            call("join_order", customer_id, order.order_id, share + (remainder if k == 0 else 0))
+    checkpoint("join_order")
+
+    for order, contributors, _ in plans:
+        for _ in range(votes_per_order):
+            call("vote_for_representative", rng.choice(contributors), order.order_id, rng.choice(contributors))
+    checkpoint("vote_for_representative")
+
+    milestone_ids = [(order, list(order.milestones)) for order, _, _ in plans]
+    for order, ids in milestone_ids:
+        for milestone_id in ids:
+            call("mark_milestone_complete", order.contractor_id, order.order_id, milestone_id)
+    checkpoint("mark_milestone_complete")
+
+    for order, ids in milestone_ids:
+        for milestone_id in ids:
+            call("sign_act", PLATFORM_SIGNATURE_ID, order.order_id, milestone_id)
+            second = order.contractor_id if rng.random() < 0.5 else order.representative_id
+            call("sign_act", second, order.order_id, milestone_id)
+    checkpoint("sign_act")
+
+def _percentile(ordered, percent):
+    # Nearest-rank percentile of an already sorted list
+    return ordered[max(0, -(-len(ordered) * percent // 100) - 1)]
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run_suite(memory=True, **workload):
+    """
+    Runs the group-order workload (see SUITE_DEFAULTS for the knobs) and
+    returns a JSON-serialisable report: per-operation throughput and p50/p99
+    latency, and traced memory after each phase of a second, identical run.
+    """
+    params = dict(SUITE_DEFAULTS, **workload)
+    latencies = {name: [] for name in SUITE_OPERATIONS}
+    app = EscrowApplication(sink=NullSink())
+    perf_counter_ns = time.perf_counter_ns
+
+    def timed_call(name, *args):
+        method = getattr(app, name)
+        started = perf_counter_ns()
+        result = method(*args)
+        latencies[name].append(perf_counter_ns() - started)
+        return result
+
+    gc.collect()
+    started = time.perf_counter()
+    _run_workload(app, timed_call, lambda phase: None, **params)
+    wall_seconds = time.perf_counter() - started
+
+    operations = {}
+    for name, samples in latencies.items():
+        if not samples:
+            continue
+        samples.sort()
+        busy = sum(samples) / 1e9
+        operations[name] = {
+            "count": len(samples),
+            "ops_per_second": len(samples) / busy if busy else None,
+            "p50_us": _percentile(samples, 50) / 1e3,
+            "p99_us": _percentile(samples, 99) / 1e3,
+            "max_us": samples[-1] / 1e3,
+        }
+    report = {
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "workload": params,
+        "wall_seconds": wall_seconds,
+        "operations": operations,
+        "orders_completed": sum(o.status == OrderStatus.COMPLETED for o in app.orders.values()),
+    }
+    del app
+
+    if memory:
+        app = EscrowApplication(sink=NullSink())
+        phases = {}
+        previous = [0]
+
+        def checkpoint(phase):
+            gc.collect()
+            current, _ = tracemalloc.get_traced_memory()
+            phases[phase] = {"bytes": current, "growth": current - previous[0]}
+            previous[0] = current
+
+        gc.collect()
+        tracemalloc.start()
+        try:
+            _run_workload(app, lambda name, *args: getattr(app, name)(*args), checkpoint, **params)
+        finally:
+            tracemalloc.stop()
+        report["memory"] = {
+            "phases": phases,
+            "bytes_per_order": previous[0] / params["orders"] if params["orders"] else None,
+        }
+    return report
+
+def compare_reports(old, new):
+    """Rows comparing two suite reports operation by operation (ratios are new / old)."""
+    rows = []
+    for name in SUITE_OPERATIONS:
+        before, after = old["operations"].get(name), new["operations"].get(name)
+        if not before or not after:
+            continue
+        rows.append({
+            "operation": name,
+            "ops_per_second": after["ops_per_second"] / before["ops_per_second"],
+            "p50": after["p50_us"] / before["p50_us"],
+            "p99": after["p99_us"] / before["p99_us"],
+        })
+    if "memory" in old and "memory" in new:
+        rows.append({
+            "operation": "bytes_per_order",
+            "ops_per_second": "",
+            "p50": new["memory"]["bytes_per_order"] / old["memory"]["bytes_per_order"],
+            "p99": "",
+        })
+    return rows
+
+
+def _print_rows(rows):
+    columns = list(rows[0])
+    print("  ".join(f"{c:>16}" for c in columns))
+    for row in rows:
+        print("  ".join(f"{v:>16.3f}" if isinstance(v, float) else f"{v:>16}" for v in row.values()))
+
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else "memory"
+    if command == "suite":
+        options = dict(a.split("=", 1) for a in sys.argv[2:])
+        output = options.pop("output", None)
+        report = run_suite(**{k: int(v.replace("_", "")) for k, v in options.items()})
+        text = json.dumps(report, indent=2)
+        if output:
+            with open(output, "w") as f:
+                f.write(text + "\n")
+        print(text)
+        sys.exit()
+    if command == "compare":
+        with open(sys.argv[2]) as old, open(sys.argv[3]) as new:
+            _print_rows(compare_reports(json.load(old), json.load(new)))
+        sys.exit()
+    arguments = [int(a.replace("_", "")) for a in sys.argv[2:]]
+    if command == "memory":
+        _print_rows(memory_benchmark(arguments or (10_000, 100_000, 1_000_000)))
+    elif command == "money":
+        _print_rows(money_benchmark(*arguments[:1]))
+    elif command == "votes":
+        _print_rows(check_vote_tally(*arguments[:1]))
+        print("OK: the running vote tally matches a full recount.")
+    else:
+        sys.exit(f"Unknown benchmark '{command}'.")
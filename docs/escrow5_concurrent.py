@@ -0,0 +1,251 @@
+"""
+Thread-safe EscrowApplication.
+
+Each user and each order gets its own re-entrant lock. An operation takes
+the locks of every order and user it can modify, always in the same global
+order (orders before users, each sorted by id), so two operations can never
+wait on each other in a cycle. Operations on unrelated orders and users do
+not contend. The release path of sign_act holds both the order and the
+contractor lock, so escrow debit and contractor credit happen as one step.
+
+Run this module to stress-test it:
+    python escrow5_concurrent.py [threads] [operations_per_thread]
+"""
+import random
+import sys
+import threading
+import time
+from contextlib import ExitStack, contextmanager
+from escrow5 import (BatchOperation, Customer, EscrowApplication, FundingPolicy, HOLD_TTL_SECONDS, MilestoneStatus,
+                     NullSink, OrderStatus, PLATFORM_SIGNATURE_ID, get_money_engine)
+
+
+class ConcurrentEscrowApplication(EscrowApplication):
+    """EscrowApplication that can be called from several threads at once."""
+    def __init__(self, sink=None, funding_policy=FundingPolicy.ACCEPT, **kwargs):
+        super().__init__(sink, funding_policy, **kwargs)
+        self._registry_lock = threading.Lock() # guards the lock tables and the users/orders dicts
+        self._order_locks = {}
+        self._user_locks = {}
+
+    def _lock_for(self, table, key):
+        lock = table.get(key)
+        if lock is None:
+            with self._registry_lock:
+                lock = table.setdefault(key, threading.RLock())
+        return lock
+
+    @contextmanager
+    def _locked(self, order_ids=(), user_ids=()):
+        """Holds the locks for the given orders and users, acquired in the global lock order."""
+        with ExitStack() as stack:
+            for order_id in sorted(set(order_ids)):
+                stack.enter_context(self._lock_for(self._order_locks, order_id))
+            for user_id in sorted(set(user_ids)):
+                stack.enter_context(self._lock_for(self._user_locks, user_id))
+            yield
+
+    def _contractor_of(self, order_id):
+        # An order's contractor never changes, so it is safe to read before locking
+        order = self.orders.get(order_id)
+        return (order.contractor_id,) if order else ()
+
+    def create_customer(self, name):
+        with self._registry_lock:
+            return super().create_customer(name)
+
+    def create_contractor(self, name):
+        with self._registry_lock:
+            return super().create_contractor(name)
+
+    def customer_deposit(self, customer_id, amount):
+        with self._locked(user_ids=(customer_id,)):
+            return super().customer_deposit(customer_id, amount)
+
+    def create_order(self, customer_id, contractor_id, milestones_data):
+        with self._locked(user_ids=(customer_id, contractor_id)):
+            with self._registry_lock:
+                return super().create_order(customer_id, contractor_id, milestones_data)
+
+    def create_orders_bulk(self, rows):
+        rows = list(rows)
+        user_ids = set()
+        for row in rows:
+            if isinstance(row, (tuple, list)) and len(row) == 3:
+                user_ids.update(row[:2])
+        with self._locked(user_ids=user_ids):
+            with self._registry_lock:
+                return super().create_orders_bulk(rows)
+
+    def join_order(self, customer_id, order_id, amount):
+        with self._locked(order_ids=(order_id,), user_ids=(customer_id,)):
+            return super().join_order(customer_id, order_id, amount)
+
+    def place_hold(self, customer_id, amount, ttl=HOLD_TTL_SECONDS):
+        with self._locked(user_ids=(customer_id,)):
+            return super().place_hold(customer_id, amount, ttl)
+
+    def commit_hold(self, customer_id, hold_id, amount=None):
+        with self._locked(user_ids=(customer_id,)):
+            return super().commit_hold(customer_id, hold_id, amount)
+
+    def release_hold(self, customer_id, hold_id):
+        with self._locked(user_ids=(customer_id,)):
+            return super().release_hold(customer_id, hold_id)
+
+    def _registered(self):
+        """Snapshots of the users and orders dicts, taken while nothing can be added to them."""
+        with self._registry_lock:
+            return list(self.users.values()), list(self.orders.values())
+
+    def expire_holds(self):
+        customers = [user for user in self._registered()[0] if isinstance(user, Customer)]
+        with self._locked(user_ids=[customer.user_id for customer in customers]):
+            now = time.monotonic()
+            return sum(customer.expire_holds(now) for customer in customers if customer.holds)
+
+    def mark_milestone_complete(self, contractor_id, order_id, milestone_id):
+        with self._locked(order_ids=(order_id,)):
+            return super().mark_milestone_complete(contractor_id, order_id, milestone_id)
+
+    def sign_act(self, signer_id, order_id, milestone_id):
+        with self._locked(order_ids=(order_id,), user_ids=self._contractor_of(order_id)):
+            return super().sign_act(signer_id, order_id, milestone_id)
+
+    def vote_for_representative(self, voter_customer_id, order_id, candidate_customer_id):
+        with self._locked(order_ids=(order_id,)):
+            return super().vote_for_representative(voter_customer_id, order_id, candidate_customer_id)
+
+    def apply_batch(self, operations, atomic=True):
+        operations = list(operations) # read twice: for the lock ids, then by the batch itself
+        order_ids, user_ids = set(), set()
+        for operation in operations:
+            kind = operation[0] if operation else None
+            if kind == BatchOperation.DEPOSIT and len(operation) == 3:
+                user_ids.add(operation[1])
+            elif kind == BatchOperation.JOIN and len(operation) == 4:
+                user_ids.add(operation[1])
+                order_ids.add(operation[2])
+            elif kind == BatchOperation.SIGN and len(operation) == 4:
+                order_ids.add(operation[2])
+                user_ids.update(self._contractor_of(operation[2]))
+        with self._locked(order_ids, user_ids):
+            return super().apply_batch(operations, atomic)
+
+    def view_user_balance(self, user_id):
+        with self._locked(user_ids=(user_id,)):
+            super().view_user_balance(user_id)
+
+    def view_order_details(self, order_id):
+        with self._locked(order_ids=(order_id,)):
+            super().view_order_details(order_id)
+
+    def view_user_orders(self, user_id):
+        with self._locked(user_ids=(user_id,)):
+            super().view_user_orders(user_id)
+
+    def total_funds(self):
+        """Sum of every user balance and every escrow balance, taken with all locks held."""
+        users, orders = self._registered()
+        with self._locked([o.order_id for o in orders], [u.user_id for u in users]):
+            zero = get_money_engine().zero
+            return sum((u.balance for u in users), zero) + sum((o.escrow_balance for o in orders), zero)
+
+
+# --- Stress harness ---
+
+def run_stress(threads=8, operations_per_thread=2000, customers=40, contractors=5, orders=30, seed=0):
+    """
+    Hammers a ConcurrentEscrowApplication from several threads with a mix of
+    deposits, joins, milestone completions, signatures, votes and batches on a
+    small set of hot orders, then checks that balances plus escrow still equal
+    everything deposited. Returns a dict with the figures; raises AssertionError
+    if money was created or lost.
+    """
+    money = get_money_engine()
+    app = ConcurrentEscrowApplication(sink=NullSink())
+    customer_ids = [app.create_customer(f"customer-{i}").user_id for i in range(customers)]
+    contractor_ids = [app.create_contractor(f"contractor-{i}").user_id for i in range(contractors)]
+    initial_deposit = 1000
+    for customer_id in customer_ids:
+        app.customer_deposit(customer_id, initial_deposit)
+    rng = random.Random(seed)
+    order_ids = []
+    for i in range(orders):
+        milestones = [(f"ms-{j}", rng.randint(50, 400)) for j in range(rng.randint(1, 4))]
+        order_ids.append(app.create_order(rng.choice(customer_ids), rng.choice(contractor_ids), milestones).order_id)
+
+    deposited = [money.parse(initial_deposit * customers)]
+    deposited_lock = threading.Lock()
+    errors = []
+
+    def worker(worker_seed):
+        rng = random.Random(worker_seed)
+        local_deposits = money.zero
+        try:
+            for _ in range(operations_per_thread):
+                order = app.orders[rng.choice(order_ids)]
+                roll = rng.random()
+                if roll < 0.1:
+                    amount = rng.randint(1, 100)
+                    if app.customer_deposit(rng.choice(customer_ids), amount):
+                        local_deposits += money.parse(amount)
+                elif roll < 0.5:
+                    app.join_order(rng.choice(customer_ids), order.order_id, rng.randint(1, 150))
+                elif roll < 0.6:
+                    app.mark_milestone_complete(order.contractor_id, order.order_id, rng.choice(list(order.milestones)))
+                elif roll < 0.85:
+                    signer = rng.choice([PLATFORM_SIGNATURE_ID, order.contractor_id, order.representative_id])
+                    app.sign_act(signer, order.order_id, rng.choice(list(order.milestones)))
+                elif roll < 0.95:
+                    app.vote_for_representative(rng.choice(customer_ids), order.order_id, rng.choice(customer_ids))
+                else:
+                    amount = rng.randint(1, 50)
+                    results = app.apply_batch([
+                        (BatchOperation.DEPOSIT, rng.choice(customer_ids), amount),
+                        (BatchOperation.JOIN, rng.choice(customer_ids), order.order_id, rng.randint(1, 80)),
+                    ], atomic=False)
+                    if results[0].success:
+                        local_deposits += money.parse(amount)
+        except Exception as e: # Surface worker failures in the main thread
+            errors.append(e)
+        with deposited_lock:
+            deposited[0] += local_deposits
+
+    workers = [threading.Thread(target=worker, args=(seed * 1000 + i,)) for i in range(threads)]
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    if errors:
+        raise errors[0]
+
+    total = app.total_funds()
+    for order in app.orders.values():
+        assert order.escrow_balance >= 0, f"negative escrow in {order.order_id}"
+        paid = sum((ms.amount for ms in order.milestones.values() if ms.status == MilestoneStatus.PAID), money.zero)
+        assert paid == order.paid_amount, f"paid amount drifted in {order.order_id}"
+        assert sum(order.contributions.values(), money.zero) - paid == order.escrow_balance, \
+            f"escrow does not match contributions minus payouts in {order.order_id}"
+    for user in app.users.values():
+        assert user.balance >= 0, f"negative balance for {user.user_id}"
+    assert total == deposited[0], f"funds not conserved: {total} held vs {deposited[0]} deposited"
+    return {
+        "threads": threads,
+        "operations": threads * operations_per_thread,
+        "deposited": money.format(deposited[0]),
+        "held": money.format(total),
+        "orders_funded_or_later": sum(o.status != OrderStatus.PENDING for o in app.orders.values()),
+        "orders_completed": sum(o.status == OrderStatus.COMPLETED for o in app.orders.values()),
+    }
+
+
+if __name__ == "__main__":
+    thread_count = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    per_thread = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+    # A short switch interval makes thread interleavings inside operations far more likely
+    sys.setswitchinterval(1e-6)
+    report = run_stress(thread_count, per_thread)
+    for key, value in report.items():
+        print(f"{key}: {value}")
+    print("OK: balances plus escrow equal total deposits.")
@@ -0,0 +1,195 @@
+"""
+Columnar export of an escrow5.EscrowApplication for analytics.
+
+export_batches(app) walks the orders once and yields ExportBatch tuples:
+one table's rows as columns (name -> list, or NumPy array with
+numpy_arrays=True), at most `batch_rows` rows each, so memory stays flat
+however many orders there are. The tables are:
+
+    orders         order_id, creator_id, contractor_id, representative_id, status,
+                   funding_policy, total_cost, escrow_balance, paid_amount
+    milestones     order_id, milestone_id, description, amount, status, act_id, act_complete
+    contributions  order_id, customer_id, amount
+    votes          order_id, voter_id, candidate_id
+    signatures     order_id, milestone_id, act_id, signer_id, position (signing order, from 0)
+
+Amounts are exact integers of minor units (cents by default, or the
+exponent of the minor-unit money engine), whatever the money engine.
+write_csv_chunks() writes the batches to one CSV file per batch.
+
+Incremental export: track_changes(app) stamps every order with the number
+of the last mutation event (one escrow5_ledger records) that named it.
+Every batch carries the watermark taken when its export started; passing
+that as `since` next time exports only the orders changed after it. An
+incremental export holds every row of each changed order (votes reset and
+signatures do not only grow), so replace that order's rows downstream.
+Call track_changes() before creating orders: objects created earlier keep
+the sink they were created with, and orders never stamped are treated as
+unchanged.
+
+Run this module to export a generated workload:
+    python escrow5_export.py directory [orders]
+"""
+import csv
+import itertools
+import os
+import sys
+from collections import namedtuple
+
+from escrow5 import EventLevel, EventSink, MinorUnitMoney, TeeSink, get_money_engine
+from escrow5_ledger import _RECORDERS
+
+try:
+    import numpy
+except ImportError: # optional: without it batches hold plain lists
+    numpy = None
+
+ExportBatch = namedtuple("ExportBatch", ("table", "columns", "rows", "watermark"))
+
+TABLES = {
+    "orders": ("order_id", "creator_id", "contractor_id", "representative_id", "status", "funding_policy",
+               "total_cost", "escrow_balance", "paid_amount"),
+    "milestones": ("order_id", "milestone_id", "description", "amount", "status", "act_id", "act_complete"),
+    "contributions": ("order_id", "customer_id", "amount"),
+    "votes": ("order_id", "voter_id", "candidate_id"),
+    "signatures": ("order_id", "milestone_id", "act_id", "signer_id", "position"),
+}
+
+# NumPy dtypes of the columns that are not strings
+_NUMERIC_COLUMNS = {"total_cost": "int64", "escrow_balance": "int64", "paid_amount": "int64", "amount": "int64",
+                    "act_complete": "bool", "position": "int64"}
+
+
+# --- Change tracking ---
+
+class ChangeTracker(EventSink):
+    """Stamps each order with the sequence number of the last mutation event naming it."""
+    level = EventLevel.INFO
+
+    def __init__(self):
+        super().__init__()
+        self.stamps = {} # order_id -> sequence number
+        self._seq = itertools.count(1)
+        self.watermark = 0 # sequence number of the last mutation seen
+
+    def handle(self, event):
+        if event.kind in _RECORDERS:
+            order_id = event.fields.get("order_id")
+            if order_id is not None:
+                self.watermark = self.stamps[order_id] = next(self._seq)
+
+def track_changes(app):
+    """Starts stamping the orders of `app` for incremental export. Returns the ChangeTracker."""
+    tracker = getattr(app, "change_tracker", None)
+    if tracker is not None:
+        return tracker
+    tracker = ChangeTracker()
+    if isinstance(app.sink, TeeSink):
+        app.sink.add(tracker)
+    else:
+        app.sink = TeeSink(app.sink, tracker)
+    app.change_tracker = tracker
+    return tracker
+
+
+# --- Export ---
+
+def _minor_units():
+    """Converts engine amounts to integer minor units, exactly (finer amounts raise ValueError)."""
+    engine = get_money_engine()
+    if isinstance(engine, MinorUnitMoney):
+        return int
+    return MinorUnitMoney(2).parse
+
+def _columns(table, rows, numpy_arrays):
+    names = TABLES[table]
+    columns = {name: list(values) for name, values in zip(names, zip(*rows))} if rows else {name: [] for name in names}
+    if numpy_arrays:
+        columns = {name: numpy.array(values, dtype=_NUMERIC_COLUMNS.get(name, object))
+                   for name, values in columns.items()}
+    return columns
+
+def export_batches(app, tables=tuple(TABLES), since=None, batch_rows=65536, numpy_arrays=False):
+    """
+    Yields ExportBatch(table, columns, rows, watermark) for the requested
+    tables; with `since`, only for orders changed after that watermark
+    (see track_changes). Rows of a table come out in order registration order.
+    """
+    if numpy_arrays and numpy is None:
+        raise ImportError("numpy_arrays=True requires NumPy.")
+    unknown = set(tables) - TABLES.keys()
+    if unknown:
+        raise ValueError(f"Unknown tables: {', '.join(sorted(unknown))}")
+    tracker = getattr(app, "change_tracker", None)
+    if since is not None and tracker is None:
+        raise ValueError("Incremental export needs track_changes(app) first.")
+    watermark = tracker.watermark if tracker is not None else None
+    minor = _minor_units()
+    wanted = set(tables)
+    buffers = {table: [] for table in tables}
+
+    orders = list(app.orders.values()) # the application may register orders while we yield
+    if since is not None:
+        stamps = tracker.stamps
+        orders = [order for order in orders if stamps.get(order.order_id, 0) > since]
+    for order in orders:
+        order_id = order.order_id
+        if "orders" in wanted:
+            buffers["orders"].append((order_id, order.creator_id, order.contractor_id, order.representative_id,
+                                      order.status, order.funding_policy, minor(order.total_cost),
+                                      minor(order.escrow_balance), minor(order.paid_amount)))
+        for milestone in order.milestones.values():
+            act = milestone.act
+            if "milestones" in wanted:
+                buffers["milestones"].append((order_id, milestone.milestone_id, milestone.description,
+                                              minor(milestone.amount), milestone.status,
+                                              act.act_id if act is not None else "",
+                                              act is not None and act.is_complete))
+            if act is not None and "signatures" in wanted:
+                for position, signer_id in enumerate(act._signatures):
+                    buffers["signatures"].append((order_id, milestone.milestone_id, act.act_id, signer_id, position))
+        if "contributions" in wanted:
+            for customer_id, amount in order.contributions.items():
+                buffers["contributions"].append((order_id, customer_id, minor(amount)))
+        if "votes" in wanted:
+            for voter_id, candidate_id in order.votes_for_rep.items():
+                buffers["votes"].append((order_id, voter_id, candidate_id))
+        for table, rows in buffers.items():
+            while len(rows) >= batch_rows:
+                yield ExportBatch(table, _columns(table, rows[:batch_rows], numpy_arrays), batch_rows, watermark)
+                del rows[:batch_rows]
+    for table, rows in buffers.items():
+        while rows:
+            chunk = rows[:batch_rows]
+            yield ExportBatch(table, _columns(table, chunk, numpy_arrays), len(chunk), watermark)
+            del rows[:batch_rows]
+
+def write_csv_chunks(batches, directory, prefix=""):
+    """Writes each batch to <directory>/<prefix><table>-<n>.csv. Returns the paths written."""
+    os.makedirs(directory, exist_ok=True)
+    counters = {}
+    paths = []
+    for batch in batches:
+        number = counters[batch.table] = counters.get(batch.table, -1) + 1
+        path = os.path.join(directory, f"{prefix}{batch.table}-{number:05d}.csv")
+        names = list(batch.columns)
+        with open(path + ".tmp", "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(names)
+            writer.writerows(zip(*(batch.columns[name] for name in names)))
+        os.replace(path + ".tmp", path)
+        paths.append(path)
+    return paths
+
+
+if __name__ == "__main__":
+    from escrow5 import EscrowApplication, NullSink
+    from escrow5_bench import build_settled_orders
+
+    if len(sys.argv) < 2:
+        sys.exit("Usage: python escrow5_export.py directory [orders]")
+    app = EscrowApplication(sink=NullSink())
+    track_changes(app)
+    build_settled_orders(app, int(sys.argv[2].replace("_", "")) if len(sys.argv) > 2 else 10_000)
+    paths = write_csv_chunks(export_batches(app), sys.argv[1])
+    print(f"Wrote {len(paths)} files to {sys.argv[1]} (watermark {app.change_tracker.watermark}).")
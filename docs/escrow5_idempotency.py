@@ -0,0 +1,306 @@
+"""
+Idempotency keys for escrow5.EscrowApplication.
+
+enable_idempotency(app) lets every mutating method of `app` take an
+`idempotency_key` keyword argument. The first call with a key runs as usual
+and its result is kept in an IdempotencyCache; a retry with the same key (a
+webhook delivered twice, a client resending after a timeout) gets that
+result back without the operation running again, so a repeated join_order
+debits the customer once and a repeated sign_act skips the signer checks.
+Calls without a key are not affected.
+
+A key names one request: reusing it for another method or other arguments
+is refused with IDEMPOTENCY_CONFLICT (the call returns None). A retry that
+arrives while the first call is still running waits for it. Every result is
+kept, rejections (False/None) included; a call that raises is not, so it
+can be retried.
+
+The cache holds at most `capacity` keys, evicting the least recently used
+one, and forgets a key `ttl` seconds after its first call. With `path`,
+every entry is also appended to a file that is loaded again on start, so
+retries after a restart are absorbed too; keep the application state in
+escrow5_ledger so that the remembered results still describe it. An entry
+is written once its call has returned and, when `app` has a ledger, once the
+ledger has synced the call's records: a crash in between loses the entry,
+not the operation. A result that cannot be written (a batch echoing an
+operation JSON cannot hold) is written as a refusal instead: after a restart
+a retry with its key is refused with IDEMPOTENCY_CONFLICT rather than run
+again. place_hold results are kept in memory only, since holds do not
+survive a restart and a new process hands out the same hold ids again.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from decimal import Decimal
+
+from escrow5 import Act, BatchResult, BulkOrderResult, EventKind, EventLevel, Order, User
+
+# Methods that take an idempotency key once enable_idempotency() has been called
+IDEMPOTENT_METHODS = ("create_customer", "create_contractor", "customer_deposit", "create_order",
+                      "create_orders_bulk", "join_order", "mark_milestone_complete", "sign_act",
+                      "vote_for_representative", "apply_batch", "place_hold", "commit_hold", "release_hold")
+
+# Methods whose results are not written to the file: their answers do not outlive the process
+VOLATILE_METHODS = ("place_hold",)
+
+DEFAULT_TTL_SECONDS = 24 * 3600.0
+
+
+# --- Results on disk ---
+# Orders, users and acts are kept as their ids and looked up again when a retry
+# needs them. A result of any other type that JSON cannot hold raises TypeError
+# in _encode and is written as a refusal rather than coming back as something
+# else after a restart.
+
+_PLAIN_TYPES = (bool, int, float, str, type(None))
+
+def _encode_part(value):
+    # Batch operations echo the caller's amounts, which may be Decimals
+    return str(value) if isinstance(value, Decimal) else value
+
+def _encode(result):
+    if isinstance(result, Order):
+        return {"order": result.order_id}
+    if isinstance(result, User):
+        return {"user": result.user_id}
+    if isinstance(result, Act):
+        return {"act": [result.order_id, result.milestone_id]}
+    if isinstance(result, list) and result and isinstance(result[0], BatchResult):
+        return {"batch": [[r.index, [_encode_part(part) for part in r.operation], r.success, r.error]
+                          for r in result]}
+    if isinstance(result, list) and result and isinstance(result[0], BulkOrderResult):
+        return {"bulk": [[r.index, r.order.order_id if r.order is not None else None, r.error, r.reason]
+                         for r in result]}
+    if isinstance(result, _PLAIN_TYPES) or result == []:
+        return {"value": result}
+    raise TypeError(f"Cannot keep a result of type {type(result).__name__} for an idempotency key.")
+
+def _record(result):
+    """The encoded result as written to the file, or a refusal if it cannot be written."""
+    try:
+        record = _encode(result)
+        json.dumps(record)
+    except (TypeError, ValueError):
+        return {"refused": type(result).__name__}
+    return record
+
+def _decode(app, record):
+    if "order" in record:
+        return app.orders.get(record["order"])
+    if "user" in record:
+        return app.users.get(record["user"])
+    if "act" in record:
+        order_id, milestone_id = record["act"]
+        order = app.orders.get(order_id)
+        milestone = order.milestones.get(milestone_id) if order else None
+        return milestone.act if milestone else None
+    if "batch" in record:
+        return [BatchResult(index, tuple(operation), success, error)
+                for index, operation, success, error in record["batch"]]
+    if "bulk" in record:
+        return [BulkOrderResult(index, app.orders.get(order_id) if order_id is not None else None, error, reason)
+                for index, order_id, error, reason in record["bulk"]]
+    return record["value"]
+
+def _fingerprint(name, args, kwargs):
+    text = repr((name, args, sorted(kwargs.items())))
+    return hashlib.blake2b(text.encode(), digest_size=16).hexdigest()
+
+
+# --- Cache ---
+
+class _Entry:
+    __slots__ = ("fingerprint", "expires_at", "result", "record", "persist")
+
+    def __init__(self, fingerprint, expires_at, result, record=None, persist=True):
+        self.fingerprint = fingerprint
+        self.expires_at = expires_at
+        self.result = result
+        self.record = record # encoded result of an entry loaded from disk, decoded on its first hit
+        self.persist = persist # False for entries kept in memory only
+
+    @property
+    def refused(self):
+        """True for an entry loaded from disk whose result could not be written."""
+        return self.record is not None and "refused" in self.record
+
+
+class IdempotencyCache:
+    """Results of keyed calls, bounded by `capacity` (LRU) and `ttl` seconds, optionally kept in `path`."""
+    def __init__(self, capacity=100_000, ttl=DEFAULT_TTL_SECONDS, path=None, fsync=True):
+        self.capacity = capacity
+        self.ttl = ttl
+        self.path = path
+        self.fsync = fsync
+        self._entries = OrderedDict() # key -> _Entry, least recently used first
+        self._running = {} # key -> (fingerprint, threading.Event) of calls in progress
+        self._lock = threading.Lock()
+        self._file = None
+        self._lines = 0 # lines in the file, live or not
+        self.hits = 0
+        if path is not None:
+            self._load()
+            self._rewrite()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _get(self, key, now):
+        entry = self._entries.get(key)
+        if entry is not None:
+            if entry.expires_at <= now:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+        return entry
+
+    def claim(self, key, fingerprint):
+        """
+        ("hit", entry) if the key already has a result, ("conflict", None) if it
+        was used for another request, otherwise ("run", None): the caller runs
+        the call and reports it with complete() or abandon().
+        """
+        while True:
+            with self._lock:
+                entry = self._get(key, time.time())
+                if entry is not None:
+                    if entry.fingerprint != fingerprint:
+                        return "conflict", None
+                    self.hits += 1
+                    return "hit", entry
+                running = self._running.get(key)
+                if running is None:
+                    self._running[key] = (fingerprint, threading.Event())
+                    return "run", None
+            if running[0] != fingerprint:
+                return "conflict", None
+            running[1].wait()
+
+    def complete(self, key, fingerprint, result, persist=True):
+        """Keeps the result of a claimed call; with persist=False it is not written to the file."""
+        expires_at = time.time() + self.ttl
+        with self._lock:
+            try:
+                line = None
+                if self._file is not None and persist:
+                    line = json.dumps([key, fingerprint, expires_at, _record(result)]) + "\n"
+                self._entries[key] = _Entry(fingerprint, expires_at, result, persist=persist)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.capacity:
+                    self._entries.popitem(last=False)
+                if line is not None:
+                    self._append(line)
+            finally:
+                self._running.pop(key)[1].set()
+
+    def abandon(self, key):
+        """Forgets a claimed call that raised, so it can be retried."""
+        with self._lock:
+            self._running.pop(key)[1].set()
+
+    def result(self, entry, app):
+        if entry.record is not None:
+            entry.result = _decode(app, entry.record)
+            entry.record = None
+        return entry.result
+
+    # Persistence
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        now = time.time()
+        with open(self.path, "rb") as f:
+            for line in f:
+                try:
+                    key, fingerprint, expires_at, record = json.loads(line)
+                except ValueError:
+                    break # Torn write at the end of the file
+                if expires_at > now:
+                    self._entries[key] = _Entry(fingerprint, expires_at, None, record)
+                    self._entries.move_to_end(key)
+        while len(self._entries) > self.capacity:
+            self._entries.popitem(last=False)
+
+    def _rewrite(self):
+        """Replaces the file with the live entries only."""
+        if self._file is not None:
+            self._file.close()
+        with open(self.path + ".tmp", "w") as f:
+            for key, entry in self._entries.items():
+                if not entry.persist:
+                    continue
+                record = entry.record if entry.record is not None else _record(entry.result)
+                f.write(json.dumps([key, entry.fingerprint, entry.expires_at, record]) + "\n")
+            f.flush()
+            if self.fsync:
+                os.fsync(f.fileno())
+        os.replace(self.path + ".tmp", self.path)
+        self._file = open(self.path, "a")
+        self._lines = len(self._entries)
+
+    def _append(self, line):
+        self._file.write(line)
+        self._file.flush()
+        if self.fsync:
+            os.fsync(self._file.fileno())
+        self._lines += 1
+        if self._lines > 2 * self.capacity:
+            self._rewrite()
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+# --- Application ---
+
+def _keyed(app, cache, name, method):
+    ledger = getattr(app, "ledger", None)
+    def wrapper(*args, idempotency_key=None, **kwargs):
+        if idempotency_key is None:
+            return method(*args, **kwargs)
+        fingerprint = _fingerprint(name, args, kwargs)
+        state, entry = cache.claim(idempotency_key, fingerprint)
+        if state == "hit" and entry.refused:
+            app.sink.emit(EventKind.IDEMPOTENCY_CONFLICT, EventLevel.ERROR,
+                          "Error: The result of request {key} to {method} was not kept; it is not run again.",
+                          key=idempotency_key, method=name)
+            return None
+        if state == "hit":
+            app.sink.emit(EventKind.IDEMPOTENT_REPLAY, EventLevel.INFO,
+                          "Request {key} to {method} was already processed; returning its original result.",
+                          key=idempotency_key, method=name)
+            return cache.result(entry, app)
+        if state == "conflict":
+            app.sink.emit(EventKind.IDEMPOTENCY_CONFLICT, EventLevel.ERROR,
+                          "Error: Idempotency key {key} was already used for a different request.",
+                          key=idempotency_key, method=name)
+            return None
+        try:
+            result = method(*args, **kwargs)
+        except BaseException:
+            cache.abandon(idempotency_key)
+            raise
+        if ledger is not None:
+            ledger.sync() # the entry must not reach disk before the records it answers for
+        cache.complete(idempotency_key, fingerprint, result, persist=name not in VOLATILE_METHODS)
+        return result
+    wrapper.__name__ = name
+    wrapper.__doc__ = method.__doc__
+    return wrapper
+
+def enable_idempotency(app, cache=None):
+    """Lets the mutating methods of `app` take an idempotency_key. Returns the IdempotencyCache."""
+    if getattr(app, "idempotency", None) is not None:
+        raise ValueError("Idempotency keys are already enabled for this application.")
+    cache = cache if cache is not None else IdempotencyCache()
+    for name in IDEMPOTENT_METHODS:
+        setattr(app, name, _keyed(app, cache, name, getattr(app, name)))
+    app.idempotency = cache
+    return cache
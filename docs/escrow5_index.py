@@ -0,0 +1,282 @@
+"""
+Secondary indexes for escrow5.EscrowApplication.
+
+EscrowApplication can only look orders up by id. EscrowIndex keeps, for every
+order, its entry in indexes by status, contractor, contractor and status,
+representative and contributor, plus the open milestones by status (with the
+time they entered it) and the acts still waiting on each authorised signer
+(Order.signer_role, so contributors too under a signature policy that counts them).
+It is maintained from the same mutation events the ledger records (see
+escrow5.EventKind), so every state transition updates it and queries cost time
+proportional to the result rather than to the number of orders.
+
+Index entries are insertion-ordered dicts used as sets: orders come back in
+the order they entered the matching index entry (e.g. the order they reached
+a status), and open milestones in the order they entered their status.
+Buckets are never deleted, so concurrent updates to different orders cannot
+drop each other's entries (their number is bounded by users and statuses).
+"""
+import threading
+import time
+
+from escrow5 import (EscrowApplication, EventKind, EventLevel, EventSink, MilestoneStatus, OrderStatus,
+                     PLATFORM_SIGNATURE_ID, TeeSink, get_default_sink)
+
+# PAID is terminal and the largest group by far, so only open milestones are indexed by age
+INDEXED_MILESTONE_STATUSES = (MilestoneStatus.PENDING, MilestoneStatus.COMPLETED_BY_CONTRACTOR)
+
+
+class EscrowIndex:
+    """Secondary indexes over the orders of one application, fed by IndexSink."""
+    def __init__(self):
+        self.orders = {} # order_id -> Order, for every indexed order
+        self._status_of = {} # order_id -> status the order is indexed under
+        self._by_status = {}
+        self._by_contractor = {}
+        self._by_contractor_status = {} # (contractor_id, status) -> orders
+        self._by_representative = {}
+        self._by_contributor = {}
+        self._milestones = {status: {} for status in INDEXED_MILESTONE_STATUSES} # (order_id, milestone_id) -> since
+        self._milestones_lock = threading.Lock() # keeps each bucket's `since` values non-decreasing
+        self._open_acts = {} # order_id -> milestone ids whose act is not complete
+        self._awaiting = {} # signer_id -> (order_id, milestone_id) of acts that signer can still sign
+
+    # Maintenance
+
+    def add_order(self, order, since=None):
+        """Indexes `order` in its current state. `since` is the time its open milestones entered their status."""
+        since = time.time() if since is None else since
+        order_id = order.order_id
+        self.orders[order_id] = order
+        self._status_of[order_id] = order.status
+        self._bucket(self._by_status, order.status)[order_id] = None
+        self._bucket(self._by_contractor, order.contractor_id)[order_id] = None
+        self._bucket(self._by_contractor_status, (order.contractor_id, order.status))[order_id] = None
+        self._bucket(self._by_representative, order.representative_id)[order_id] = None
+        for customer_id in order.contributions:
+            self._bucket(self._by_contributor, customer_id)[order_id] = None
+        for milestone in order.milestones.values():
+            if milestone.status in self._milestones:
+                self._enter_status(milestone.status, (order_id, milestone.milestone_id), since)
+            if milestone.act is not None and not milestone.act.is_complete:
+                self._open_act(order, milestone)
+
+    def rebuild(self, app):
+        """Re-indexes every order of `app`, e.g. after its state was loaded without events."""
+        self.__init__()
+        now = time.time()
+        for order in app.orders.values():
+            self.add_order(order, now)
+
+    def set_status(self, order_id, status):
+        previous = self._status_of[order_id]
+        if previous == status:
+            return
+        contractor_id = self.orders[order_id].contractor_id
+        self._by_status[previous].pop(order_id, None)
+        self._by_contractor_status[(contractor_id, previous)].pop(order_id, None)
+        self._status_of[order_id] = status
+        self._bucket(self._by_status, status)[order_id] = None
+        self._bucket(self._by_contractor_status, (contractor_id, status))[order_id] = None
+
+    def add_contributor(self, order_id, customer_id):
+        self._bucket(self._by_contributor, customer_id)[order_id] = None
+        # Under a policy that counts contributors, a new one can sign the acts already open
+        order = self.orders[order_id]
+        if self._open_acts.get(order_id) and order.signer_role(customer_id) is not None:
+            for milestone_id in self._open_acts[order_id]:
+                if customer_id not in order.milestones[milestone_id].act._signatures:
+                    self._bucket(self._awaiting, customer_id)[(order_id, milestone_id)] = None
+
+    def set_milestone_status(self, order_id, milestone_id, previous, status, since):
+        key = (order_id, milestone_id)
+        if previous in self._milestones:
+            self._milestones[previous].pop(key, None)
+        if status in self._milestones:
+            self._enter_status(status, key, since)
+
+    def _enter_status(self, status, key, since):
+        # Appended in arrival order with `since` raised to the newest entry's if the clock
+        # stepped back or events from several threads arrived out of order, so that
+        # milestones_with_status can stop at the first entry that is too new
+        bucket = self._milestones[status]
+        with self._milestones_lock:
+            if bucket:
+                since = max(since, bucket[next(reversed(bucket))])
+            bucket[key] = since
+
+    def _open_act(self, order, milestone):
+        self._bucket(self._open_acts, order.order_id)[milestone.milestone_id] = None
+        key = (order.order_id, milestone.milestone_id)
+        signed = milestone.act._signatures
+        for signer_id in self._candidates(order):
+            if signer_id not in signed and order.signer_role(signer_id) is not None:
+                self._bucket(self._awaiting, signer_id)[key] = None
+
+    def open_act(self, order_id, milestone_id):
+        order = self.orders[order_id]
+        self._open_act(order, order.milestones[milestone_id])
+
+    def add_signature(self, order_id, milestone_id, signer_id):
+        awaiting = self._awaiting.get(signer_id)
+        if awaiting is not None:
+            awaiting.pop((order_id, milestone_id), None)
+
+    def close_act(self, order_id, milestone_id):
+        order = self.orders[order_id]
+        self._open_acts[order_id].pop(milestone_id, None)
+        for signer_id in self._candidates(order):
+            self.add_signature(order_id, milestone_id, signer_id)
+
+    def set_representative(self, order_id, previous, representative_id):
+        order = self.orders[order_id]
+        self._by_representative[previous].pop(order_id, None)
+        self._bucket(self._by_representative, representative_id)[order_id] = None
+        # Acts still open can now be signed by the new representative, and by the old
+        # one only if the signature policy still admits them (e.g. as a contributor)
+        previous_may_sign = order.signer_role(previous) is not None
+        for milestone_id in self._open_acts.get(order_id, ()):
+            if not previous_may_sign:
+                self.add_signature(order_id, milestone_id, previous)
+            if representative_id not in order.milestones[milestone_id].act._signatures:
+                self._bucket(self._awaiting, representative_id)[(order_id, milestone_id)] = None
+
+    @staticmethod
+    def _candidates(order):
+        """Everyone who might sign the order's acts; Order.signer_role decides who actually may."""
+        fixed = (PLATFORM_SIGNATURE_ID, order.contractor_id, order.representative_id)
+        if order.signature_policy is None:
+            return fixed # only the fixed roles sign under the default policy
+        return (*fixed, *order.contributions)
+
+    @staticmethod
+    def _bucket(index, key):
+        bucket = index.get(key)
+        if bucket is None:
+            bucket = index.setdefault(key, {})
+        return bucket
+
+    # Queries
+
+    def find_orders(self, status=None, contractor_id=None, representative_id=None, contributor_id=None):
+        """
+        Orders matching every given filter, in index order. The smallest
+        matching index is scanned and checked against the others; status together
+        with contractor_id is answered from a single index.
+        """
+        candidates = []
+        if status is not None and contractor_id is not None:
+            candidates.append(self._by_contractor_status.get((contractor_id, status), {}))
+        else:
+            if status is not None:
+                candidates.append(self._by_status.get(status, {}))
+            if contractor_id is not None:
+                candidates.append(self._by_contractor.get(contractor_id, {}))
+        if representative_id is not None:
+            candidates.append(self._by_representative.get(representative_id, {}))
+        if contributor_id is not None:
+            candidates.append(self._by_contributor.get(contributor_id, {}))
+        if not candidates:
+            return list(self.orders.values())
+        candidates.sort(key=len)
+        smallest, others = candidates[0], candidates[1:]
+        return [self.orders[order_id] for order_id in smallest
+                if all(order_id in other for other in others)]
+
+    def awaiting_signature(self, signer_id):
+        """(order, milestone) pairs whose act is incomplete and can still be signed by `signer_id`."""
+        result = []
+        for order_id, milestone_id in self._awaiting.get(signer_id, {}):
+            order = self.orders[order_id]
+            result.append((order, order.milestones[milestone_id]))
+        return result
+
+    def milestones_with_status(self, status, before=None):
+        """
+        (order, milestone, since) for open milestones in `status`, in the order they entered it;
+        with `before`, only those that entered the status before that time.time() value. `since`
+        never decreases along the result (see _enter_status), so this stops at the first newer one.
+        """
+        if status not in self._milestones:
+            raise ValueError(f"Milestones in status '{status}' are not indexed.")
+        result = []
+        for (order_id, milestone_id), since in self._milestones[status].items():
+            if before is not None and since >= before:
+                break # Entries are kept in non-decreasing order of `since`
+            order = self.orders[order_id]
+            result.append((order, order.milestones[milestone_id], since))
+        return result
+
+
+# --- Event wiring ---
+
+def _order_registered(index, event):
+    index.add_order(event.fields["order"], event.timestamp)
+
+def _contribution_added(index, event):
+    index.add_contributor(event.fields["order_id"], event.fields["customer_id"])
+
+def _milestone_completed(index, event):
+    order_id, milestone_id = event.fields["order_id"], event.fields["milestone_id"]
+    index.set_status(order_id, OrderStatus.IN_PROGRESS)
+    index.set_milestone_status(order_id, milestone_id, MilestoneStatus.PENDING,
+                               MilestoneStatus.COMPLETED_BY_CONTRACTOR, event.timestamp)
+    index.open_act(order_id, milestone_id)
+
+def _funds_released(index, event):
+    index.set_milestone_status(event.fields["order_id"], event.fields["milestone_id"],
+                               MilestoneStatus.COMPLETED_BY_CONTRACTOR, MilestoneStatus.PAID, event.timestamp)
+
+def _set_status(status):
+    def update(index, event):
+        index.set_status(event.fields["order_id"], status)
+    return update
+
+_UPDATERS = {
+    EventKind.ORDER_REGISTERED: _order_registered,
+    EventKind.CONTRIBUTION_ADDED: _contribution_added,
+    EventKind.ORDER_FUNDED: _set_status(OrderStatus.FUNDED),
+    EventKind.MILESTONE_COMPLETED: _milestone_completed,
+    EventKind.SIGNATURE_ADDED: lambda index, event: index.add_signature(
+        event.fields["order_id"], event.fields["milestone_id"], event.fields["signer_id"]),
+    EventKind.ACT_COMPLETED: lambda index, event: index.close_act(event.fields["order_id"], event.fields["milestone_id"]),
+    EventKind.FUNDS_RELEASED: _funds_released,
+    EventKind.ORDER_COMPLETED: _set_status(OrderStatus.COMPLETED),
+    EventKind.REPRESENTATIVE_CHANGED: lambda index, event: index.set_representative(
+        event.fields["order_id"], event.fields["old_representative_id"], event.fields["representative_id"]),
+}
+
+
+class IndexSink(EventSink):
+    """Applies mutation events to an EscrowIndex; every other event is ignored."""
+    level = EventLevel.INFO
+
+    def __init__(self, index):
+        super().__init__()
+        self.index = index
+
+    def handle(self, event):
+        update = _UPDATERS.get(event.kind)
+        if update is not None:
+            update(self.index, event)
+
+
+class IndexedEscrowApplication(EscrowApplication):
+    """EscrowApplication with secondary indexes and a query API over its orders."""
+    def __init__(self, sink=None, **kwargs):
+        self.index = EscrowIndex()
+        output = sink if sink is not None else get_default_sink()
+        super().__init__(sink=TeeSink(output, IndexSink(self.index)), **kwargs)
+
+    def find_orders(self, status=None, contractor_id=None, representative_id=None, contributor_id=None):
+        return self.index.find_orders(status, contractor_id, representative_id, contributor_id)
+
+    def orders_awaiting_signature(self, signer_id):
+        """Distinct orders with at least one incomplete act `signer_id` can still sign."""
+        return list({order.order_id: order for order, _ in self.index.awaiting_signature(signer_id)}.values())
+
+    def acts_awaiting_signature(self, signer_id):
+        return self.index.awaiting_signature(signer_id)
+
+    def milestones_with_status(self, status, before=None):
+        return self.index.milestones_with_status(status, before)
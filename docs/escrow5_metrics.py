@@ -0,0 +1,216 @@
+"""
+Operation metrics for escrow5.EscrowApplication.
+
+instrument(app) installs timing wrappers over the public operations of one
+application instance and adds a MetricsSink to its event stream. Wrappers
+count calls and failures (a falsy result, a failed batch entry or an
+exception) and record the latency in a fixed-bucket histogram. The sink
+counts the failure events by reason (insufficient balance, wrong status,
+unauthorized signer, vote threshold not reached, ...). An application that
+is never instrumented runs exactly the code it ran before: nothing is
+checked on the hot path.
+
+Call instrument() before creating users and orders: objects keep the sink
+they were created with, so failures reported by objects created earlier
+are not counted. "Vote threshold not reached" is an INFO event, so by
+default every INFO event is built for the sink to look at; on an otherwise
+silent application, instrument(app, reasons_level=EventLevel.WARNING)
+skips that cost and counts only WARNING and ERROR reasons.
+
+render_prometheus() formats a snapshot in the Prometheus text exposition
+format; write_prometheus() writes one atomically (e.g. for the node_exporter
+textfile collector) and PrometheusFileExporter does so periodically.
+"""
+import bisect
+import os
+import threading
+import time
+
+from escrow5 import EventKind, EventLevel, EventSink, TeeSink
+
+INSTRUMENTED_METHODS = ("create_customer", "create_contractor", "customer_deposit", "create_order", "create_orders_bulk",
+                        "join_order", "mark_milestone_complete", "sign_act", "vote_for_representative",
+                        "apply_batch", "place_hold", "commit_hold", "release_hold")
+
+# Event kinds counted as failure reasons
+FAILURE_KINDS = frozenset((
+    EventKind.NOT_FOUND, EventKind.INVALID_USER, EventKind.INVALID_AMOUNT, EventKind.INVALID_ORDER,
+    EventKind.INVALID_STATUS, EventKind.INSUFFICIENT_BALANCE, EventKind.NOT_A_CONTRIBUTOR,
+    EventKind.NOT_ASSIGNED, EventKind.UNAUTHORIZED_SIGNER, EventKind.DUPLICATE_SIGNATURE,
+    EventKind.ACT_ALREADY_COMPLETE, EventKind.ALREADY_PAID, EventKind.ROLLBACK, EventKind.RELEASE_FAILED,
+    EventKind.INVALID_OPERATION, EventKind.BATCH_ABORTED, EventKind.VOTE_THRESHOLD_NOT_REACHED,
+    EventKind.IDEMPOTENCY_CONFLICT,
+))
+
+# Histogram bucket upper bounds, in seconds
+DEFAULT_BUCKETS = (0.000005, 0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005,
+                   0.001, 0.0025, 0.005, 0.01, 0.025, 0.1)
+
+
+class _OperationStats:
+    __slots__ = ("calls", "failures", "buckets", "seconds")
+
+    def __init__(self, bucket_count):
+        self.calls = 0
+        self.failures = 0
+        self.buckets = [0] * (bucket_count + 1) # last one is +Inf
+        self.seconds = 0.0
+
+
+class EscrowMetrics:
+    """Per-operation counters and latency histograms, and failure counts by reason."""
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.bucket_bounds = tuple(buckets)
+        self.operations = {}
+        self.failure_reasons = {} # EventKind -> count
+        self._lock = threading.Lock()
+
+    def observe(self, operation, seconds, failed):
+        with self._lock:
+            stats = self.operations.get(operation)
+            if stats is None:
+                stats = self.operations[operation] = _OperationStats(len(self.bucket_bounds))
+            stats.calls += 1
+            stats.failures += failed
+            stats.seconds += seconds
+            stats.buckets[bisect.bisect_left(self.bucket_bounds, seconds)] += 1
+
+    def count_failure(self, reason):
+        with self._lock:
+            self.failure_reasons[reason] = self.failure_reasons.get(reason, 0) + 1
+
+    def reset(self):
+        with self._lock:
+            self.operations = {}
+            self.failure_reasons = {}
+
+
+class MetricsSink(EventSink):
+    """Counts failure events by kind; every other event is ignored."""
+    level = EventLevel.INFO # VOTE_THRESHOLD_NOT_REACHED is reported at INFO
+
+    def __init__(self, metrics, level=None):
+        super().__init__(level)
+        self.metrics = metrics
+
+    def handle(self, event):
+        if event.kind in FAILURE_KINDS:
+            self.metrics.count_failure(event.kind)
+
+
+def _failed(result):
+    if isinstance(result, list): # apply_batch, create_orders_bulk
+        return any(not entry.success for entry in result)
+    return not result
+
+def _timed(metrics, name, method):
+    perf_counter = time.perf_counter
+    def wrapper(*args, **kwargs):
+        started = perf_counter()
+        failed = True
+        try:
+            result = method(*args, **kwargs)
+            failed = _failed(result)
+            return result
+        finally:
+            metrics.observe(name, perf_counter() - started, failed)
+    wrapper.__name__ = name
+    wrapper.__doc__ = method.__doc__
+    return wrapper
+
+def instrument(app, metrics=None, reasons_level=EventLevel.INFO):
+    """Starts collecting metrics for `app` (see the module docstring). Returns the EscrowMetrics."""
+    if getattr(app, "metrics", None) is not None:
+        raise ValueError("Application is already instrumented.")
+    metrics = metrics if metrics is not None else EscrowMetrics()
+    for name in INSTRUMENTED_METHODS:
+        setattr(app, name, _timed(metrics, name, getattr(app, name)))
+    sink = MetricsSink(metrics, reasons_level)
+    if isinstance(app.sink, TeeSink):
+        app.sink.add(sink)
+    else:
+        app.sink = TeeSink(app.sink, sink)
+    app.metrics = metrics
+    app._metrics_sink = sink
+    return metrics
+
+def uninstrument(app):
+    """Removes the wrappers and sink installed by instrument()."""
+    if getattr(app, "metrics", None) is None:
+        return
+    for name in INSTRUMENTED_METHODS:
+        del app.__dict__[name]
+    app.sink.remove(app._metrics_sink)
+    app.metrics = app._metrics_sink = None
+
+
+# --- Prometheus text format ---
+
+def _format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+def render_prometheus(metrics, prefix="escrow"):
+    """Returns a snapshot of `metrics` in the Prometheus text exposition format."""
+    with metrics._lock:
+        operations = {name: (stats.calls, stats.failures, list(stats.buckets), stats.seconds)
+                      for name, stats in metrics.operations.items()}
+        reasons = dict(metrics.failure_reasons)
+    lines = [
+        f"# HELP {prefix}_operations_total Calls to each EscrowApplication operation.",
+        f"# TYPE {prefix}_operations_total counter",
+    ]
+    for name, (calls, _, _, _) in sorted(operations.items()):
+        lines.append(f'{prefix}_operations_total{{operation="{name}"}} {calls}')
+    lines += [
+        f"# HELP {prefix}_operation_failures_total Calls that returned a failure or raised.",
+        f"# TYPE {prefix}_operation_failures_total counter",
+    ]
+    for name, (_, failures, _, _) in sorted(operations.items()):
+        lines.append(f'{prefix}_operation_failures_total{{operation="{name}"}} {failures}')
+    lines += [
+        f"# HELP {prefix}_operation_duration_seconds Latency of each EscrowApplication operation.",
+        f"# TYPE {prefix}_operation_duration_seconds histogram",
+    ]
+    for name, (calls, _, buckets, seconds) in sorted(operations.items()):
+        cumulative = 0
+        for bound, count in zip(metrics.bucket_bounds + (None,), buckets):
+            cumulative += count
+            le = "+Inf" if bound is None else _format_value(bound)
+            lines.append(f'{prefix}_operation_duration_seconds_bucket{{operation="{name}",le="{le}"}} {cumulative}')
+        lines.append(f'{prefix}_operation_duration_seconds_sum{{operation="{name}"}} {_format_value(seconds)}')
+        lines.append(f'{prefix}_operation_duration_seconds_count{{operation="{name}"}} {calls}')
+    lines += [
+        f"# HELP {prefix}_failures_total Failure events by reason.",
+        f"# TYPE {prefix}_failures_total counter",
+    ]
+    for reason, count in sorted(reasons.items()):
+        lines.append(f'{prefix}_failures_total{{reason="{reason.lower()}"}} {count}')
+    return "\n".join(lines) + "\n"
+
+def write_prometheus(metrics, path, prefix="escrow"):
+    """Writes a snapshot to `path`, replacing it atomically so a scraper never reads a partial file."""
+    with open(path + ".tmp", "w") as f:
+        f.write(render_prometheus(metrics, prefix))
+    os.replace(path + ".tmp", path)
+
+
+class PrometheusFileExporter:
+    """Rewrites a Prometheus text file with the current metrics every `interval` seconds."""
+    def __init__(self, metrics, path, interval=15.0, prefix="escrow"):
+        self.metrics = metrics
+        self.path = path
+        self.interval = interval
+        self.prefix = prefix
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="escrow-metrics-exporter", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            write_prometheus(self.metrics, self.path, self.prefix)
+
+    def close(self):
+        """Stops the exporter after writing a final snapshot."""
+        self._stop.set()
+        self._thread.join()
+        write_prometheus(self.metrics, self.path, self.prefix)
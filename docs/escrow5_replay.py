@@ -0,0 +1,259 @@
+"""
+Event-sourced replay for escrow5.EscrowApplication.
+
+Every public operation already reports each state change it makes as a
+mutation event, and escrow5_ledger defines a compact record for each one
+(the same records the durable ledger writes). EventLog is an append-only,
+in-memory sequence of those records, numbered from 1. It is filled either
+live, by an EventSourcedEscrowApplication, or from a ledger directory.
+
+Replaying applies records directly with escrow5_ledger.apply_record: nothing
+is validated and no messages are produced, so the result is exactly the
+state that was reached, including ids. Records are replayed rather than
+the calls that produced them because a call's outcome depends on state and
+on freshly generated ids, while a record does not.
+
+Replay can be split across processes by order_id: every worker gets the
+user records and the records of its share of the orders, and the orders it
+rebuilds are merged with the balances replayed in the parent.
+
+Time travel: state_at(n) rebuilds the whole application as of record n;
+order_at() and balance_at() answer for one order or user from per-order
+and per-user positions, touching only that order's records.
+"""
+import bisect
+import json
+import os
+import zlib
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+from escrow5 import (EscrowApplication, EventKind, EventLevel, EventSink, NullSink, TeeSink,
+                     get_default_sink, get_money_engine, set_money_engine)
+from escrow5_ledger import (LOG_PREFIX, SNAPSHOT_PREFIX, _RECORDERS, _load, apply_record, dump_state,
+                            load_state)
+
+ReplayRecord = namedtuple("ReplayRecord", ("seq", "kind", "data"))
+
+# Records that are about users only; every other record carries an order_id
+USER_RECORD_KINDS = frozenset((EventKind.USER_CREATED, EventKind.BALANCE_CHANGED))
+
+
+class EventLog:
+    """
+    Append-only sequence of mutation records. `base` is the state (see
+    escrow5_ledger.dump_state) the first record applies to; None means empty.
+    Records are never modified once appended.
+    """
+    def __init__(self, base=None, base_seq=0):
+        self.base = base
+        self.base_seq = base_seq # sequence number of the last record folded into `base`
+        self.records = []
+        self._by_order = None # order_id -> positions in records, built on first time-travel query
+        self._balances = None # user_id -> ([seq, ...], [balance, ...])
+        self._user_created = None # user_id -> position of USER_CREATED
+
+    @property
+    def last_seq(self):
+        return self.records[-1].seq if self.records else self.base_seq
+
+    def append(self, kind, data):
+        record = ReplayRecord(self.last_seq + 1, kind, data)
+        self.records.append(record)
+        if self._by_order is not None:
+            self._index(len(self.records) - 1, record)
+        return record.seq
+
+    @classmethod
+    def from_ledger(cls, directory):
+        """
+        Reads an escrow5_ledger directory without modifying it. The whole
+        history is available if it was written with keep_history=True;
+        otherwise the log starts at the latest snapshot.
+        """
+        segments = sorted(name for name in os.listdir(directory)
+                          if name.startswith(LOG_PREFIX) and not name.endswith(".tmp"))
+        first_seq = int(segments[0][len(LOG_PREFIX):-len(".log")]) if segments else 1
+        log = cls()
+        if first_seq > 1:
+            for name in sorted((n for n in os.listdir(directory)
+                                if n.startswith(SNAPSHOT_PREFIX) and not n.endswith(".tmp")), reverse=True):
+                with open(os.path.join(directory, name)) as f:
+                    snapshot = json.load(f)
+                log = cls(snapshot["state"], snapshot["seq"])
+                break
+        for name in segments:
+            with open(os.path.join(directory, name), "rb") as f:
+                for line in f:
+                    try:
+                        seq, kind, data = json.loads(line)
+                    except ValueError:
+                        return log # Torn write at the end of the log
+                    if seq > log.last_seq:
+                        log.records.append(ReplayRecord(seq, kind, data))
+        return log
+
+    # Replay
+
+    def _position(self, upto):
+        """Number of records with seq <= upto."""
+        if upto is None:
+            return len(self.records)
+        if upto < self.base_seq:
+            raise ValueError(f"Record {upto} precedes the start of this log ({self.base_seq}).")
+        return upto - self.base_seq
+
+    def replay(self, upto=None, app=None, partitions=1, processes=None):
+        """
+        Returns an application holding the state as of record `upto` (default:
+        the last one). With partitions > 1 the orders are rebuilt in parallel
+        by up to `processes` worker processes.
+        """
+        app = app if app is not None else EscrowApplication(sink=NullSink())
+        records = self.records[:self._position(upto)]
+        if partitions <= 1:
+            if self.base is not None:
+                load_state(app, self.base)
+            for record in records:
+                apply_record(app, record.kind, record.data)
+            return app
+        return self._replay_partitioned(app, records, partitions, processes)
+
+    def state_at(self, seq, **options):
+        """The whole application as of record `seq`."""
+        return self.replay(upto=seq, **options)
+
+    def _replay_partitioned(self, app, records, partitions, processes):
+        base_users = self.base["users"] if self.base is not None else []
+        base_orders = self.base["orders"] if self.base is not None else []
+        # Balances are recorded as absolute values, so the users replay on their own
+        user_records = [(r.kind, r.data) for r in records if r.kind in USER_RECORD_KINDS]
+        created = [(r.kind, r.data) for r in records if r.kind == EventKind.USER_CREATED]
+        shares = [([], []) for _ in range(partitions)]
+        for order_state in base_orders:
+            shares[_partition(order_state["order_id"], partitions)][0].append(order_state)
+        rank = {order_state["order_id"]: i for i, order_state in enumerate(base_orders)}
+        for record in records:
+            if record.kind not in USER_RECORD_KINDS:
+                order_id = record.data["order_id"]
+                shares[_partition(order_id, partitions)][1].append((record.kind, record.data))
+                if record.kind == EventKind.ORDER_REGISTERED:
+                    rank[order_id] = len(rank)
+
+        engine = get_money_engine()
+        with ProcessPoolExecutor(processes, initializer=set_money_engine, initargs=(engine,)) as pool:
+            futures = [pool.submit(_replay_orders, engine.name, base_users, orders, created, order_records)
+                       for orders, order_records in shares]
+            users_app = EscrowApplication(sink=NullSink())
+            load_state(users_app, {"money": engine.name, "users": base_users, "orders": []})
+            for kind, data in user_records:
+                apply_record(users_app, kind, data)
+            orders = [order_state for future in futures for order_state in future.result()]
+        orders.sort(key=lambda order_state: rank[order_state["order_id"]])
+        load_state(app, {"money": engine.name, "users": dump_state(users_app)["users"], "orders": orders})
+        return app
+
+    # Time travel
+
+    def _build_indexes(self):
+        self._by_order, self._balances, self._user_created = {}, {}, {}
+        for position, record in enumerate(self.records):
+            self._index(position, record)
+
+    def _index(self, position, record):
+        if record.kind == EventKind.BALANCE_CHANGED:
+            seqs, balances = self._balances.setdefault(record.data["user_id"], ([], []))
+            seqs.append(record.seq)
+            balances.append(record.data["balance"])
+        elif record.kind == EventKind.USER_CREATED:
+            self._user_created[record.data["user_id"]] = position
+        else:
+            self._by_order.setdefault(record.data["order_id"], []).append(position)
+
+    def balance_at(self, user_id, seq):
+        """A user's balance as of record `seq`, or None if the user did not exist yet."""
+        if self._balances is None:
+            self._build_indexes()
+        seqs, balances = self._balances.get(user_id, ((), ()))
+        i = bisect.bisect_right(seqs, seq)
+        if i:
+            return _load(balances[i - 1])
+        position = self._user_created.get(user_id)
+        if position is not None:
+            return get_money_engine().zero if self.records[position].seq <= seq else None
+        for user_state in (self.base or {}).get("users", ()):
+            if user_state["user_id"] == user_id:
+                return _load(user_state["balance"])
+        return None
+
+    def order_at(self, order_id, seq):
+        """
+        The order as of record `seq` (an escrow5.Order), or None if it was not
+        registered yet. Only this order's records and its participants are replayed.
+        """
+        if self._by_order is None:
+            self._build_indexes()
+        self._position(seq)
+        positions = self._by_order.get(order_id, [])
+        records = [self.records[p] for p in positions[:bisect.bisect_right(positions, seq - self.base_seq - 1)]]
+        base_order = None
+        if self.base is not None:
+            base_order = next((o for o in self.base["orders"] if o["order_id"] == order_id), None)
+        if base_order is None and not records:
+            return None
+        participants = set()
+        for order_state in ([base_order] if base_order else []):
+            participants.update((order_state["creator_id"], order_state["contractor_id"]))
+            participants.update(order_state["contributions"])
+        for record in records:
+            participants.update(record.data[key] for key in ("creator_id", "contractor_id", "customer_id")
+                                if key in record.data)
+        app = EscrowApplication(sink=NullSink())
+        base_users = [u for u in (self.base or {}).get("users", ()) if u["user_id"] in participants]
+        load_state(app, {"money": get_money_engine().name, "users": base_users,
+                         "orders": [base_order] if base_order else []})
+        for user_id in participants - app.users.keys():
+            record = self.records[self._user_created[user_id]]
+            apply_record(app, record.kind, record.data)
+        for record in records:
+            apply_record(app, record.kind, record.data)
+        return app.orders[order_id]
+
+
+def _partition(order_id, partitions):
+    # crc32 rather than hash(): string hashes differ between processes
+    return zlib.crc32(order_id.encode()) % partitions
+
+def _replay_orders(money, base_users, base_orders, created, order_records):
+    """Worker: rebuilds one partition's orders and returns their state."""
+    app = EscrowApplication(sink=NullSink())
+    load_state(app, {"money": money, "users": base_users, "orders": base_orders})
+    for kind, data in created:
+        apply_record(app, kind, data)
+    for kind, data in order_records:
+        apply_record(app, kind, data)
+    return dump_state(app)["orders"]
+
+
+# --- Recording ---
+
+class RecordingSink(EventSink):
+    """Appends the record of each mutation event to an EventLog; every other event is ignored."""
+    level = EventLevel.INFO
+
+    def __init__(self, log):
+        super().__init__()
+        self.log = log
+
+    def handle(self, event):
+        recorder = _RECORDERS.get(event.kind)
+        if recorder is not None:
+            self.log.append(event.kind, recorder(event.fields))
+
+
+class EventSourcedEscrowApplication(EscrowApplication):
+    """EscrowApplication that keeps every mutation it makes in `self.log`, an EventLog."""
+    def __init__(self, sink=None, log=None, **kwargs):
+        self.log = log if log is not None else EventLog()
+        output = sink if sink is not None else get_default_sink()
+        super().__init__(sink=TeeSink(output, RecordingSink(self.log)), **kwargs)
@@ -0,0 +1,189 @@
+"""
+Deferred settlement for escrow5.EscrowApplication.
+
+By default sign_act releases a milestone's funds as soon as its act is
+complete, on the signer's call. SettlingEscrowApplication instead queues the
+payout and returns as soon as the signature is recorded; settle() later
+drains the queue in batches. Each milestone is still released from its
+order's escrow on its own (the milestone is PAID from then on), but the
+releases of a batch are credited per contractor: one balance change per
+contractor per batch, however many milestones it covers.
+
+Payouts are taken by priority. priority(order, milestone) gives each payout a
+number when it is queued, lower first (every payout is 0 by default); a
+payout gains one level for every `aging_seconds` it waits, so nothing waits
+forever behind a stream of higher-priority work and, at equal priority, the
+oldest payout goes first.
+
+SettlementScheduler calls settle() from a background thread. Use it with
+ConcurrentSettlingEscrowApplication, which takes the order and contractor
+locks around each batch; a plain SettlingEscrowApplication is for callers
+that settle between their own operations.
+
+The queue is kept in memory only. After restoring state (e.g. with
+escrow5_ledger), call enqueue_unsettled() to queue the milestones whose act
+is complete but which are not PAID yet.
+"""
+import heapq
+import itertools
+import threading
+import time
+
+from escrow5 import EscrowApplication, EventKind, EventLevel, FundingPolicy, MilestoneStatus
+from escrow5_concurrent import ConcurrentEscrowApplication
+
+
+class _Settlement:
+    __slots__ = ("order", "milestone", "priority", "queued_at", "seq")
+
+    def __init__(self, order, milestone, priority, queued_at, seq):
+        self.order = order
+        self.milestone = milestone
+        self.priority = priority
+        self.queued_at = queued_at
+        self.seq = seq
+
+
+class SettlementQueue:
+    """Payouts waiting to be settled, taken by aged priority. Safe to use from several threads."""
+    def __init__(self, aging_seconds=60.0):
+        self.aging_seconds = aging_seconds
+        self._entries = []
+        self._queued = set() # (order_id, milestone_id) of the entries
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def push(self, order, milestone, priority=0):
+        """Queues a payout; returns False if it is already queued."""
+        key = (order.order_id, milestone.milestone_id)
+        with self._lock:
+            if key in self._queued:
+                return False
+            self._queued.add(key)
+            self._entries.append(_Settlement(order, milestone, priority, time.monotonic(), next(self._seq)))
+        return True
+
+    def take(self, count=None):
+        """Removes and returns up to `count` payouts (all by default), most urgent first."""
+        now = time.monotonic()
+        aging = self.aging_seconds
+        def urgency(entry):
+            return (entry.priority - (now - entry.queued_at) / aging, entry.seq)
+        with self._lock:
+            if count is None or count >= len(self._entries):
+                batch, self._entries = self._entries, []
+                batch.sort(key=urgency)
+            else:
+                batch = heapq.nsmallest(count, self._entries, key=urgency)
+                taken = {entry.seq for entry in batch}
+                self._entries = [entry for entry in self._entries if entry.seq not in taken]
+            for entry in batch:
+                self._queued.discard((entry.order.order_id, entry.milestone.milestone_id))
+        return batch
+
+
+class SettlingEscrowApplication(EscrowApplication):
+    """EscrowApplication that queues payouts for settle() instead of paying them on sign_act."""
+    def __init__(self, sink=None, funding_policy=FundingPolicy.ACCEPT, priority=None, aging_seconds=60.0, **kwargs):
+        self.settlements = SettlementQueue(aging_seconds)
+        self.priority = priority # (order, milestone) -> number, lower settles first
+        super().__init__(sink, funding_policy, **kwargs)
+
+    def _process_payment_for_milestone(self, order, milestone):
+        priority = self.priority(order, milestone) if self.priority is not None else 0
+        if self.settlements.push(order, milestone, priority):
+            self.sink.emit(EventKind.SETTLEMENT_QUEUED, EventLevel.INFO,
+                           "Payout for Milestone {milestone_id} of Order {order_id} queued for settlement.",
+                           order_id=order.order_id, milestone_id=milestone.milestone_id, priority=priority)
+
+    def enqueue_unsettled(self):
+        """Queues every milestone whose act is complete but whose funds were not released. Returns how many."""
+        queued = 0
+        for order in self.orders.values():
+            if order.milestone_counts[MilestoneStatus.COMPLETED_BY_CONTRACTOR]:
+                for milestone in order.milestones.values():
+                    if (milestone.status == MilestoneStatus.COMPLETED_BY_CONTRACTOR
+                            and milestone.act is not None and milestone.act.is_complete):
+                        self._process_payment_for_milestone(order, milestone)
+                        queued += 1
+        return queued
+
+    def settle(self, max_items=None):
+        """Settles up to `max_items` queued payouts (all by default). Returns how many were taken."""
+        batch = self.settlements.take(max_items)
+        if batch:
+            self._settle(batch)
+        return len(batch)
+
+    def _settle(self, batch):
+        credits = {} # contractor_id -> [amount, milestones]
+        for entry in batch:
+            order, milestone = entry.order, entry.milestone
+            success, amount_released = order.release_funds_for_milestone(milestone)
+            if success:
+                credit = credits.get(order.contractor_id)
+                if credit is None:
+                    credits[order.contractor_id] = [amount_released, 1]
+                else:
+                    credit[0] += amount_released
+                    credit[1] += 1
+            else:
+                self.sink.emit(EventKind.RELEASE_FAILED, EventLevel.ERROR,
+                               "Error during deferred fund release for Act {act_id} of Order {order_id}.",
+                               act_id=milestone.act.act_id, order_id=order.order_id,
+                               milestone_id=milestone.milestone_id)
+        for contractor_id, (amount, milestones) in credits.items():
+            contractor = self._get_user(contractor_id)
+            if contractor and contractor._change_balance(amount):
+                self.sink.emit(EventKind.CONTRACTOR_PAID, EventLevel.INFO,
+                               "Contractor {contractor_id}'s balance updated by +{amount:money} for {milestones} milestone(s).",
+                               contractor_id=contractor_id, amount=amount, milestones=milestones)
+            else:
+                self.sink.emit(EventKind.RELEASE_FAILED, EventLevel.CRITICAL,
+                               "CRITICAL ERROR: Contractor {contractor_id} not found during settlement of {milestones} "
+                               "milestone(s)! Escrow reduced but contractor not paid.",
+                               contractor_id=contractor_id, amount=amount, milestones=milestones)
+
+    def pending_settlements(self):
+        return len(self.settlements)
+
+
+class ConcurrentSettlingEscrowApplication(SettlingEscrowApplication, ConcurrentEscrowApplication):
+    """Thread-safe SettlingEscrowApplication; each batch holds the locks of its orders and contractors."""
+    def _settle(self, batch):
+        with self._locked({entry.order.order_id for entry in batch},
+                          {entry.order.contractor_id for entry in batch}):
+            super()._settle(batch)
+
+
+class SettlementScheduler:
+    """Drains an application's settlement queue every `interval` seconds, `batch_size` payouts at a time."""
+    def __init__(self, app, interval=0.05, batch_size=1000):
+        self.app = app
+        self.interval = interval
+        self.batch_size = batch_size
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="escrow-settlement", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.drain()
+
+    def drain(self):
+        """Settles batches until the queue is empty. Returns how many payouts were taken."""
+        settled = 0
+        while True:
+            count = self.app.settle(self.batch_size)
+            settled += count
+            if count < self.batch_size:
+                return settled
+
+    def close(self):
+        """Stops the scheduler after settling everything still queued."""
+        self._stop.set()
+        self._thread.join()
+        self.drain()
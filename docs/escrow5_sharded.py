@@ -0,0 +1,474 @@
+"""
+Multi-process sharded deployment of escrow5.EscrowApplication.
+
+ShardedEscrowApplication is a router with the EscrowApplication methods.
+Behind it, one balance shard process owns every user and balance, and
+`order_shards` processes own the orders. Each process runs an ordinary
+EscrowApplication, so all validation and messages are the usual ones;
+messages go to the sink each shard builds with `sink_factory`.
+
+Orders are partitioned by order_id. A new order is placed on the next
+order shard in turn, and each shard generates ids with its own node number
+(see escrow5.MonotonicIdGenerator), so the shard is part of the id and any
+router can route an order_id without a lookup table.
+
+join_order debits a balance on one process and credits an escrow on
+another, so it runs as a two-phase protocol:
+    1. reserve   balance shard: validates the customer and amount, and places
+                 a hold on the amount (see escrow5.Customer.place_hold)
+    2. apply     order shard: validates the order and adds the contribution
+    3. commit    balance shard: commits the hold, debiting the balance by the
+                 amount the order accepted (see escrow5.FundingPolicy), or
+       release   drops the hold if step 2 failed; the balance never changed
+Payouts run the other way: when sign_act releases a milestone, the order
+shard reports the payout and the router credits the contractor on the
+balance shard. If the router process dies between the steps, a hold stays
+in place (the funds are not lost, only unavailable until release_hold is
+called on the balance shard) and payouts in flight are lost; use
+escrow5_ledger on the shards to make the individual steps durable.
+
+Objects returned by the router (users, orders) are detached snapshots taken
+when the call returned. An atomic apply_batch runs as one ordinary batch on
+the shard that owns all of its operations: deposits only, or signatures on
+orders of one order shard. A batch that would span processes (any join, or
+operations for several shards) is rejected as a whole, since nothing could
+undo the part applied on one shard if another failed. With atomic=False the
+operations are applied one at a time through the router.
+
+Run this module for a self-check with local processes:
+    python escrow5_sharded.py [order_shards] [orders]
+"""
+import copy
+import itertools
+import multiprocessing
+import sys
+import threading
+
+from escrow5 import (BatchOperation, BatchResult, Contractor, Customer, EscrowApplication, EventKind,
+                     EventLevel, FundingPolicy, MinorUnitMoney, MonotonicIdGenerator, NullSink, OrderStatus,
+                     get_default_sink, get_money_engine, render_user_orders, set_id_generator, set_money_engine)
+
+BALANCE_SHARD_NODE = 0 # order shard i generates ids with node i + 1
+
+
+# --- Shard processes ---
+
+class _BalanceShard(EscrowApplication):
+    """Owns users and balances; orders live on the order shards."""
+    def reserve(self, customer_id, amount):
+        """Phase 1 of join_order. Returns the id of a hold on the amount, or None if the debit is not possible."""
+        customer = self._get_user(customer_id)
+        if not customer or not isinstance(customer, Customer):
+            return None
+        amount_value = get_money_engine().parse(amount)
+        if amount_value <= 0:
+            self.sink.emit(EventKind.INVALID_AMOUNT, EventLevel.ERROR,
+                           "Error: Contribution amount must be positive.", customer_id=customer_id, amount=amount_value)
+            return None
+        available = customer.available_balance
+        if available < amount_value:
+            self.sink.emit(EventKind.INSUFFICIENT_BALANCE, EventLevel.ERROR,
+                           "Error: Customer {name} ({customer_id}) has insufficient balance ({balance:money}) to contribute {amount:money}.",
+                           name=customer.name, customer_id=customer_id, balance=available, amount=amount_value)
+            return None
+        # No expiry: the order shard may already have applied the contribution when the commit arrives
+        return customer.place_hold(amount_value)
+
+    def commit(self, customer_id, hold_id, accepted):
+        """Phase 3 of join_order: debits what the order accepted (an engine amount) and releases the rest."""
+        return self.users[customer_id].commit_hold(hold_id, accepted)
+
+    def balance_total(self):
+        return sum((user.balance for user in self.users.values()), get_money_engine().zero)
+
+    def credit_payouts(self, payouts):
+        for contractor_id, amount, order_id, milestone_id in payouts:
+            contractor = self._get_user(contractor_id)
+            if contractor and contractor._change_balance(amount):
+                self.sink.emit(EventKind.CONTRACTOR_PAID, EventLevel.INFO,
+                               "Contractor {contractor_id}'s balance updated by +{amount:money}.",
+                               contractor_id=contractor_id, amount=amount, order_id=order_id, milestone_id=milestone_id)
+            else:
+                self.sink.emit(EventKind.RELEASE_FAILED, EventLevel.CRITICAL,
+                               "CRITICAL ERROR: Contractor {contractor_id} not found during fund release for Order {order_id}, "
+                               "Milestone {milestone_id}! Escrow reduced but contractor not paid.",
+                               contractor_id=contractor_id, order_id=order_id, milestone_id=milestone_id)
+
+
+class _OrderShard(EscrowApplication):
+    """
+    Owns a share of the orders. Users appear here as identities only (id,
+    type and name, no balance), sent along by the router with each call.
+    """
+    def __init__(self, sink=None, funding_policy=FundingPolicy.ACCEPT):
+        super().__init__(sink, funding_policy)
+        self._payouts = []
+
+    def ensure_users(self, identities):
+        for user_id, user_type, name in identities:
+            if user_id not in self.users:
+                cls = Customer if user_type == Customer.__name__ else Contractor
+                user = cls.__new__(cls)
+                user.user_id, user.name, user.user_type = user_id, name, cls.__name__.upper()
+                user.balance = user.held = get_money_engine().zero
+                user._sink = self.sink
+                if cls is Customer:
+                    user.orders_created, user.orders_joined, user.holds = {}, {}, {}
+                else:
+                    user.assigned_orders = set()
+                self.users[user_id] = user
+
+    def apply_join(self, customer_id, order_id, amount_value):
+        """Phase 2 of join_order: the customer's funds are already reserved on the balance shard."""
+        customer = self._get_user(customer_id)
+        order = self._get_order(order_id)
+        if not customer or not order:
+            return False
+        if order.status != OrderStatus.PENDING:
+            self.sink.emit(EventKind.INVALID_STATUS, EventLevel.ERROR,
+                           "Error: Order {order_id} is not in PENDING status (Current: {status}). Cannot add contribution.",
+                           order_id=order_id, status=order.status, customer_id=customer_id)
+            return False
+        accepted = order.add_contribution(customer_id, amount_value)
+        if not accepted:
+            return False
+        customer.orders_joined[order_id] = customer.orders_joined.get(order_id, get_money_engine().zero) + accepted
+        self.sink.emit(EventKind.ORDER_JOINED, EventLevel.INFO,
+                       "Customer {name} ({customer_id}) successfully joined Order {order_id}.",
+                       name=customer.name, customer_id=customer_id, order_id=order_id, amount=accepted)
+        return accepted
+
+    def _process_payment_for_milestone(self, order, milestone):
+        # The contractor's balance lives on the balance shard; the router forwards the payout
+        success, amount_released = order.release_funds_for_milestone(milestone)
+        if success:
+            self._payouts.append((order.contractor_id, amount_released, order.order_id, milestone.milestone_id))
+        else:
+            self.sink.emit(EventKind.RELEASE_FAILED, EventLevel.ERROR,
+                           "Error during automated fund release for Act {act_id} of Order {order_id}.",
+                           act_id=milestone.act.act_id, order_id=order.order_id, milestone_id=milestone.milestone_id)
+
+    def take_payouts(self):
+        payouts, self._payouts = self._payouts, []
+        return payouts
+
+    def user_orders(self, user_id):
+        user = self.users.get(user_id)
+        if user is None:
+            return [], {}, []
+        if isinstance(user, Customer):
+            return list(user.orders_created), dict(user.orders_joined), []
+        return [], {}, list(user.assigned_orders)
+
+    def escrow_total(self):
+        return sum((order.escrow_balance for order in self.orders.values()), get_money_engine().zero)
+
+
+def _detached(result):
+    """A picklable copy of a returned user or order that no longer reports to the shard's sink."""
+    if isinstance(result, (Customer, Contractor)):
+        user = copy.copy(result)
+        user._sink = NullSink()
+        if isinstance(user, Customer):
+            user.orders_created = dict.fromkeys(user.orders_created)
+            user.orders_joined = dict(user.orders_joined)
+        else:
+            user.assigned_orders = set(user.assigned_orders)
+        return user
+    if hasattr(result, "milestones"): # Order
+        order = copy.copy(result)
+        order._sink = NullSink()
+        order.milestones = {}
+        for milestone_id, milestone in result.milestones.items():
+            milestone = order.milestones[milestone_id] = copy.copy(milestone)
+            if milestone.act is not None:
+                milestone.act = copy.copy(milestone.act)
+                milestone.act._sink = order._sink
+        for name in ("contributions", "votes_for_rep", "_rep_support", "milestone_counts"):
+            setattr(order, name, dict(getattr(result, name)))
+        return order
+    return result
+
+def _serve(conn, role, node, money_engine, sink_factory, funding_policy):
+    set_money_engine(money_engine)
+    set_id_generator(MonotonicIdGenerator(node))
+    app = (_BalanceShard if role == "balance" else _OrderShard)(sink_factory(), funding_policy)
+    while True:
+        request = conn.recv()
+        if request is None:
+            app.sink.close()
+            conn.close()
+            return
+        method, args, identities = request
+        try:
+            if identities:
+                app.ensure_users(identities)
+            result = _detached(getattr(app, method)(*args))
+            payouts = app.take_payouts() if role == "order" else ()
+            conn.send((True, result, payouts))
+        except Exception as e: # Hand the failure to the caller rather than killing the shard
+            conn.send((False, e, ()))
+
+
+class _ShardClient:
+    """One shard process and the pipe to it; calls from several router threads are serialised."""
+    def __init__(self, context, role, node, sink_factory, funding_policy):
+        self.conn, child = context.Pipe()
+        self.process = context.Process(target=_serve, args=(child, role, node, get_money_engine(), sink_factory,
+                                                            funding_policy),
+                                       name=f"escrow-{role}-{node}", daemon=True)
+        self.process.start()
+        child.close()
+        self._lock = threading.Lock()
+
+    def call(self, method, *args, identities=()):
+        with self._lock:
+            self.conn.send((method, args, identities))
+            ok, result, payouts = self.conn.recv()
+        if not ok:
+            raise result
+        return result, payouts
+
+    def close(self):
+        with self._lock:
+            self.conn.send(None)
+        self.process.join()
+
+
+# --- Router ---
+
+class ShardedEscrowApplication:
+    """EscrowApplication interface over a balance shard and `order_shards` order shards."""
+    def __init__(self, order_shards=4, sink=None, sink_factory=NullSink, context=None,
+                 funding_policy=FundingPolicy.ACCEPT):
+        self.sink = sink if sink is not None else get_default_sink()
+        context = context if context is not None else multiprocessing.get_context()
+        self.balance_shard = _ShardClient(context, "balance", BALANCE_SHARD_NODE, sink_factory, funding_policy)
+        self.order_shards = [_ShardClient(context, "order", i + 1, sink_factory, funding_policy)
+                             for i in range(order_shards)]
+        self._identities = {} # user_id -> (user_id, type name, name), sent to order shards with each call
+        self._placement = itertools.cycle(range(order_shards))
+        self._placement_lock = threading.Lock()
+        self.sink.emit(EventKind.APP_INITIALIZED, EventLevel.INFO, "Escrow Application Initialized.")
+
+    def close(self):
+        for shard in [self.balance_shard] + self.order_shards:
+            shard.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _shard_of(self, order_id):
+        """The order shard that owns `order_id`, read from the node field of the id."""
+        try:
+            index = int(str(order_id)[-8:-4], 16) - 1
+        except ValueError:
+            index = -1
+        # Unknown ids go to the first shard, which reports them as not found
+        return self.order_shards[index] if 0 <= index < len(self.order_shards) else self.order_shards[0]
+
+    def _who(self, *user_ids):
+        return tuple(self._identities[u] for u in user_ids if u in self._identities)
+
+    def _remember(self, user):
+        if user is not None:
+            self._identities[user.user_id] = (user.user_id, type(user).__name__, user.name)
+        return user
+
+    def _call_order_shard(self, shard, method, *args, identities=()):
+        result, payouts = shard.call(method, *args, identities=identities)
+        if payouts:
+            self.balance_shard.call("credit_payouts", payouts)
+        return result
+
+    # Users and balances
+
+    def create_customer(self, name):
+        return self._remember(self.balance_shard.call("create_customer", name)[0])
+
+    def create_contractor(self, name):
+        return self._remember(self.balance_shard.call("create_contractor", name)[0])
+
+    def customer_deposit(self, customer_id, amount):
+        return self.balance_shard.call("customer_deposit", customer_id, amount)[0]
+
+    def get_user(self, user_id):
+        """A fresh snapshot of a user and their balance, or None."""
+        return self.balance_shard.call("_get_user", user_id)[0]
+
+    # Orders
+
+    def create_order(self, customer_id, contractor_id, milestones_data):
+        with self._placement_lock:
+            shard = self.order_shards[next(self._placement)]
+        return self._call_order_shard(shard, "create_order", customer_id, contractor_id, milestones_data,
+                                      identities=self._who(customer_id, contractor_id))
+
+    def get_order(self, order_id):
+        """A fresh snapshot of an order, or None."""
+        return self._call_order_shard(self._shard_of(order_id), "_get_order", order_id)
+
+    def join_order(self, customer_id, order_id, amount):
+        hold_id = self.balance_shard.call("reserve", customer_id, amount)[0]
+        if hold_id is None:
+            return False
+        try:
+            accepted = self._call_order_shard(self._shard_of(order_id), "apply_join", customer_id, order_id,
+                                            get_money_engine().parse(amount), identities=self._who(customer_id))
+        except BaseException:
+            self.balance_shard.call("release_hold", customer_id, hold_id)
+            raise
+        if not accepted:
+            self.balance_shard.call("release_hold", customer_id, hold_id)
+            return False
+        self.balance_shard.call("commit", customer_id, hold_id, accepted)
+        return True
+
+    def mark_milestone_complete(self, contractor_id, order_id, milestone_id):
+        return self._call_order_shard(self._shard_of(order_id), "mark_milestone_complete",
+                                      contractor_id, order_id, milestone_id, identities=self._who(contractor_id))
+
+    def sign_act(self, signer_id, order_id, milestone_id):
+        return self._call_order_shard(self._shard_of(order_id), "sign_act", signer_id, order_id, milestone_id,
+                                      identities=self._who(signer_id))
+
+    def vote_for_representative(self, voter_customer_id, order_id, candidate_customer_id):
+        return self._call_order_shard(self._shard_of(order_id), "vote_for_representative",
+                                      voter_customer_id, order_id, candidate_customer_id,
+                                      identities=self._who(voter_customer_id, candidate_customer_id))
+
+    def apply_batch(self, operations, atomic=True):
+        """
+        atomic=True: runs the batch on the one shard it touches, or rejects it if it spans
+        several. atomic=False: applies the operations one at a time. Returns a list of BatchResult.
+        """
+        methods = {BatchOperation.DEPOSIT: self.customer_deposit, BatchOperation.JOIN: self.join_order,
+                   BatchOperation.SIGN: self.sign_act}
+        if atomic:
+            return self._apply_atomic_batch(list(operations), methods)
+        results = []
+        for index, operation in enumerate(operations):
+            kind = operation[0] if operation else None
+            if kind not in methods:
+                self.sink.emit(EventKind.INVALID_OPERATION, EventLevel.ERROR,
+                               "Error: Batch operation #{index} is not recognised: {operation}",
+                               index=index, operation=operation)
+                results.append(BatchResult(index, operation, False, EventKind.INVALID_OPERATION))
+                continue
+            success = bool(methods[kind](*operation[1:]))
+            results.append(BatchResult(index, operation, success))
+        return results
+
+    def _apply_atomic_batch(self, operations, methods):
+        shards = {} # shard -> None, in order of first use
+        signers = set()
+        for operation in operations:
+            kind = operation[0] if operation else None
+            if kind in (BatchOperation.DEPOSIT, BatchOperation.JOIN):
+                shards[self.balance_shard] = None
+            if kind in (BatchOperation.JOIN, BatchOperation.SIGN) and len(operation) == 4:
+                shards[self._shard_of(operation[2])] = None
+            if kind == BatchOperation.SIGN and len(operation) == 4:
+                signers.add(operation[1])
+        if len(shards) <= 1:
+            # The owning shard validates the whole batch before applying any of it
+            shard = next(iter(shards), self.balance_shard)
+            if shard is self.balance_shard:
+                return shard.call("apply_batch", operations, True)[0]
+            return self._call_order_shard(shard, "apply_batch", operations, True,
+                                          identities=self._who(*signers))
+        results = [BatchResult(index, operation, False,
+                               EventKind.BATCH_ABORTED if operation and operation[0] in methods
+                               else EventKind.INVALID_OPERATION)
+                   for index, operation in enumerate(operations)]
+        self.sink.emit(EventKind.BATCH_ABORTED, EventLevel.ERROR,
+                       "Batch of {count} operations rejected: an atomic batch cannot span {shards} shards "
+                       "(pass atomic=False to apply it operation by operation).",
+                       count=len(results), shards=len(shards))
+        return results
+
+    # Views
+
+    def view_user_balance(self, user_id):
+        self.balance_shard.call("view_user_balance", user_id)
+
+    def view_order_details(self, order_id):
+        self._call_order_shard(self._shard_of(order_id), "view_order_details", order_id)
+
+    def view_user_orders(self, user_id):
+        user = self.get_user(user_id)
+        if user is None:
+            return
+        # Ids sort in creation order, so the merged lists read as they would on one process
+        created, joined, assigned = [], {}, []
+        for shard in self.order_shards:
+            shard_created, shard_joined, shard_assigned = shard.call("user_orders", user_id)[0]
+            created += shard_created
+            joined.update(shard_joined)
+            assigned += shard_assigned
+        if isinstance(user, Customer):
+            user.orders_created = dict.fromkeys(sorted(created))
+            user.orders_joined = {order_id: joined[order_id] for order_id in sorted(joined)}
+        else:
+            user.assigned_orders = set(assigned)
+        if self.sink.enabled(EventLevel.INFO):
+            self.sink.emit(EventKind.VIEW, EventLevel.INFO, "{report}",
+                           report=render_user_orders(EscrowApplication._user_orders_view(user)), user_id=user_id)
+
+    def total_funds(self):
+        """Every balance plus every escrow balance, read shard by shard (consistent when idle)."""
+        total = self.balance_shard.call("balance_total")[0]
+        return sum((shard.call("escrow_total")[0] for shard in self.order_shards), total)
+
+
+# --- Self-check ---
+
+def run_check(order_shards=4, orders=200, threads=4, seed=0):
+    """
+    Drives a ShardedEscrowApplication with the benchmark workload from several
+    threads and checks that balances plus escrow equal everything deposited.
+    Amounts use MinorUnitMoney: the workload's large balances exceed the
+    precision of the Decimal context.
+    """
+    from escrow5_bench import SUITE_DEFAULTS, _run_workload
+    previous = set_money_engine(MinorUnitMoney())
+    app = None
+    try:
+        app = ShardedEscrowApplication(order_shards, sink=NullSink())
+        params = dict(SUITE_DEFAULTS, customers=max(8, orders // 4), contractors=5, orders=orders // threads)
+        errors = []
+
+        def worker(worker_seed):
+            try:
+                _run_workload(app, lambda name, *args: getattr(app, name)(*args), lambda phase: None,
+                              **dict(params, seed=worker_seed))
+            except Exception as e: # Surface worker failures in the main thread
+                errors.append(e)
+
+        workers = [threading.Thread(target=worker, args=(seed * 1000 + i,)) for i in range(threads)]
+        for t in workers:
+            t.start()
+        for t in workers:
+            t.join()
+        if errors:
+            raise errors[0]
+        deposited = get_money_engine().parse(10 ** 9) * params["customers"] * threads
+        total = app.total_funds()
+        assert total == deposited, f"funds not conserved: {total} held vs {deposited} deposited"
+        return {"order_shards": order_shards, "orders": params["orders"] * threads,
+                "held": get_money_engine().format(total)}
+    finally:
+        if app is not None:
+            app.close()
+        set_money_engine(previous)
+
+
+if __name__ == "__main__":
+    shard_count = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+    order_count = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+    for key, value in run_check(shard_count, order_count).items():
+        print(f"{key}: {value}")
+    print("OK: balances plus escrow equal total deposits.")
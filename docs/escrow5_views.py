@@ -0,0 +1,158 @@
+"""
+Cached views for escrow5.EscrowApplication.
+
+Order.to_view() and EscrowApplication.user_orders_view() build a plain-data
+view from scratch: every contribution, vote and milestone is visited and
+every amount formatted. ViewCache keeps, per order and per user, the view,
+its JSON text and its printed report, built on first use. ViewCacheSink
+drops an order's entries when a mutation event (one escrow5_ledger records)
+names that order, and a user's when an order is registered for them or they
+contribute. An unchanged order costs a dictionary lookup.
+
+The printed reports are rendered from the views with escrow5's render_*
+functions, so view_order_details and view_user_orders print exactly what
+EscrowApplication prints.
+
+Cached views are shared between callers: treat them as read-only.
+"""
+import json
+
+from escrow5 import (EscrowApplication, EventKind, EventLevel, EventSink, FundingPolicy, TeeSink,
+                     get_default_sink, render_order_milestones, render_order_status, render_user_orders)
+from escrow5_ledger import _RECORDERS
+
+
+class _CachedView:
+    __slots__ = ("view", "_json", "_reports")
+
+    def __init__(self, view):
+        self.view = view
+        self._json = None
+        self._reports = None
+
+    @property
+    def json(self):
+        if self._json is None:
+            self._json = json.dumps(self.view)
+        return self._json
+
+
+class ViewCache:
+    """Views of one application's orders and users, rebuilt only after they change."""
+    def __init__(self, app):
+        self.app = app
+        self._orders = {} # order_id -> _CachedView
+        self._users = {} # user_id -> _CachedView
+        self.hits = 0
+        self.misses = 0
+
+    def order(self, order_id):
+        """The cached view entry of an order, or None if there is no such order."""
+        entry = self._orders.get(order_id)
+        if entry is not None:
+            self.hits += 1
+            return entry
+        order = self.app._get_order(order_id)
+        if not order:
+            return None
+        self.misses += 1
+        entry = self._orders[order_id] = _CachedView(order.to_view())
+        return entry
+
+    def user_orders(self, user_id):
+        entry = self._users.get(user_id)
+        if entry is not None:
+            self.hits += 1
+            return entry
+        user = self.app._get_user(user_id)
+        if not user:
+            return None
+        self.misses += 1
+        entry = self._users[user_id] = _CachedView(EscrowApplication._user_orders_view(user))
+        return entry
+
+    def order_reports(self, order_id):
+        """The printed status and milestones reports of an order, or None."""
+        entry = self.order(order_id)
+        if entry is None:
+            return None
+        if entry._reports is None:
+            entry._reports = (render_order_status(entry.view), render_order_milestones(entry.view))
+        return entry._reports
+
+    def user_orders_report(self, user_id):
+        entry = self.user_orders(user_id)
+        if entry is None:
+            return None
+        if entry._reports is None:
+            entry._reports = render_user_orders(entry.view)
+        return entry._reports
+
+    def invalidate_order(self, order_id):
+        self._orders.pop(order_id, None)
+
+    def invalidate_user(self, user_id):
+        self._users.pop(user_id, None)
+
+    def clear(self):
+        """Drops every entry, e.g. after the application's state was loaded without events."""
+        self._orders = {}
+        self._users = {}
+
+
+class ViewCacheSink(EventSink):
+    """Invalidates ViewCache entries on mutation events; every other event is ignored."""
+    level = EventLevel.INFO
+
+    def __init__(self, cache):
+        super().__init__()
+        self.cache = cache
+
+    def handle(self, event):
+        if event.kind not in _RECORDERS:
+            return
+        order_id = event.fields.get("order_id")
+        if order_id is not None:
+            self.cache.invalidate_order(order_id)
+        if event.kind == EventKind.ORDER_REGISTERED:
+            order = event.fields["order"]
+            self.cache.invalidate_user(order.creator_id)
+            self.cache.invalidate_user(order.contractor_id)
+        elif event.kind == EventKind.CONTRIBUTION_ADDED:
+            self.cache.invalidate_user(event.fields["customer_id"])
+
+
+class CachedViewEscrowApplication(EscrowApplication):
+    """EscrowApplication whose views and printed reports come from a ViewCache."""
+    def __init__(self, sink=None, funding_policy=FundingPolicy.ACCEPT, **kwargs):
+        self.views = ViewCache(self)
+        output = sink if sink is not None else get_default_sink()
+        super().__init__(TeeSink(output, ViewCacheSink(self.views)), funding_policy, **kwargs)
+
+    def order_view(self, order_id):
+        """Order.to_view() of the order, or None."""
+        entry = self.views.order(order_id)
+        return entry.view if entry is not None else None
+
+    def order_view_json(self, order_id):
+        entry = self.views.order(order_id)
+        return entry.json if entry is not None else None
+
+    def user_orders_view(self, user_id):
+        entry = self.views.user_orders(user_id)
+        return entry.view if entry is not None else None
+
+    def user_orders_view_json(self, user_id):
+        entry = self.views.user_orders(user_id)
+        return entry.json if entry is not None else None
+
+    def view_order_details(self, order_id):
+        reports = self.views.order_reports(order_id)
+        if reports is not None and self.sink.enabled(EventLevel.INFO):
+            for report in reports:
+                self.sink.emit(EventKind.VIEW, EventLevel.INFO, "{report}", report=report, order_id=order_id)
+
+    def view_user_orders(self, user_id):
+        report = self.views.user_orders_report(user_id)
+        if report is not None and self.sink.enabled(EventLevel.INFO):
+            self.sink.emit(EventKind.VIEW, EventLevel.INFO, "{report}", report=report, user_id=user_id)
@@ -0,0 +1,274 @@
+"""
+What-if analysis of representative elections for escrow5.
+
+Order.check_votes changes an order's representative as soon as one
+candidate's support (the contributions of the customers voting for them)
+reaches REP_VOTE_THRESHOLD_PERCENT of the order's total cost, and resets the
+votes after every change or confirmation. simulate() replays the votes of a
+whole population of orders under several ThresholdPolicy alternatives (another
+percentage, or the amount actually contributed as the base instead of the
+total cost) and reports how often the representative changes.
+
+A VotePopulation holds, per order, the total cost, the contributions and one
+vote per contributor (a candidate index, or -1 for no vote), cast in column
+order. Build one from live orders (their pending votes) with from_orders(), or
+a synthetic one with synthetic(). Amounts are exact integers of minor units.
+
+With NumPy every vote step is evaluated for all orders at once. The tally is
+that of Order: non-contributors can neither vote nor be elected, support only
+grows between resets, and thresholds are computed with the integer
+MinorUnitMoney threshold, which matches the Decimal one for whole minor units.
+Without NumPy, and in verify(), each order is replayed through a real
+escrow5.Order with add_vote, so verify() checks the vectorized engine
+against production code.
+
+Run this module for a report on a synthetic population:
+    python escrow5_votesim.py [orders] [contributors]
+"""
+import random
+import sys
+from collections import namedtuple
+from decimal import Decimal
+
+from escrow5 import (EventKind, EventLevel, EventSink, FundingPolicy, MinorUnitMoney, Order,
+                     REP_VOTE_THRESHOLD_PERCENT, get_money_engine)
+
+try:
+    import numpy
+except ImportError: # optional: without it simulate() replays each order through escrow5.Order
+    numpy = None
+
+BASE_TOTAL_COST = "total_cost"   # percent of the order's total cost (production)
+BASE_CONTRIBUTED = "contributed" # percent of the sum of the contributions
+
+ThresholdPolicy = namedtuple("ThresholdPolicy", ("name", "percent", "base"))
+PRODUCTION_POLICY = ThresholdPolicy("production", REP_VOTE_THRESHOLD_PERCENT, BASE_TOTAL_COST)
+
+VoteOutcome = namedtuple("VoteOutcome", ("policy", "orders", "changed_orders", "change_rate", "changes",
+                                         "confirmations", "representatives"))
+
+_NOT_A_CONTRIBUTOR = -1 # representative index of an order whose representative has not contributed
+_threshold = MinorUnitMoney().percent_threshold
+
+
+class VotePopulation:
+    """Contributions and votes of many orders; row i of every list describes order i."""
+    def __init__(self, total_costs, contributions, votes, representatives=None):
+        self.total_costs = list(total_costs)
+        self.contributions = [list(row) for row in contributions]
+        self.votes = [list(row) for row in votes]
+        self.representatives = (list(representatives) if representatives is not None
+                                else [_NOT_A_CONTRIBUTOR] * len(self.total_costs))
+        if not (len(self.total_costs) == len(self.contributions) == len(self.votes) == len(self.representatives)):
+            raise ValueError("Every order needs a total cost, contributions, votes and a representative.")
+        for contributions_row, votes_row in zip(self.contributions, self.votes):
+            if len(votes_row) != len(contributions_row):
+                raise ValueError("Each contributor casts exactly one vote (-1 for none).")
+            if votes_row and not -1 <= min(votes_row) <= max(votes_row) < len(votes_row):
+                raise ValueError("Votes are indices of the order's contributors, or -1.")
+
+    def __len__(self):
+        return len(self.total_costs)
+
+    def rows(self):
+        return zip(self.total_costs, self.contributions, self.votes, self.representatives)
+
+    @classmethod
+    def from_orders(cls, orders):
+        """
+        The orders (escrow5.Order objects) with the votes pending on them, cast
+        in the order they were recorded; contributors who have not voted abstain.
+        """
+        engine = get_money_engine()
+        minor = int if isinstance(engine, MinorUnitMoney) else MinorUnitMoney(2).parse
+        total_costs, contributions, votes, representatives = [], [], [], []
+        for order in orders:
+            # Voters first, in voting order, so the columns replay the votes as they were cast
+            contributors = list(dict.fromkeys(list(order.votes_for_rep) + list(order.contributions)))
+            column = {customer_id: j for j, customer_id in enumerate(contributors)}
+            total_costs.append(minor(order.total_cost))
+            contributions.append([minor(order.contributions[customer_id]) for customer_id in contributors])
+            votes.append([column.get(order.votes_for_rep.get(customer_id), -1) for customer_id in contributors])
+            representatives.append(column.get(order.representative_id, _NOT_A_CONTRIBUTOR))
+        return cls(total_costs, contributions, votes, representatives)
+
+    @classmethod
+    def synthetic(cls, orders=10_000, contributors=20, funding=(0.5, 1.2), turnout=0.7, candidates=3,
+                  creator_contributes=0.5, seed=0):
+        """
+        Random orders of up to `contributors` contributors, with lognormal
+        contribution sizes adding up to a fraction of the total cost drawn
+        uniformly from the `funding` range (above 1: overfunded). Each
+        contributor votes with probability `turnout`, for one of `candidates`
+        contributors chosen per order, with per-order preferences.
+        """
+        rng = random.Random(seed)
+        total_costs, contributions, votes, representatives = [], [], [], []
+        for _ in range(orders):
+            total_cost = rng.randrange(10_000, 10_000_000) # 100.00 to 100,000.00
+            count = rng.randint(1, contributors)
+            weights = [rng.lognormvariate(0, 1) for _ in range(count)]
+            scale = total_cost * rng.uniform(*funding) / sum(weights)
+            row = [max(1, int(weight * scale)) for weight in weights]
+            running = rng.sample(range(count), min(candidates, count))
+            preference = [rng.gammavariate(1, 1) for _ in running]
+            total_costs.append(total_cost)
+            contributions.append(row)
+            votes.append([rng.choices(running, preference)[0] if rng.random() < turnout else -1 for _ in row])
+            representatives.append(0 if rng.random() < creator_contributes else _NOT_A_CONTRIBUTOR)
+        return cls(total_costs, contributions, votes, representatives)
+
+
+def _thresholds(population, policy):
+    percent = Decimal(policy.percent)
+    if policy.base == BASE_TOTAL_COST:
+        bases = population.total_costs
+    elif policy.base == BASE_CONTRIBUTED:
+        bases = [sum(row) for row in population.contributions]
+    else:
+        raise ValueError(f"Unknown threshold base: {policy.base}")
+    return [_threshold(base, percent) for base in bases]
+
+
+# --- Vectorized engine ---
+
+def _simulate_numpy(population, policy):
+    n = len(population)
+    k = max((len(row) for row in population.contributions), default=0)
+    contributions = numpy.zeros((n, k), dtype=numpy.int64)
+    votes = numpy.full((n, k), -1, dtype=numpy.int64)
+    for i, (contributions_row, votes_row) in enumerate(zip(population.contributions, population.votes)):
+        contributions[i, :len(contributions_row)] = contributions_row
+        votes[i, :len(votes_row)] = votes_row
+    threshold = numpy.array(_thresholds(population, policy), dtype=numpy.int64)
+    representatives = numpy.array(population.representatives, dtype=numpy.int64)
+    support = numpy.zeros((n, k), dtype=numpy.int64) # support per candidate since the last reset
+    changes = numpy.zeros(n, dtype=numpy.int64)
+    confirmations = numpy.zeros(n, dtype=numpy.int64)
+    rows = numpy.arange(n)
+    is_contributor = contributions > 0
+
+    for step in range(k):
+        candidates = votes[:, step]
+        # Order.add_vote: both the voter and the candidate must have contributed
+        valid = (candidates >= 0) & is_contributor[:, step]
+        valid[valid] = is_contributor[rows[valid], candidates[valid]]
+        voters, elected = rows[valid], candidates[valid]
+        support[voters, elected] += contributions[voters, step]
+        # Support only grows between resets, so only the candidate just voted for
+        # can reach the threshold, and check_votes elects them at once
+        reached = support[voters, elected] >= threshold[voters]
+        hit, winners = voters[reached], elected[reached]
+        if hit.size:
+            changed = winners != representatives[hit]
+            changes[hit[changed]] += 1
+            confirmations[hit[~changed]] += 1
+            representatives[hit] = winners
+            support[hit] = 0 # check_votes resets the votes after a change or a confirmation
+
+    changed_orders = int(numpy.count_nonzero(changes))
+    return VoteOutcome(policy, n, changed_orders, changed_orders / n if n else 0.0, int(changes.sum()),
+                       int(confirmations.sum()), representatives.tolist())
+
+
+# --- Reference engine: the production Order ---
+
+class _OutcomeCounter(EventSink):
+    level = EventLevel.INFO
+
+    def __init__(self):
+        super().__init__()
+        self.changes = 0
+        self.confirmations = 0
+
+    def handle(self, event):
+        if event.kind == EventKind.REPRESENTATIVE_CHANGED:
+            self.changes += 1
+        elif event.kind == EventKind.REPRESENTATIVE_CONFIRMED:
+            self.confirmations += 1
+
+def _simulate_orders(population, policy, indices=None):
+    """Replays the chosen orders (all by default) through escrow5.Order.add_vote."""
+    thresholds = _thresholds(population, policy)
+    indices = range(len(population)) if indices is None else indices
+    changed_orders = changes = confirmations = 0
+    representatives = []
+    rows = list(population.rows())
+    for i in indices:
+        total_cost, contributions, votes, representative = rows[i]
+        ids = [f"c{j}" for j in range(len(contributions))]
+        counter = _OutcomeCounter()
+        order = Order._prevalidated(f"sim_{i}", "creator", "contractor", {}, total_cost, counter,
+                                    FundingPolicy.ACCEPT)
+        order.contributions = {ids[j]: amount for j, amount in enumerate(contributions) if amount > 0}
+        order.representative_id = ids[representative] if representative >= 0 else "creator"
+        order._rep_threshold = thresholds[i]
+        for j, candidate in enumerate(votes):
+            if candidate >= 0:
+                order.add_vote(ids[j], f"c{candidate}")
+        changed_orders += counter.changes > 0
+        changes += counter.changes
+        confirmations += counter.confirmations
+        representatives.append(ids.index(order.representative_id) if order.representative_id in ids
+                               else _NOT_A_CONTRIBUTOR)
+    n = len(representatives)
+    return VoteOutcome(policy, n, changed_orders, changed_orders / n if n else 0.0, changes, confirmations,
+                       representatives)
+
+
+# --- Analysis ---
+
+def simulate(population, policies=(PRODUCTION_POLICY,), vectorized=None):
+    """
+    The VoteOutcome of every policy over the population. vectorized=None uses
+    NumPy when it is installed; False replays every order through escrow5.Order.
+    """
+    if vectorized is None:
+        vectorized = numpy is not None
+    elif vectorized and numpy is None:
+        raise ImportError("vectorized=True requires NumPy.")
+    run = _simulate_numpy if vectorized else _simulate_orders
+    return [run(population, policy) for policy in policies]
+
+def verify(population, policies=(PRODUCTION_POLICY,), sample=500, seed=0):
+    """
+    Checks the vectorized engine against escrow5.Order on `sample` random
+    orders. Returns the indices of the orders on which they disagree (empty if none).
+    """
+    if numpy is None:
+        raise ImportError("verify() compares against the NumPy engine, which requires NumPy.")
+    indices = sorted(random.Random(seed).sample(range(len(population)), min(sample, len(population))))
+    subset = VotePopulation([population.total_costs[i] for i in indices],
+                            [population.contributions[i] for i in indices],
+                            [population.votes[i] for i in indices],
+                            [population.representatives[i] for i in indices])
+    mismatches = set()
+    for policy in policies:
+        fast = _simulate_numpy(subset, policy).representatives
+        reference = _simulate_orders(subset, policy).representatives
+        mismatches.update(indices[j] for j, (a, b) in enumerate(zip(fast, reference)) if a != b)
+    return sorted(mismatches)
+
+def format_report(outcomes):
+    lines = [f"{'policy':<24} {'threshold':>20} {'orders':>9} {'changed':>9} {'rate':>7} {'changes':>9} {'confirmed':>9}"]
+    for outcome in outcomes:
+        policy = outcome.policy
+        lines.append(f"{policy.name:<24} {f'{policy.percent}% of {policy.base}':>20} {outcome.orders:>9} "
+                     f"{outcome.changed_orders:>9} {outcome.change_rate:>7.1%} {outcome.changes:>9} "
+                     f"{outcome.confirmations:>9}")
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    orders = int(sys.argv[1].replace("_", "")) if len(sys.argv) > 1 else 10_000
+    contributors = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    population = VotePopulation.synthetic(orders, contributors)
+    policies = (PRODUCTION_POLICY,
+                ThresholdPolicy("75% of contributed", Decimal("75.0"), BASE_CONTRIBUTED),
+                ThresholdPolicy("two thirds of cost", Decimal("66.67"), BASE_TOTAL_COST),
+                ThresholdPolicy("simple majority", Decimal("50.01"), BASE_CONTRIBUTED))
+    print(format_report(simulate(population, policies)))
+    if numpy is not None:
+        mismatches = verify(population, policies)
+        print("OK: vectorized engine agrees with escrow5.Order." if not mismatches
+              else f"MISMATCH on orders {mismatches[:10]}")